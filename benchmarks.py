@@ -0,0 +1,663 @@
+"""قياس أداء منظم المشاريع
+
+أمثلة التشغيل:
+    python benchmarks.py writers --writers 8 --projects 200 --profile shared
+    python benchmarks.py suite --sizes 1000,10000,100000 --output results.json
+    python benchmarks.py storage --clients 1000 --projects 10
+    python benchmarks.py recorder --files 5000 --batch-size 500
+    python benchmarks.py compare base.json results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from project_organizer_smart import (DatabaseManager, MemoryDatabaseManager, GeneratedFileRecorder,
+                                     STORAGE_PROFILES, FOLDER_STRUCTURE, FilenameParser, build_filename, create_folder_tree)
+
+# أسماء واقعية لتوليد البيانات الاصطناعية
+ARABIC_NAMES = ["جامعة صنعاء", "شركة النهضة", "وزارة التعليم", "مؤسسة الأمل", "كلية الهندسة",
+                "مكتب الريان", "مستشفى السلام", "شركة الحلول التقنية", "جمعية الخير", "مطاعم الشام"]
+LATIN_NAMES = ["SanaaUni", "NahdaCo", "TechStartup", "CafeChain", "RetailChain",
+               "EventCompany", "HealthMinistry", "ScienceUni", "Engineering College", "Blue Ocean"]
+PROJECT_WORDS = ["تصميم شعار", "تحليل بيانات", "موقع إلكتروني", "Admission Analysis",
+                 "Logo Concepts", "Mobile App", "Annual Report", "بحث تخرج", "Menu Layout", "Brand Guide"]
+CLIENT_TYPES = ["جهة رسمية", "عميل حر", "خدمات طلابية", "مشروع جامعي"]
+FILE_TYPES = ["Report", "Invoice", "Proposal", "Design", "Research", "Lecture", "Tutorial"]
+
+
+def _writer_process(db_path, profile, writer_index, projects_count, start_event, results):
+    """عملية كاتب واحد تنشئ عميلاً ومجموعة مشاريع"""
+    db = DatabaseManager(db_path, profile=profile)
+    start_event.wait()
+
+    started = time.perf_counter()
+    latencies = []
+    failures = 0
+
+    client_id = db.add_client(f"Bench Client {writer_index}", "عميل حر",
+                              f"/bench/writer_{writer_index}", 1)
+
+    for i in range(projects_count):
+        op_start = time.perf_counter()
+        project_id = db.add_project(f"Bench Project {writer_index}-{i}",
+                                    f"P_BENCH_{writer_index:03d}_{i:05d}", client_id,
+                                    f"/bench/writer_{writer_index}/project_{i}")
+        latencies.append(time.perf_counter() - op_start)
+        if not project_id:
+            failures += 1
+
+    results.put({
+        'writer': writer_index,
+        'elapsed': time.perf_counter() - started,
+        'latencies': latencies,
+        'failures': failures
+    })
+
+
+def _percentile(values, percent):
+    """حساب النسبة المئوية من قائمة قيم"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_concurrent_writers(writers=4, projects=100, profile='local', db_path=None):
+    """محاكاة عدة كتّاب متزامنين ينشئون مشاريع في نفس قاعدة البيانات"""
+    temp_dir = None
+    if db_path is None:
+        temp_dir = tempfile.mkdtemp(prefix='organizer_bench_')
+        db_path = os.path.join(temp_dir, 'bench.db')
+
+    db = DatabaseManager(db_path, profile=profile)
+    db.add_structure("Bench Structure", "/bench", {})
+
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_writer_process,
+                                args=(db_path, profile, i, projects, start_event, results))
+        for i in range(writers)
+    ]
+
+    for process in processes:
+        process.start()
+
+    wall_start = time.perf_counter()
+    start_event.set()
+    writer_results = [results.get() for _ in processes]
+    wall_time = time.perf_counter() - wall_start
+
+    for process in processes:
+        process.join()
+
+    latencies = [lat for result in writer_results for lat in result['latencies']]
+    total = writers * projects
+
+    return {
+        'benchmark': 'concurrent_writers',
+        'profile': profile,
+        'journal_mode': db.journal_mode,
+        'writers': writers,
+        'projects_per_writer': projects,
+        'total_projects': total,
+        'failures': sum(result['failures'] for result in writer_results),
+        'wall_time_s': round(wall_time, 4),
+        'projects_per_s': round(total / wall_time, 1) if wall_time else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50) * 1000, 3),
+            'p95': round(_percentile(latencies, 95) * 1000, 3),
+            'p99': round(_percentile(latencies, 99) * 1000, 3),
+            'max': round(max(latencies) * 1000, 3) if latencies else 0.0
+        }
+    }
+
+
+def generate_synthetic_database(db_path, projects, seed=42, profile='local'):
+    """توليد قاعدة بيانات اصطناعية بعدد المشاريع المطلوب"""
+    rng = random.Random(seed)
+    db = DatabaseManager(db_path, profile=profile)
+
+    structures_count = 3
+    clients_count = max(1, projects // 10)
+    now = datetime.now()
+
+    conn = db._connect()
+    try:
+        conn.executemany('''
+            INSERT INTO structures (name, base_path, structure_data, created_date, last_modified)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(f"Structure {i}", f"/bench/structure_{i}", json.dumps(FOLDER_STRUCTURE),
+               now.isoformat(), now.isoformat()) for i in range(1, structures_count + 1)])
+
+        def client_rows():
+            for i in range(1, clients_count + 1):
+                name = f"{rng.choice(ARABIC_NAMES + LATIN_NAMES)} {i}"
+                yield (name, rng.choice(CLIENT_TYPES), f"/bench/clients/{i}",
+                       rng.randint(1, structures_count), now.isoformat(), name)
+
+        conn.executemany('''
+            INSERT INTO clients (name, type, folder_path, structure_id, created_date, name_key)
+            VALUES (?, ?, ?, ?, ?, normalize_name(?))
+        ''', client_rows())
+
+        # توزيع المشاريع على 1200 شهر ابتداءً من الشهر الحالي (بحد أقصى 999 مشروع لكل شهر)
+        def project_rows():
+            for i in range(projects):
+                months_back = i % 1200
+                year = now.year + (now.month - 1 - months_back) // 12
+                month = (now.month - 1 - months_back) % 12 + 1
+                sequence = i // 1200 + 1
+                number = f"P_{year % 100:02d}{month:02d}_{sequence:03d}"
+                created = datetime(year, month, rng.randint(1, 28)).isoformat()
+                client_id = rng.randint(1, clients_count)
+                name = rng.choice(PROJECT_WORDS)
+                yield (name, number, client_id, f"/bench/clients/{client_id}/{number}", created, created, "", name)
+
+        conn.executemany('''
+            INSERT INTO projects (name, project_number, client_id, folder_path, created_date, last_modified,
+                                  description, name_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, normalize_name(?))
+        ''', project_rows())
+        conn.commit()
+    finally:
+        conn.close()
+
+    return db
+
+
+def _time_call(func, repeat=20, budget=2.0):
+    """تنفيذ دالة عدة مرات وإرجاع إحصائيات الزمن بالمللي ثانية"""
+    timings = []
+    started = time.perf_counter()
+    result = None
+
+    while len(timings) < repeat:
+        op_start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - op_start)
+        if time.perf_counter() - started > budget:
+            break
+
+    stats = {
+        'runs': len(timings),
+        'min_ms': round(min(timings) * 1000, 3),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'p50_ms': round(_percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(_percentile(timings, 95) * 1000, 3)
+    }
+    if isinstance(result, list):
+        stats['rows'] = len(result)
+    return stats
+
+
+def bench_database_methods(db, repeat=20, budget=2.0):
+    """قياس زمن كل عمليات DatabaseManager"""
+    counter = iter(range(10 ** 9))
+    some_client = db.get_clients()[0]
+    some_project_number = db.generate_next_project_number()
+    conn = db._connect()
+    try:
+        existing_number = conn.execute('SELECT project_number FROM projects ORDER BY id LIMIT 1').fetchone()[0]
+    finally:
+        conn.close()
+
+    return {
+        'get_structures': _time_call(db.get_structures, repeat, budget),
+        'get_clients_all': _time_call(db.get_clients, repeat, budget),
+        'get_clients_by_structure': _time_call(lambda: db.get_clients(1), repeat, budget),
+        'get_projects_all': _time_call(db.get_projects, repeat, budget),
+        'get_projects_by_client': _time_call(lambda: db.get_projects(some_client[0]), repeat, budget),
+        'check_project_exists_hit': _time_call(lambda: db.check_project_exists(existing_number), repeat, budget),
+        'check_project_exists_miss': _time_call(lambda: db.check_project_exists("P_9999_999"), repeat, budget),
+        'check_client_exists': _time_call(lambda: db.check_client_exists(some_client[1], some_client[4]),
+                                          repeat, budget),
+        'generate_next_project_number': _time_call(db.generate_next_project_number, repeat, budget),
+        'search_clients_prefix': _time_call(lambda: db.search_clients(1, some_client[1][:2]), repeat, budget),
+        'search_projects_prefix': _time_call(lambda: db.search_projects("P_0"), repeat, budget),
+        'search_projects_name': _time_call(lambda: db.search_projects(PROJECT_WORDS[0][:3]), repeat, budget),
+        'add_structure': _time_call(lambda: db.add_structure(f"Bench {next(counter)}", "/bench", {}),
+                                    repeat, budget),
+        'add_client': _time_call(lambda: db.add_client("Bench Client", "عميل حر",
+                                                       f"/bench/new_client_{next(counter)}", 1),
+                                 repeat, budget),
+        'add_project': _time_call(lambda: db.add_project("Bench", f"{some_project_number}_{next(counter)}",
+                                                         some_client[0], f"/bench/new_{next(counter)}"),
+                                  repeat, budget),
+        # أسماء مختلفة في كل استدعاء، فالاسم المسجل من قبل لا يضاف ولا يقيس الكتابة
+        'add_generated_file': _time_call(lambda: db.add_generated_file(f"bench_{next(counter)}.pdf", 1, "Report"),
+                                         repeat, budget),
+        'add_generated_files_100': _time_call(
+            lambda: db.add_generated_files([(f"bench_{next(counter)}.pdf", 1, "Report", "") for _ in range(100)]),
+            repeat, budget)
+    }
+
+
+def bench_folder_creation(base_dir, repeat=10, budget=5.0):
+    """قياس زمن إنشاء الهيكل الكامل للمجلدات في مسار معين"""
+    counter = iter(range(10 ** 9))
+    work_dir = tempfile.mkdtemp(prefix='organizer_tree_', dir=base_dir)
+    try:
+        return _time_call(lambda: create_folder_tree(os.path.join(work_dir, str(next(counter))),
+                                                     FOLDER_STRUCTURE), repeat, budget)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_filename_generator(count=100000, seed=42):
+    """قياس سرعة مولد أسماء الملفات"""
+    rng = random.Random(seed)
+    inputs = [("2024-11-15", rng.choice(FILE_TYPES), rng.choice(LATIN_NAMES),
+               rng.choice(PROJECT_WORDS), "v01", "pdf") for _ in range(count)]
+
+    started = time.perf_counter()
+    for args in inputs:
+        build_filename(*args)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'count': count,
+        'total_ms': round(elapsed * 1000, 3),
+        'names_per_s': round(count / elapsed, 1) if elapsed else None
+    }
+
+
+def bench_filename_parser(count=1000000, seed=42):
+    """قياس سرعة تحليل أسماء الملفات والتحقق منها (مع نسبة من الأسماء المخالفة)"""
+    rng = random.Random(seed)
+    samples = [build_filename("2024-11-15", file_type, rng.choice(LATIN_NAMES), rng.choice(PROJECT_WORDS),
+                              "v01", "pdf") for file_type in FILE_TYPES for _ in range(20)]
+    samples += ["scan 0001.pdf", "2024-11-15_Report_final.docx", "2024-11-15_Memo_X_notes_v1.exe"]
+    names = [rng.choice(samples) for _ in range(count)]
+
+    parser = FilenameParser()
+    started = time.perf_counter()
+    invalid = 0
+    for name in names:
+        if parser.validate(name):
+            invalid += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'count': count,
+        'invalid': invalid,
+        'total_ms': round(elapsed * 1000, 3),
+        'names_per_s': round(count / elapsed, 1) if elapsed else None
+    }
+
+
+def _measure_memory(func):
+    """قياس الزمن وذروة الذاكرة المخصصة أثناء تنفيذ دالة"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {'time_s': round(elapsed, 3), 'peak_mb': round(peak / 1024 / 1024, 1)}
+
+
+def bench_row_memory(rows=1000000, seed=42, db_path=None):
+    """مقارنة ذاكرة تحميل المشاريع: tuples كاملة (السابق) مقابل ProjectRow والتدفق"""
+    temp_dir = None
+    if db_path is None:
+        temp_dir = tempfile.mkdtemp(prefix='organizer_rows_')
+        db_path = os.path.join(temp_dir, 'rows.db')
+
+    try:
+        db = generate_synthetic_database(db_path, rows, seed)
+
+        def legacy_fetchall():
+            # الطريقة السابقة: SELECT p.* وقائمة كاملة من tuples
+            conn = db._connect()
+            try:
+                return len(conn.execute('''
+                    SELECT p.*, c.name as client_name, c.type as client_type
+                    FROM projects p JOIN clients c ON p.client_id = c.id
+                    ORDER BY p.created_date DESC
+                ''').fetchall())
+            finally:
+                conn.close()
+
+        def streaming():
+            count = 0
+            for _ in db.iter_projects():
+                count += 1
+            return count
+
+        results = {'rows': rows}
+        for name, func in (('legacy_tuples', legacy_fetchall),
+                           ('project_rows_list', lambda: len(db.get_projects())),
+                           ('project_rows_stream', streaming)):
+            count, stats = _measure_memory(func)
+            stats['count'] = count
+            results[name] = stats
+        return results
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def bench_storage_backends(clients=1000, projects_per_client=10, profile='local', seed=42):
+    """إنشاء نفس البيانات عبر SQLite (معاملة لكل عملية) مقابل الذاكرة مع حفظ واحد في النهاية"""
+    rng = random.Random(seed)
+    names = [(f"{rng.choice(ARABIC_NAMES + LATIN_NAMES)} {i}", rng.choice(CLIENT_TYPES)) for i in range(clients)]
+
+    def populate(db):
+        structure_id = db.add_structure("هيكل القياس", "/bench", FOLDER_STRUCTURE)
+        for i, (name, client_type) in enumerate(names):
+            client_id = db.add_client(name, client_type, f"/bench/c{i}", structure_id)
+            for j in range(projects_per_client):
+                db.add_project(f"{rng.choice(PROJECT_WORDS)} {j}", f"P_0001_{i:05d}_{j:03d}",
+                               client_id, f"/bench/c{i}/p{j}")
+
+    temp_dir = tempfile.mkdtemp(prefix='organizer_storage_')
+    try:
+        started = time.perf_counter()
+        populate(DatabaseManager(os.path.join(temp_dir, 'sqlite.db'), profile=profile))
+        sqlite_s = time.perf_counter() - started
+
+        memory = MemoryDatabaseManager()
+        started = time.perf_counter()
+        populate(memory)
+        memory_s = time.perf_counter() - started
+        started = time.perf_counter()
+        memory.flush(os.path.join(temp_dir, 'memory.db'))
+        flush_s = time.perf_counter() - started
+
+        rows = clients * (projects_per_client + 1) + 1
+        return {
+            'rows': rows,
+            'profile': profile,
+            'sqlite_s': round(sqlite_s, 3),
+            'memory_s': round(memory_s, 3),
+            'flush_s': round(flush_s, 3),
+            'sqlite_rows_per_s': round(rows / sqlite_s, 1),
+            'memory_rows_per_s': round(rows / (memory_s + flush_s), 1),
+            'speedup': round(sqlite_s / (memory_s + flush_s), 1)
+        }
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def bench_generated_file_recorder(files=5000, batch_size=500, duplicates=0.1, profile='local', seed=42):
+    """تسجيل أسماء الملفات المولدة: معاملة لكل اسم مقابل GeneratedFileRecorder (مع نسبة أسماء مكررة)"""
+    rng = random.Random(seed)
+    names = [(i, build_filename("2024-11-15", rng.choice(FILE_TYPES), rng.choice(LATIN_NAMES),
+                                rng.choice(PROJECT_WORDS), f"v{i:05d}", "pdf")) for i in range(files)]
+    # إعادة نسبة من الأسماء كما يحدث عند الضغط على الحفظ أكثر من مرة
+    names += rng.sample(names, int(files * duplicates))
+
+    temp_dir = tempfile.mkdtemp(prefix='organizer_recorder_')
+    try:
+        results = {'files': files, 'batch_size': batch_size, 'profile': profile}
+        for name in ('per_call', 'recorder'):
+            db = DatabaseManager(os.path.join(temp_dir, f'{name}.db'), profile=profile)
+            structure_id = db.add_structure("هيكل القياس", "/bench", FOLDER_STRUCTURE)
+            client_id = db.add_client("عميل القياس", CLIENT_TYPES[0], "/bench/client", structure_id)
+            project_ids = [db.add_project(f"مشروع {i}", f"P_0001_{i:03d}", client_id, f"/bench/client/p{i}")
+                           for i in range(20)]
+            records = [(filename, project_ids[i % len(project_ids)], "pdf") for i, filename in names]
+
+            started = time.perf_counter()
+            if name == 'per_call':
+                written = sum(db.add_generated_file(*record) is not None for record in records)
+                commits = len(records)
+            else:
+                with GeneratedFileRecorder(db, batch_size, flush_interval=60) as recorder:
+                    for record in records:
+                        recorder.record(*record)
+                written, commits = recorder.stats['written'], recorder.stats['flushes']
+            elapsed = time.perf_counter() - started
+
+            results[name] = {
+                'records': len(records),
+                'written': written,
+                'commits': commits,
+                'total_ms': round(elapsed * 1000, 1),
+                'records_per_s': round(len(records) / elapsed, 1)
+            }
+        results['commit_ratio'] = round(results['per_call']['commits'] / max(results['recorder']['commits'], 1), 1)
+        results['speedup'] = round(results['per_call']['total_ms'] / results['recorder']['total_ms'], 1)
+        return results
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# يشغل في عملية جديدة لكل قياس: استيراد البرنامج وإنشاء الواجهة حتى اكتمال التشغيل
+_COLD_START_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+import project_organizer_smart
+imported = time.perf_counter()
+app = project_organizer_smart.ProjectOrganizer()
+while 'ready' not in app.startup_timings:
+    app.root.update()
+timings = dict(app.startup_timings)
+timings['import'] = round((imported - started) * 1000, 1)
+app.root.destroy()
+print(json.dumps(timings))
+'''
+
+
+def bench_cold_start(runs=5):
+    """قياس زمن التشغيل البارد حتى أول رسم للنافذة (يتطلب شاشة)
+
+    أول تشغيل ينشئ قاعدة بيانات جديدة، والبقية تستخدم قاعدة موجودة بمخطط محدث.
+    """
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=project_dir + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    env.pop('PROJECT_ORGANIZER_SERVER', None)
+
+    temp_dir = tempfile.mkdtemp(prefix='organizer_startup_')
+    samples = []
+    try:
+        for _ in range(runs):
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, '-c', _COLD_START_SCRIPT], cwd=temp_dir, env=env,
+                                       capture_output=True, text=True)
+            wall = time.perf_counter() - started
+            if completed.returncode != 0:
+                return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr else 'failed'}
+            timings = json.loads(completed.stdout.strip().splitlines()[-1])
+            timings['process_ms'] = round(wall * 1000, 1)
+            # زمن أول رسم منذ بداية الاستيراد
+            timings['time_to_first_paint_ms'] = round(timings['import'] + timings['first_paint'], 1)
+            samples.append(timings)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    existing = samples[1:]
+    return {
+        'runs': runs,
+        'new_database': samples[0],
+        'existing_database': {stage: _percentile([sample[stage] for sample in existing], 50)
+                              for stage in samples[0]} if existing else None
+    }
+
+
+def _environment_info():
+    """معلومات البيئة لمقارنة النتائج بين الإيداعات"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit or None,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform()
+    }
+
+
+def run_suite(sizes, profile='local', repeat=20, disk_dir=None, tmpfs_dir='/dev/shm', seed=42):
+    """تشغيل مجموعة القياسات الكاملة"""
+    results = {'environment': _environment_info(), 'profile': profile, 'databases': {}}
+
+    for size in sizes:
+        temp_dir = tempfile.mkdtemp(prefix='organizer_suite_', dir=disk_dir)
+        try:
+            db_path = os.path.join(temp_dir, 'bench.db')
+            started = time.perf_counter()
+            db = generate_synthetic_database(db_path, size, seed, profile)
+            results['databases'][str(size)] = {
+                'generate_s': round(time.perf_counter() - started, 3),
+                'file_size_bytes': os.path.getsize(db_path),
+                'methods': bench_database_methods(db, repeat)
+            }
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    results['folder_creation'] = {'disk': bench_folder_creation(disk_dir)}
+    if tmpfs_dir and os.path.isdir(tmpfs_dir):
+        results['folder_creation']['tmpfs'] = bench_folder_creation(tmpfs_dir)
+
+    results['filename_generator'] = bench_filename_generator(seed=seed)
+    results['filename_parser'] = bench_filename_parser(seed=seed)
+    return results
+
+
+def _flatten(data, prefix=''):
+    """تحويل النتائج المتداخلة إلى مفاتيح مسطحة لقيم الزمن"""
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif key in ('p50_ms', 'total_ms', 'generate_s'):
+            flat[path] = value
+    return flat
+
+
+def compare_results(base, current, threshold=0.2):
+    """مقارنة نتيجتين وإرجاع التغيرات التي تتجاوز الحد المسموح"""
+    base_flat = _flatten(base)
+    current_flat = _flatten(current)
+    changes = []
+
+    for key in sorted(base_flat.keys() & current_flat.keys()):
+        before, after = base_flat[key], current_flat[key]
+        if not before:
+            continue
+        ratio = after / before
+        changes.append({
+            'metric': key,
+            'base': before,
+            'current': after,
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1 + threshold
+        })
+
+    return {
+        'base_commit': base.get('environment', {}).get('commit'),
+        'current_commit': current.get('environment', {}).get('commit'),
+        'threshold': threshold,
+        'regressions': sum(1 for change in changes if change['regression']),
+        'changes': changes
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="قياس أداء منظم المشاريع")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    writers_parser = subparsers.add_parser('writers', help="كتّاب متزامنون ينشئون مشاريع")
+    writers_parser.add_argument('--writers', type=int, default=4)
+    writers_parser.add_argument('--projects', type=int, default=100)
+    writers_parser.add_argument('--profile', choices=sorted(STORAGE_PROFILES), default='local')
+    writers_parser.add_argument('--db', default=None, help="مسار قاعدة البيانات (افتراضياً ملف مؤقت)")
+
+    suite_parser = subparsers.add_parser('suite', help="قياس كل عمليات قاعدة البيانات والمجلدات والتسمية")
+    suite_parser.add_argument('--sizes', default='1000,10000',
+                              help="أحجام قواعد البيانات (عدد المشاريع) مفصولة بفواصل")
+    suite_parser.add_argument('--profile', choices=sorted(STORAGE_PROFILES), default='local')
+    suite_parser.add_argument('--repeat', type=int, default=20)
+    suite_parser.add_argument('--disk-dir', default=None, help="مجلد على القرص لقياس إنشاء المجلدات")
+    suite_parser.add_argument('--tmpfs-dir', default='/dev/shm', help="مجلد في الذاكرة (tmpfs)")
+    suite_parser.add_argument('--seed', type=int, default=42)
+    suite_parser.add_argument('--output', default=None, help="حفظ النتائج في ملف JSON")
+
+    parser_parser = subparsers.add_parser('parser', help="تحليل والتحقق من أسماء الملفات")
+    parser_parser.add_argument('--count', type=int, default=1000000)
+    parser_parser.add_argument('--seed', type=int, default=42)
+
+    rows_parser = subparsers.add_parser('rows', help="ذاكرة تحميل المشاريع كقائمة مقابل التدفق")
+    rows_parser.add_argument('--rows', type=int, default=1000000)
+    rows_parser.add_argument('--seed', type=int, default=42)
+    rows_parser.add_argument('--db', default=None, help="مسار قاعدة البيانات (افتراضياً ملف مؤقت)")
+
+    storage_parser = subparsers.add_parser('storage', help="إنشاء البيانات عبر SQLite مقابل التخزين في الذاكرة")
+    storage_parser.add_argument('--clients', type=int, default=1000)
+    storage_parser.add_argument('--projects', type=int, default=10, help="عدد المشاريع لكل عميل")
+    storage_parser.add_argument('--profile', choices=sorted(STORAGE_PROFILES), default='local')
+    storage_parser.add_argument('--seed', type=int, default=42)
+
+    recorder_parser = subparsers.add_parser('recorder', help="تسجيل الملفات المولدة فردياً مقابل الدفعات")
+    recorder_parser.add_argument('--files', type=int, default=5000)
+    recorder_parser.add_argument('--batch-size', type=int, default=500)
+    recorder_parser.add_argument('--duplicates', type=float, default=0.1, help="نسبة الأسماء المكررة")
+    recorder_parser.add_argument('--profile', choices=sorted(STORAGE_PROFILES), default='local')
+    recorder_parser.add_argument('--seed', type=int, default=42)
+
+    startup_parser = subparsers.add_parser('startup', help="زمن التشغيل البارد حتى أول رسم")
+    startup_parser.add_argument('--runs', type=int, default=5)
+
+    compare_parser = subparsers.add_parser('compare', help="مقارنة نتيجتين بين إيداعين")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'writers':
+        result = bench_concurrent_writers(args.writers, args.projects, args.profile, args.db)
+    elif args.command == 'suite':
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+        result = run_suite(sizes, args.profile, args.repeat, args.disk_dir, args.tmpfs_dir, args.seed)
+    elif args.command == 'parser':
+        result = bench_filename_parser(args.count, args.seed)
+    elif args.command == 'rows':
+        result = bench_row_memory(args.rows, args.seed, args.db)
+    elif args.command == 'storage':
+        result = bench_storage_backends(args.clients, args.projects, args.profile, args.seed)
+    elif args.command == 'recorder':
+        result = bench_generated_file_recorder(args.files, args.batch_size, args.duplicates, args.profile, args.seed)
+    elif args.command == 'startup':
+        result = bench_cold_start(args.runs)
+    elif args.command == 'compare':
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+        result = compare_results(base, current, args.threshold)
+
+    if getattr(args, 'output', None):
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+
+    if args.command == 'compare' and result['regressions']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""خادم منظم المشاريع
+
+يمتلك الخادم ملف قاعدة البيانات ويعرض عمليات DatabaseManager عبر HTTP/JSON،
+حتى لا يتشارك أعضاء الفريق ملف SQLite واحد عبر الشبكة.
+
+الخادم يستمع على 127.0.0.1 افتراضياً. لإتاحته لأجهزة الفريق يجب تحديد رمز مشترك،
+لأن الواجهة تسمح بعمليات مثل delete_structure وmerge_clients:
+    PROJECT_ORGANIZER_TOKEN=<رمز سري> python organizer_server.py --db project_organizer.db --host 0.0.0.0
+
+ثم في أجهزة الفريق (بنفس الرمز):
+    PROJECT_ORGANIZER_TOKEN=<رمز سري> PROJECT_ORGANIZER_SERVER=http://server:8765 python project_organizer_smart.py
+
+الرمز يرسل بدون تشفير في ترويسة X-Organizer-Token، فيستخدم الخادم داخل شبكة موثوقة فقط.
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from project_organizer_smart import DatabaseManager, ShardedDatabaseManager, build_filename
+
+
+class UnknownMethodError(Exception):
+    """عملية غير موجودة في واجهة الخادم"""
+
+
+class OrganizerService:
+    """تنفيذ العمليات مع ذاكرة مؤقتة للقراءة وكتابة متسلسلة
+
+    تجميع أسماء الملفات المولدة يتم على الأجهزة (GeneratedFileRecorder) فتصل الدفعة في طلب واحد.
+    """
+
+    # عمليات القراءة (تخزن آخر cache_size نتيجة مؤقتاً حتى أول عملية كتابة)
+    READ_METHODS = {'get_structures', 'get_clients', 'get_projects', 'get_recent_projects',
+                    'get_project_by_number', 'check_project_exists', 'check_client_exists', 'get_setting',
+                    'change_cursor', 'tail_changes', 'search_clients', 'search_projects', 'generated_file_exists',
+                    'get_client'}
+
+    # عمليات الكتابة (تنفذ بالتسلسل وتبطل الذاكرة المؤقتة)
+    WRITE_METHODS = {'add_structure', 'add_client', 'add_project', 'set_setting', 'delete_structure',
+                     'prune_changes', 'set_projects_status', 'merge_clients',
+                     'add_generated_file', 'add_generated_files'}
+
+    def __init__(self, db, reservation_ttl=900, cache_size=1000):
+        self.db = db
+        # عدد نتائج القراءة المحفوظة (البحث أثناء الكتابة ينتج مفتاحاً لكل ضغطة، فتحذف الأقدم استخداماً)
+        self.cache_size = cache_size
+        # مدة حجز رقم مشروع لم يستخدم (بالثواني)
+        self.reservation_ttl = reservation_ttl
+
+        self._write_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._generation = 0
+
+        # أرقام المشاريع المحجوزة ولم تسجل بعد: الرقم -> (الجهاز الحاجز, وقت انتهاء الحجز)
+        self._reserved_numbers = {}
+
+    def call(self, method, args, kwargs, client_id=None):
+        """توجيه الاستدعاء إلى العملية المناسبة (client_id يميز الأجهزة في حجز أرقام المشاريع)"""
+        if method == 'ping':
+            return 'pong'
+
+        # الرقم المحجوز لجهاز آخر يعتبر مستخدماً، أما الجهاز الحاجز فيراه متاحاً حتى ينشئ مشروعه
+        if method == 'check_project_exists' and args and self._reserved_by_other(args[0], client_id):
+            return True
+
+        if method in self.READ_METHODS:
+            key = (method, json.dumps(args), json.dumps(kwargs, sort_keys=True))
+            with self._cache_lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return self._cache[key]
+                generation = self._generation
+            result = getattr(self.db, method)(*args, **kwargs)
+            with self._cache_lock:
+                # عدم تخزين نتيجة قديمة إذا حدثت كتابة أثناء القراءة
+                if generation == self._generation:
+                    self._cache[key] = result
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            return result
+
+        if method in self.WRITE_METHODS:
+            with self._write_lock:
+                result = getattr(self.db, method)(*args, **kwargs)
+                if method == 'add_project' and len(args) > 1:
+                    self._reserved_numbers.pop(args[1], None)
+                self._invalidate_cache()
+            return result
+
+        if method == 'generate_next_project_number':
+            return self.allocate_project_number(client_id)
+
+        if method == 'iter_export_rows':
+            columns, rows = self.db.iter_export_rows(*args, **kwargs)
+            return [columns, list(rows)]
+
+        if method == 'generate_filename':
+            return build_filename(*args, **kwargs)
+
+        raise UnknownMethodError(method)
+
+    def _invalidate_cache(self):
+        """مسح الذاكرة المؤقتة بعد أي تعديل"""
+        with self._cache_lock:
+            self._cache.clear()
+            self._generation += 1
+
+    def _reserved_by_other(self, number, client_id):
+        with self._write_lock:
+            reservation = self._reserved_numbers.get(number)
+        return bool(reservation) and reservation[1] > time.monotonic() and \
+            (client_id is None or reservation[0] != client_id)
+
+    def _release_reservations(self, client_id):
+        """حذف الحجوزات المنتهية وحجز الجهاز السابق (الجهاز ينتظر رقماً واحداً في كل مرة)"""
+        now = time.monotonic()
+        for number, (owner, expires) in list(self._reserved_numbers.items()):
+            if expires <= now or (client_id is not None and owner == client_id):
+                del self._reserved_numbers[number]
+
+    def allocate_project_number(self, client_id=None):
+        """حجز رقم مشروع فريد مركزياً حتى لا يحصل جهازان على نفس الرقم
+
+        الحجز ينتهي بعد reservation_ttl ثانية أو عندما يطلب نفس الجهاز رقماً جديداً،
+        فلا تتراكم أرقام من نوافذ أغلقت دون إنشاء مشروع.
+        """
+        with self._write_lock:
+            self._release_reservations(client_id)
+            number = self.db.generate_next_project_number()
+            prefix, sequence = number.rsplit('_', 1)
+            sequence = int(sequence)
+
+            # تخطي الأرقام المحجوزة لأجهزة أخرى ولم تستخدم بعد
+            while number in self._reserved_numbers:
+                sequence += 1
+                number = f"{prefix}_{sequence:03d}"
+
+            self._reserved_numbers[number] = (client_id, time.monotonic() + self.reservation_ttl)
+            return number
+
+
+class OrganizerRequestHandler(BaseHTTPRequestHandler):
+    """معالج طلبات HTTP بصيغة POST /rpc/<method>"""
+
+    rpc_pattern = re.compile(r'^/rpc/(\w+)$')
+
+    def do_POST(self):
+        token = self.server.token
+        if token and not hmac.compare_digest(self.headers.get('X-Organizer-Token', ''), token):
+            self._send(401, {'error': 'رمز الخادم غير صحيح', 'type': 'PermissionError'})
+            return
+
+        match = self.rpc_pattern.match(self.path)
+        if not match:
+            self._send(404, {'error': 'مسار غير معروف'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            result = self.server.service.call(match.group(1), payload.get('args', []),
+                                              payload.get('kwargs', {}), self.headers.get('X-Organizer-Client'))
+            self._send(200, {'result': result})
+        except UnknownMethodError as e:
+            self._send(404, {'error': f"عملية غير مدعومة: {e}"})
+        except ValueError as e:
+            self._send(400, {'error': str(e), 'type': 'ValueError'})
+        except Exception as e:
+            self._send(500, {'error': str(e), 'type': type(e).__name__})
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # تعطيل سجل الطلبات الافتراضي
+        pass
+
+
+class OrganizerServer(ThreadingHTTPServer):
+    """خادم HTTP يمتلك قاعدة البيانات"""
+
+    daemon_threads = True
+
+    def __init__(self, db_path="project_organizer.db", host='127.0.0.1', port=8765, profile=None, shards_dir=None,
+                 token=None):
+        if not token and not is_loopback(host):
+            raise ValueError("الخادم المتاح على الشبكة يحتاج رمزاً مشتركاً (--token أو PROJECT_ORGANIZER_TOKEN)")
+        # الرمز المطلوب في كل طلب (بدونه يقبل الخادم طلبات الجهاز نفسه فقط)
+        self.token = token
+        if shards_dir:
+            db = ShardedDatabaseManager(shards_dir, profile=profile)
+        else:
+            db = DatabaseManager(db_path, profile=profile)
+        self.service = OrganizerService(db)
+        super().__init__((host, port), OrganizerRequestHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start_in_thread(self):
+        """تشغيل الخادم في خيط منفصل داخل نفس العملية"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def is_loopback(host):
+    """هل العنوان محلي لا يصله إلا الجهاز نفسه"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="خادم منظم المشاريع")
+    parser.add_argument('--db', default="project_organizer.db")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--profile', default=None)
+    parser.add_argument('--shards', default=None, help="مجلد قواعد البيانات المنفصلة لكل هيكل")
+    parser.add_argument('--token', default=os.environ.get('PROJECT_ORGANIZER_TOKEN', ''),
+                        help="رمز مشترك مطلوب من الأجهزة (إلزامي إذا لم يكن العنوان محلياً)")
+    args = parser.parse_args(argv)
+
+    try:
+        server = OrganizerServer(args.db, args.host, args.port, args.profile, args.shards, args.token)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"خادم منظم المشاريع يعمل على {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
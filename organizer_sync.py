@@ -0,0 +1,50 @@
+"""مزامنة منظم المشاريع دون اتصال
+
+يزامن قاعدتي بيانات محليتين (نسخة الجهاز المحمول ونسخة المكتب مثلاً) في الاتجاهين،
+ولا ينقل إلا ما تغير منذ آخر مزامنة بينهما.
+
+التشغيل:
+    python organizer_sync.py sync laptop.db office.db
+
+ولتجنب تعارض أرقام المشاريع يعطى كل جهاز نطاقاً خاصاً به:
+    python organizer_sync.py range laptop.db 500 999
+"""
+import argparse
+
+from project_organizer_smart import DatabaseManager, SyncEngine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="مزامنة منظم المشاريع دون اتصال")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sync_parser = commands.add_parser('sync', help="مزامنة قاعدتي بيانات في الاتجاهين")
+    sync_parser.add_argument('first')
+    sync_parser.add_argument('second')
+
+    range_parser = commands.add_parser('range', help="تحديد نطاق أرقام المشاريع لهذا الجهاز")
+    range_parser.add_argument('db')
+    range_parser.add_argument('low', type=int)
+    range_parser.add_argument('high', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'range':
+        number_range = f"{args.low}-{args.high}"
+        try:
+            DatabaseManager.parse_number_range(number_range)
+        except ValueError as e:
+            parser.error(str(e))
+        DatabaseManager(args.db).set_setting('project_number_range', number_range)
+        print(f"نطاق أرقام المشاريع في {args.db}: {number_range}")
+        return
+
+    stats = SyncEngine().sync(DatabaseManager(args.first), DatabaseManager(args.second))
+    for direction, label in (('a_to_b', f"{args.first} → {args.second}"),
+                             ('b_to_a', f"{args.second} → {args.first}")):
+        counts = stats[direction]
+        print(f"{label}: إضافة {counts['inserted']}، تعديل {counts['updated']}، دمج {counts['merged']}، "
+              f"إعادة ترقيم {counts['renumbered']}، حذف {counts['deleted']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,407 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 from datetime import datetime
 import os
 import sqlite3
-import json
-from pathlib import Path
+import re
+import time
+import random
+import functools
+import itertools
+import threading
+import contextlib
+import logging
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict, deque, namedtuple
+
+# ملفات إعدادات التخزين (تطبق عند فتح كل اتصال بقاعدة البيانات)
+# local: قاعدة بيانات على قرص محلي لمستخدم واحد
+# shared: عدة مستخدمين على نفس الملف، مع تعطيل mmap وانتظار أطول للأقفال
+# safe: بدون WAL للأنظمة التي لا تدعم الذاكرة المشتركة
+STORAGE_PROFILES = {
+    'local': {
+        'journal_mode': 'WAL',
+        'fallback_journal_mode': 'DELETE',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 268435456,
+        'cache_size': -16000
+    },
+    'shared': {
+        'journal_mode': 'WAL',
+        'fallback_journal_mode': 'TRUNCATE',
+        'synchronous': 'FULL',
+        'busy_timeout': 15000,
+        'mmap_size': 0,
+        'cache_size': -8000
+    },
+    'safe': {
+        'journal_mode': 'DELETE',
+        'fallback_journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 15000,
+        'mmap_size': 0,
+        'cache_size': -2000
+    }
+}
+
+DEFAULT_STORAGE_PROFILE = os.environ.get('PROJECT_ORGANIZER_DB_PROFILE', 'local')
+
+# أخطاء الخيوط الخلفية التي لا تظهر للمستخدم مباشرة
+logger = logging.getLogger('project_organizer')
+
+
+class PerformanceMonitor:
+    """قياس عدد الاستدعاءات وزمنها للمسارات الساخنة (معطل افتراضياً)"""
+
+    def __init__(self, max_samples=2048):
+        self.enabled = False
+        self.max_samples = max_samples
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._null_context = contextlib.nullcontext()
+
+    def record(self, name, elapsed, rows=None):
+        """تسجيل زمن استدعاء واحد"""
+        with self._lock:
+            entry = self._stats.get(name)
+            if entry is None:
+                entry = self._stats[name] = {
+                    'count': 0, 'total': 0.0, 'rows': 0,
+                    'samples': deque(maxlen=self.max_samples)
+                }
+            entry['count'] += 1
+            entry['total'] += elapsed
+            entry['samples'].append(elapsed)
+            if rows is not None:
+                entry['rows'] += rows
+
+    def track(self, name):
+        """مزخرف لقياس زمن دالة وعدد الصفوف التي ترجعها"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                self.record(name, elapsed, len(result) if isinstance(result, list) else None)
+                return result
+            return wrapper
+        return decorator
+
+    def timed(self, name):
+        """سياق لقياس زمن كتلة من الكود"""
+        if not self.enabled:
+            return self._null_context
+        return self._timer(name)
+
+    @contextlib.contextmanager
+    def _timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    @staticmethod
+    def _percentile(ordered, percent):
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self):
+        """إرجاع الإحصائيات الحالية (الأزمنة بالمللي ثانية)"""
+        with self._lock:
+            items = [(name, dict(entry, samples=sorted(entry['samples'])))
+                     for name, entry in self._stats.items()]
+
+        result = []
+        for name, entry in sorted(items):
+            ordered = entry['samples']
+            result.append({
+                'name': name,
+                'count': entry['count'],
+                'total_ms': round(entry['total'] * 1000, 3),
+                'p50_ms': round(self._percentile(ordered, 50) * 1000, 3),
+                'p95_ms': round(self._percentile(ordered, 95) * 1000, 3),
+                'p99_ms': round(self._percentile(ordered, 99) * 1000, 3),
+                'rows': entry['rows']
+            })
+        return result
+
+    def reset(self):
+        """مسح جميع الإحصائيات"""
+        with self._lock:
+            self._stats.clear()
+
+    def export(self, path):
+        """حفظ الإحصائيات في ملف JSON"""
+        import json
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'exported': datetime.now().isoformat(), 'stats': self.snapshot()},
+                      f, ensure_ascii=False, indent=2)
+
+
+perf_monitor = PerformanceMonitor()
+perf_monitor.enabled = os.environ.get('PROJECT_ORGANIZER_PERF') == '1'
+
+
+def retry_on_busy(func):
+    """إعادة المحاولة مع تأخير متزايد عند انشغال قاعدة البيانات (SQLITE_BUSY)
+
+    عدد المحاولات من self.busy_retries، أو من self.db.busy_retries للأصناف التي تعمل على DatabaseManager.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        retries = self.busy_retries if hasattr(self, 'busy_retries') else self.db.busy_retries
+        delay = 0.05
+        for attempt in range(retries + 1):
+            try:
+                return func(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if 'locked' not in message and 'busy' not in message:
+                    raise
+                if attempt == retries:
+                    raise
+                # تأخير عشوائي لتجنب تصادم العمليات المتزامنة مرة أخرى
+                time.sleep(delay + random.uniform(0, delay))
+                delay = min(delay * 2, 2.0)
+    return wrapper
+
+
+# أنواع الصفوف المرجعة من قاعدة البيانات: tuples مسماة بدون __dict__ لكل صف،
+# تحافظ على الفهرسة بالموقع (p[2]) وتضيف الوصول بالاسم (p.project_number)
+StructureRow = namedtuple('StructureRow', 'id name base_path structure_data created_date last_modified')
+ClientRow = namedtuple('ClientRow', 'id name type folder_path structure_id created_date')
+ProjectRow = namedtuple('ProjectRow', 'id name project_number client_id folder_path status '
+                                      'created_date last_modified description client_name client_type')
+# سجل التغييرات: op واحد من I (إضافة) و U (تعديل) و D (حذف)
+ChangeRow = namedtuple('ChangeRow', 'seq table_name row_id op changed_at')
+
+# دورة حياة المشروع: لكل حالة الحالات التي يسمح بالانتقال منها إليها
+PROJECT_STATUS_ACTIVE = 'نشط'
+PROJECT_STATUSES = (PROJECT_STATUS_ACTIVE, 'معلق', 'مسلم', 'مؤرشف')
+PROJECT_STATUS_TRANSITIONS = {
+    PROJECT_STATUS_ACTIVE: ('معلق', 'مسلم', 'مؤرشف'),   # استئناف أو إعادة فتح
+    'معلق': (PROJECT_STATUS_ACTIVE,),
+    'مسلم': (PROJECT_STATUS_ACTIVE, 'معلق'),
+    'مؤرشف': (PROJECT_STATUS_ACTIVE, 'معلق', 'مسلم'),
+}
+
+# توحيد أشكال الحروف العربية المتقاربة والأرقام الهندية في مفاتيح المقارنة
+NAME_KEY_TRANSLATION = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+                                      **{chr(0x660 + digit): str(digit) for digit in range(10)}})
+# التشكيل والتطويل
+ARABIC_MARKS_PATTERN = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+
+
+def normalize_name(text):
+    """مفتاح مقارنة للأسماء: بدون تشكيل أو مسافات أو رموز، بحروف صغيرة وأشكال عربية موحدة
+
+    "Sanaa Uni" و"sanaa-uni" و"SanaaUni" لها نفس المفتاح، وكذلك "جامعة صنعاء" و"جامعه صَنعاء".
+    """
+    text = ARABIC_MARKS_PATTERN.sub('', unicodedata.normalize('NFKC', text or '')).casefold()
+    return ''.join(char for char in text.translate(NAME_KEY_TRANSLATION) if char.isalnum())
+
+STRUCTURE_COLUMNS = ', '.join(StructureRow._fields)
+CLIENT_COLUMNS = ', '.join(ClientRow._fields)
+PROJECT_COLUMNS = ', '.join(f"p.{field}" for field in ProjectRow._fields[:-2]) + \
+    ', c.name AS client_name, c.type AS client_type'
+
+
+# إصدار مخطط قاعدة البيانات (يحفظ في PRAGMA user_version)
+# يجب زيادته عند أي تعديل على الجداول أو الـ triggers في _create_schema
+SCHEMA_VERSION = 13
+
+
+class StorageBackend(ABC):
+    """واجهة التخزين التي تعتمد عليها الواجهة والخادم والأدوات
+
+    تنفذها DatabaseManager (ملف SQLite) وShardedDatabaseManager (ملف لكل هيكل)
+    وRemoteDatabaseManager (عبر الخادم) وMemoryDatabaseManager (في الذاكرة).
+    الصفوف المرجعة StructureRow وClientRow وProjectRow في كل التنفيذات، وعمليات الإضافة
+    ترجع معرف الصف الجديد أو None عند تكرار قيمة فريدة (add_generated_files ترجع عدد الصفوف المضافة).
+    tests/test_storage.py يشغل نفس الاختبارات على كل تنفيذ محلي.
+    """
+
+    @abstractmethod
+    def add_structure(self, name, base_path, structure_data):
+        """إضافة هيكل (الاسم فريد)"""
+
+    @abstractmethod
+    def iter_structures(self, batch_size=1000):
+        """الهياكل كتدفق StructureRow (الأحدث أولاً)"""
+
+    def get_structures(self):
+        return list(self.iter_structures())
+
+    @abstractmethod
+    def add_client(self, name, client_type, folder_path, structure_id):
+        """إضافة عميل (مسار المجلد فريد)"""
+
+    @abstractmethod
+    def iter_clients(self, structure_id=None, batch_size=1000):
+        """العملاء كتدفق ClientRow (الأحدث أولاً)"""
+
+    def get_clients(self, structure_id=None):
+        return list(self.iter_clients(structure_id))
+
+    @abstractmethod
+    def get_client(self, client_id):
+        """عميل واحد بمعرفه أو None"""
+
+    @abstractmethod
+    def check_client_exists(self, name, structure_id):
+        """(معرف العميل,) لعميل الهيكل بنفس الاسم الموحد أو None"""
+
+    @abstractmethod
+    def search_clients(self, structure_id, text, limit=20):
+        """عملاء الهيكل الذين يبدأ اسمهم الموحد بالنص"""
+
+    @abstractmethod
+    def merge_clients(self, target_id, source_ids, move_folders=True):
+        """دمج عملاء مكررين في target_id مع نقل مجلدات مشاريعهم ({'projects': .., 'clients': ..})"""
+
+    @abstractmethod
+    def add_project(self, name, project_number, client_id, folder_path, description=""):
+        """إضافة مشروع (الرقم ومسار المجلد فريدان)"""
+
+    @abstractmethod
+    def iter_projects(self, client_id=None, batch_size=1000, status=None):
+        """المشاريع كتدفق ProjectRow (الأحدث أولاً)"""
+
+    def get_projects(self, client_id=None, status=None):
+        return list(self.iter_projects(client_id, status=status))
+
+    @abstractmethod
+    def get_project_by_number(self, project_number):
+        """مشروع واحد برقمه أو None"""
+
+    def check_project_exists(self, project_number):
+        return self.get_project_by_number(project_number) is not None
+
+    @abstractmethod
+    def get_recent_projects(self, structure_id, limit=200, status=None):
+        """أحدث مشاريع الهيكل"""
+
+    @abstractmethod
+    def search_projects(self, text, limit=20, structure_id=None, status=None):
+        """المشاريع التي يبدأ رقمها أو اسمها الموحد بالنص"""
+
+    @abstractmethod
+    def set_projects_status(self, project_ids, status):
+        """تغيير حالة المشاريع المسموح انتقالها، ويرجع عدد المشاريع المعدلة"""
+
+    @abstractmethod
+    def generate_next_project_number(self):
+        """رقم المشروع التالي P_YYMM_XXX"""
+
+    @abstractmethod
+    def delete_structure(self, structure_id, batch_size=500, progress=None):
+        """حذف هيكل مع عملائه ومشاريعه وملفاته المولدة ({'files', 'projects', 'clients', 'structures'})"""
+
+    @abstractmethod
+    def add_generated_file(self, filename, project_id, file_type, file_path=""):
+        """تسجيل ملف مولد (None إذا كان الاسم مسجلاً للمشروع من قبل)"""
+
+    @abstractmethod
+    def add_generated_files(self, records):
+        """تسجيل مجموعة ملفات مولدة، ويرجع عدد الصفوف المضافة"""
+
+    @abstractmethod
+    def generated_file_exists(self, filename, project_id):
+        """هل الاسم مسجل لنفس المشروع"""
+
+    @abstractmethod
+    def iter_export_rows(self, dataset, filters=None, batch_size=1000):
+        """(أسماء الأعمدة, مولد للصفوف) لمجموعة من EXPORT_DATASETS"""
+
+    @abstractmethod
+    def get_setting(self, key, default=None):
+        """قراءة إعداد محفوظ"""
+
+    @abstractmethod
+    def set_setting(self, key, value):
+        """حفظ إعداد (None يحذفه)"""
+
+    @abstractmethod
+    def change_cursor(self):
+        """آخر رقم في سجل التغييرات"""
+
+    @abstractmethod
+    def tail_changes(self, cursor=0, limit=1000, tables=None):
+        """(التغييرات بعد cursor, المؤشر الجديد)"""
 
-class DatabaseManager:
-    def __init__(self, db_path="project_organizer.db"):
+
+class DatabaseManager(StorageBackend):
+    def __init__(self, db_path="project_organizer.db", profile=None, busy_retries=5):
         self.db_path = db_path
+        self.profile_name = profile or DEFAULT_STORAGE_PROFILE
+        if self.profile_name not in STORAGE_PROFILES:
+            raise ValueError(f"ملف إعدادات التخزين غير معروف: {self.profile_name}")
+        self.profile = STORAGE_PROFILES[self.profile_name]
+        self.busy_retries = busy_retries
+        self.journal_mode = None
+        self.apply_storage_profile()
         self.init_database()
-    
+
+    def apply_storage_profile(self):
+        """تفعيل وضع السجل (WAL) مع الرجوع لوضع بديل إذا لم يدعمه نظام الملفات"""
+        conn = sqlite3.connect(self.db_path, timeout=self.profile['busy_timeout'] / 1000)
+        try:
+            # يجب أن يسبق تغيير وضع السجل: تفعيل WAL يكتب رأس الملف فيثبت auto_vacuum على قاعدة جديدة.
+            # على قاعدة موجودة لا يتغير شيء حتى VACUUM كامل (DatabaseMaintenance.full_vacuum)
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            try:
+                mode = conn.execute(f"PRAGMA journal_mode={self.profile['journal_mode']}").fetchone()[0]
+            except sqlite3.OperationalError:
+                mode = None
+
+            # بعض أنظمة الملفات (مثل مجلدات الشبكة) ترفض WAL وتبقي الوضع السابق
+            if not mode or mode.upper() != self.profile['journal_mode']:
+                mode = conn.execute(f"PRAGMA journal_mode={self.profile['fallback_journal_mode']}").fetchone()[0]
+
+            self.journal_mode = mode.upper()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """فتح اتصال بقاعدة البيانات مع تطبيق إعدادات ملف التخزين"""
+        conn = sqlite3.connect(self.db_path, timeout=self.profile['busy_timeout'] / 1000)
+        conn.execute(f"PRAGMA busy_timeout={int(self.profile['busy_timeout'])}")
+        conn.execute(f"PRAGMA synchronous={self.profile['synchronous']}")
+        conn.execute(f"PRAGMA cache_size={int(self.profile['cache_size'])}")
+        conn.execute(f"PRAGMA mmap_size={int(self.profile['mmap_size'])}")
+        # SQLite لا يفرض المفاتيح الأجنبية (ولا ON DELETE CASCADE) إلا إذا فعلت لكل اتصال
+        conn.execute('PRAGMA foreign_keys = ON')
+        # متاحة في الاستعلامات وعمليات الإدخال الجماعية لحساب clients.name_key
+        conn.create_function('normalize_name', 1, normalize_name)
+        return conn
+
+    @retry_on_busy
     def init_database(self):
-        """إنشاء قاعدة البيانات والجداول"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        """إنشاء قاعدة البيانات والجداول (يتم تخطيه إذا كان إصدار المخطط محدثاً)"""
+        conn = self._connect()
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                return
+            # إعادة بناء الجداول أثناء الترحيل يجب ألا تطلق الحذف المتتالي
+            conn.execute('PRAGMA foreign_keys = OFF')
+            self._create_schema(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _create_schema(self, cursor):
         # جدول الهياكل الأساسية
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS structures (
@@ -37,7 +423,7 @@ class DatabaseManager:
                 folder_path TEXT UNIQUE NOT NULL,
                 structure_id INTEGER,
                 created_date TEXT NOT NULL,
-                FOREIGN KEY (structure_id) REFERENCES structures (id)
+                FOREIGN KEY (structure_id) REFERENCES structures (id) ON DELETE CASCADE
             )
         ''')
         
@@ -53,7 +439,7 @@ class DatabaseManager:
                 created_date TEXT NOT NULL,
                 last_modified TEXT NOT NULL,
                 description TEXT,
-                FOREIGN KEY (client_id) REFERENCES clients (id)
+                FOREIGN KEY (client_id) REFERENCES clients (id) ON DELETE CASCADE
             )
         ''')
         
@@ -66,16 +452,378 @@ class DatabaseManager:
                 file_type TEXT NOT NULL,
                 created_date TEXT NOT NULL,
                 file_path TEXT,
-                FOREIGN KEY (project_id) REFERENCES projects (id)
+                FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
             )
         ''')
-        
-        conn.commit()
-        conn.close()
+
+        # ذاكرة مؤقتة لأحجام المجلدات (تبطل عند تغير mtime)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS disk_usage_cache (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                files_size INTEGER NOT NULL,
+                subdirs TEXT NOT NULL
+            )
+        ''')
+
+        # سجل الملفات المنقولة من صندوق الوارد
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS inbox_moves (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                source_path TEXT NOT NULL,
+                dest_path TEXT NOT NULL,
+                project_id INTEGER,
+                moved_date TEXT NOT NULL,
+                FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+            )
+        ''')
+
+        # جدول الإعدادات (حالة الجلسة مثل الهيكل النشط)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+
+        # سجل تشغيلات الصيانة مع أحجام الملف والصفحات قبلها وبعدها
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_date TEXT NOT NULL,
+                tasks TEXT NOT NULL,
+                slices INTEGER NOT NULL,
+                busy_ms REAL NOT NULL,
+                file_size_before INTEGER NOT NULL,
+                file_size_after INTEGER NOT NULL,
+                page_count_before INTEGER NOT NULL,
+                page_count_after INTEGER NOT NULL,
+                freelist_before INTEGER NOT NULL,
+                freelist_after INTEGER NOT NULL,
+                integrity TEXT NOT NULL
+            )
+        ''')
+
+        # قواعد البيانات القديمة أنشئت مفاتيحها الأجنبية بدون ON DELETE CASCADE
+        self._migrate_cascade_keys(cursor)
+
+        # فهارس الاستعلامات المحددة بهيكل أو عميل (وتستخدمها أيضاً عمليات الحذف المتتالي)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_structure ON clients (structure_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_client ON projects (client_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_generated_files_project ON generated_files (project_id)')
+        # اسم الملف فريد لكل مشروع. الفهرس على ifnull(project_id, 0) لأن UNIQUE لا يمنع تكرار NULL
+        # (الملفات بدون مشروع) والمعرفات تبدأ من 1. الأسماء المكررة في القواعد القديمة تحذف قبل إنشائه
+        cursor.execute('DROP INDEX IF EXISTS idx_generated_files_project_name')
+        cursor.execute('''
+            DELETE FROM generated_files WHERE id NOT IN (
+                SELECT MIN(id) FROM generated_files GROUP BY ifnull(project_id, 0), filename)
+        ''')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_generated_files_unique '
+                       'ON generated_files (ifnull(project_id, 0), filename)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_inbox_moves_project ON inbox_moves (project_id)')
+
+        # فهارس جزئية للمشاريع النشطة فقط: العروض الافتراضية لا تتأثر بتراكم المشاريع المنتهية
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_projects_active ON projects (created_date) "
+                       f"WHERE status = '{PROJECT_STATUS_ACTIVE}'")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_projects_client_active ON projects (client_id, created_date) "
+                       f"WHERE status = '{PROJECT_STATUS_ACTIVE}'")
+
+        # جداول التجميع الشهري للتقارير (تحدث تلقائياً عبر triggers)
+        self.init_report_rollups(cursor)
+
+        # سجل التغييرات لمن يريد قراءة الجديد فقط (يحدث تلقائياً عبر triggers)
+        self.init_change_log(cursor)
+
+        # معرفات ثابتة وسجل المحذوفات للمزامنة بين الأجهزة
+        self.init_sync(cursor)
+
+        # مفتاح الاسم الموحد للعملاء والمشاريع (لاكتشاف التكرار والإكمال التلقائي)
+        self.init_name_keys(cursor)
+
+    # الجداول التابعة وأعمدة مفاتيحها الأجنبية (بترتيب الأب قبل الابن)
+    CASCADE_TABLES = (('clients', 'structure_id'), ('projects', 'client_id'),
+                      ('generated_files', 'project_id'), ('inbox_moves', 'project_id'))
+
+    def _migrate_cascade_keys(self, cursor):
+        """إعادة بناء الجداول التي تنقصها ON DELETE CASCADE
+
+        SQLite لا يسمح بتعديل مفتاح أجنبي موجود، لذلك ينشأ جدول بالتعريف الجديد وتنسخ إليه
+        الصفوف بنفس المعرفات ثم يستبدل القديم. الفهارس والـ triggers تعاد بعدها في _create_schema.
+        """
+        tables = [table for table, column in self.CASCADE_TABLES
+                  if any(key[3] == column and key[6] != 'CASCADE'
+                         for key in cursor.execute(f'PRAGMA foreign_key_list({table})').fetchall())]
+        if not tables:
+            return
+
+        # الـ triggers تشير للجداول المعاد بناؤها فتمنع إعادة التسمية، وتنشأ من جديد بعد الترحيل
+        for (trigger,) in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+            cursor.execute(f'DROP TRIGGER {trigger}')
+
+        for table in tables:
+            sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (table,)).fetchone()[0]
+            sql = re.sub(r'(REFERENCES \w+ \(id\))(?! ON DELETE)', r'\1 ON DELETE CASCADE', sql)
+            sql = re.sub(rf'^CREATE TABLE "?{table}"?', f'CREATE TABLE {table}_migrated', sql)
+
+            # الحفاظ على عداد AUTOINCREMENT (بداية نطاق المعرفات في الـ shards)
+            row = cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+
+            cursor.execute(sql)
+            cursor.execute(f'INSERT INTO {table}_migrated SELECT * FROM {table}')
+            cursor.execute(f'DROP TABLE {table}')
+            cursor.execute(f'ALTER TABLE {table}_migrated RENAME TO {table}')
+
+            if row:
+                max_id = cursor.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0] or 0
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)',
+                               (table, max(row[0], max_id)))
+
+    def init_report_rollups(self, cursor):
+        """إنشاء جداول التجميع والـ triggers التي تحدثها عند كل إضافة أو حذف"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'report_projects_by_month'")
+        needs_backfill = cursor.fetchone() is None
+        # قبل trigger تغيير نوع العميل قد تكون أعداد الأنواع قديمة، فتعاد من البيانات مرة واحدة
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_report_clients_retype'")
+        needs_backfill = needs_backfill or cursor.fetchone() is None
+
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS report_projects_by_month (
+                month TEXT PRIMARY KEY,
+                project_count INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS report_projects_by_type_month (
+                month TEXT NOT NULL,
+                client_type TEXT NOT NULL,
+                project_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, client_type)
+            );
+
+            CREATE TABLE IF NOT EXISTS report_projects_by_client (
+                client_id INTEGER PRIMARY KEY,
+                project_count INTEGER NOT NULL DEFAULT 0,
+                last_project_date TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS report_files_by_type_month (
+                month TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                file_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, file_type)
+            );
+
+            CREATE TRIGGER IF NOT EXISTS trg_report_projects_insert AFTER INSERT ON projects
+            BEGIN
+                INSERT OR IGNORE INTO report_projects_by_month (month) VALUES (substr(NEW.created_date, 1, 7));
+                UPDATE report_projects_by_month SET project_count = project_count + 1
+                    WHERE month = substr(NEW.created_date, 1, 7);
+
+                INSERT OR IGNORE INTO report_projects_by_type_month (month, client_type)
+                    SELECT substr(NEW.created_date, 1, 7), type FROM clients WHERE id = NEW.client_id;
+                UPDATE report_projects_by_type_month SET project_count = project_count + 1
+                    WHERE month = substr(NEW.created_date, 1, 7)
+                      AND client_type = (SELECT type FROM clients WHERE id = NEW.client_id);
+
+                INSERT OR IGNORE INTO report_projects_by_client (client_id, last_project_date)
+                    VALUES (NEW.client_id, NEW.created_date);
+                UPDATE report_projects_by_client SET project_count = project_count + 1,
+                    last_project_date = max(last_project_date, NEW.created_date)
+                    WHERE client_id = NEW.client_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_report_projects_delete AFTER DELETE ON projects
+            BEGIN
+                UPDATE report_projects_by_month SET project_count = project_count - 1
+                    WHERE month = substr(OLD.created_date, 1, 7);
+                UPDATE report_projects_by_type_month SET project_count = project_count - 1
+                    WHERE month = substr(OLD.created_date, 1, 7)
+                      AND client_type = (SELECT type FROM clients WHERE id = OLD.client_id);
+                UPDATE report_projects_by_client SET project_count = project_count - 1
+                    WHERE client_id = OLD.client_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_report_projects_move AFTER UPDATE OF client_id ON projects
+            WHEN OLD.client_id IS NOT NEW.client_id
+            BEGIN
+                UPDATE report_projects_by_type_month SET project_count = project_count - 1
+                    WHERE month = substr(OLD.created_date, 1, 7)
+                      AND client_type = (SELECT type FROM clients WHERE id = OLD.client_id);
+                INSERT OR IGNORE INTO report_projects_by_type_month (month, client_type)
+                    SELECT substr(NEW.created_date, 1, 7), type FROM clients WHERE id = NEW.client_id;
+                UPDATE report_projects_by_type_month SET project_count = project_count + 1
+                    WHERE month = substr(NEW.created_date, 1, 7)
+                      AND client_type = (SELECT type FROM clients WHERE id = NEW.client_id);
+
+                UPDATE report_projects_by_client SET project_count = project_count - 1
+                    WHERE client_id = OLD.client_id;
+                INSERT OR IGNORE INTO report_projects_by_client (client_id, last_project_date)
+                    VALUES (NEW.client_id, NEW.created_date);
+                UPDATE report_projects_by_client SET project_count = project_count + 1,
+                    last_project_date = max(last_project_date, NEW.created_date)
+                    WHERE client_id = NEW.client_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_report_clients_delete AFTER DELETE ON clients
+            BEGIN
+                DELETE FROM report_projects_by_client WHERE client_id = OLD.id;
+            END;
+
+            -- تغيير نوع العميل (يدوياً أو من المزامنة) ينقل مشاريعه في كل شهر من النوع القديم للجديد
+            CREATE TRIGGER IF NOT EXISTS trg_report_clients_retype AFTER UPDATE OF type ON clients
+            WHEN OLD.type IS NOT NEW.type
+            BEGIN
+                UPDATE report_projects_by_type_month SET project_count = project_count - (
+                        SELECT COUNT(*) FROM projects
+                        WHERE client_id = NEW.id AND substr(created_date, 1, 7) = report_projects_by_type_month.month)
+                    WHERE client_type = OLD.type
+                      AND month IN (SELECT substr(created_date, 1, 7) FROM projects WHERE client_id = NEW.id);
+                INSERT OR IGNORE INTO report_projects_by_type_month (month, client_type)
+                    SELECT DISTINCT substr(created_date, 1, 7), NEW.type FROM projects WHERE client_id = NEW.id;
+                UPDATE report_projects_by_type_month SET project_count = project_count + (
+                        SELECT COUNT(*) FROM projects
+                        WHERE client_id = NEW.id AND substr(created_date, 1, 7) = report_projects_by_type_month.month)
+                    WHERE client_type = NEW.type
+                      AND month IN (SELECT substr(created_date, 1, 7) FROM projects WHERE client_id = NEW.id);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_report_files_insert AFTER INSERT ON generated_files
+            BEGIN
+                INSERT OR IGNORE INTO report_files_by_type_month (month, file_type)
+                    VALUES (substr(NEW.created_date, 1, 7), NEW.file_type);
+                UPDATE report_files_by_type_month SET file_count = file_count + 1
+                    WHERE month = substr(NEW.created_date, 1, 7) AND file_type = NEW.file_type;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_report_files_delete AFTER DELETE ON generated_files
+            BEGIN
+                UPDATE report_files_by_type_month SET file_count = file_count - 1
+                    WHERE month = substr(OLD.created_date, 1, 7) AND file_type = OLD.file_type;
+            END;
+        ''')
+
+        # قاعدة بيانات قديمة: حساب التجميعات من البيانات الموجودة مرة واحدة
+        if needs_backfill:
+            self._rebuild_report_rollups(cursor)
+
+    # الجداول التي تسجل تغييراتها في change_log
+    CHANGE_LOG_TABLES = ('structures', 'clients', 'projects', 'generated_files')
+
+    def init_change_log(self, cursor):
+        """إنشاء سجل التغييرات (للإضافة فقط) والـ triggers التي تملؤه
+
+        seq يزيد دائماً ولا يعاد استخدامه (AUTOINCREMENT) حتى بعد حذف السجلات القديمة،
+        لذلك يكفي المستهلك حفظ آخر seq قرأه. السجل يحفظ المعرف ونوع العملية فقط،
+        والمستهلك يقرأ الصف الحالي بمعرفه إذا احتاجه.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                op TEXT NOT NULL,
+                changed_at TEXT NOT NULL
+            )
+        ''')
+
+        for table in self.CHANGE_LOG_TABLES:
+            for event, op, row in (('INSERT', 'I', 'NEW'), ('UPDATE', 'U', 'NEW'), ('DELETE', 'D', 'OLD')):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_change_{table}_{event.lower()} AFTER {event} ON {table}
+                    BEGIN
+                        INSERT INTO change_log (table_name, row_id, op, changed_at)
+                        VALUES ('{table}', {row}.id, '{op}', strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+                    END
+                ''')
+
+    # الجداول التي تحفظ normalize_name(name) في عمود name_key
+    NAME_KEY_TABLES = ('clients', 'projects')
+
+    def init_name_keys(self, cursor):
+        """عمود name_key (normalize_name للاسم) مع فهرس يبحث بالتطابق أو ببداية الاسم"""
+        for table in self.NAME_KEY_TABLES:
+            columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+            if 'name_key' not in columns:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN name_key TEXT')
+            cursor.execute(f'UPDATE {table} SET name_key = normalize_name(name) WHERE name_key IS NULL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_name_key ON clients (structure_id, name_key)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_name_key ON projects (name_key)')
+
+    def init_sync(self, cursor):
+        """عمود uuid ثابت لكل صف (يعين عند أول مزامنة) وسجل بمعرفات الصفوف المحذوفة
+
+        المعرفات الرقمية تختلف بين الأجهزة، لذلك تطابق الصفوف بين قاعدتين بالـ uuid،
+        ويحفظ uuid كل صف محذوف حتى ينقل الحذف للجهاز الآخر.
+        """
+        for table in self.CHANGE_LOG_TABLES:
+            columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+            if 'uuid' not in columns:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN uuid TEXT')
+            cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uuid ON {table} (uuid)')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_tombstones (
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                uuid TEXT NOT NULL,
+                deleted_at TEXT NOT NULL,
+                PRIMARY KEY (table_name, row_id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_tombstones_uuid ON sync_tombstones (uuid)')
+
+        for table in self.CHANGE_LOG_TABLES:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_delete AFTER DELETE ON {table}
+                WHEN OLD.uuid IS NOT NULL
+                BEGIN
+                    INSERT OR REPLACE INTO sync_tombstones (table_name, row_id, uuid, deleted_at)
+                    VALUES ('{table}', OLD.id, OLD.uuid, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+                END
+            ''')
+
+    def _rebuild_report_rollups(self, cursor):
+        cursor.executescript('''
+            DELETE FROM report_projects_by_month;
+            DELETE FROM report_projects_by_type_month;
+            DELETE FROM report_projects_by_client;
+            DELETE FROM report_files_by_type_month;
+
+            INSERT INTO report_projects_by_month (month, project_count)
+                SELECT substr(created_date, 1, 7), COUNT(*) FROM projects GROUP BY 1;
+
+            INSERT INTO report_projects_by_type_month (month, client_type, project_count)
+                SELECT substr(p.created_date, 1, 7), c.type, COUNT(*)
+                FROM projects p JOIN clients c ON p.client_id = c.id GROUP BY 1, 2;
+
+            INSERT INTO report_projects_by_client (client_id, project_count, last_project_date)
+                SELECT client_id, COUNT(*), MAX(created_date) FROM projects
+                WHERE client_id IS NOT NULL GROUP BY client_id;
+
+            INSERT INTO report_files_by_type_month (month, file_type, file_count)
+                SELECT substr(created_date, 1, 7), file_type, COUNT(*) FROM generated_files GROUP BY 1, 2;
+        ''')
+
+    @retry_on_busy
+    def rebuild_report_rollups(self):
+        """إعادة حساب جداول التجميع بالكامل (للإصلاح فقط)"""
+        conn = self._connect()
+        try:
+            self._rebuild_report_rollups(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
     
+    @perf_monitor.track('db.add_structure')
+    @retry_on_busy
     def add_structure(self, name, base_path, structure_data):
         """إضافة هيكل جديد"""
-        conn = sqlite3.connect(self.db_path)
+        import json
+
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -93,28 +841,45 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def _iter_rows(self, row_type, query, params=(), batch_size=1000):
+        """قراءة الصفوف على دفعات كـ row_type دون تحميل النتيجة كاملة في الذاكرة"""
+        make = row_type._make
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.execute(query, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from map(make, batch)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def iter_structures(self, batch_size=1000):
+        """الهياكل كتدفق StructureRow"""
+        return self._iter_rows(StructureRow, f'SELECT {STRUCTURE_COLUMNS} FROM structures ORDER BY created_date DESC',
+                               batch_size=batch_size)
+
+    @perf_monitor.track('db.get_structures')
     def get_structures(self):
         """الحصول على جميع الهياكل"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM structures ORDER BY created_date DESC')
-        structures = cursor.fetchall()
-        conn.close()
-        
-        return structures
+        return list(self.iter_structures())
     
+    @perf_monitor.track('db.add_client')
+    @retry_on_busy
     def add_client(self, name, client_type, folder_path, structure_id):
         """إضافة عميل جديد"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
             current_time = datetime.now().isoformat()
             cursor.execute('''
-                INSERT INTO clients (name, type, folder_path, structure_id, created_date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, client_type, folder_path, structure_id, current_time))
+                INSERT INTO clients (name, type, folder_path, structure_id, created_date, name_key)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (name, client_type, folder_path, structure_id, current_time, normalize_name(name)))
             
             client_id = cursor.lastrowid
             conn.commit()
@@ -124,32 +889,39 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def iter_clients(self, structure_id=None, batch_size=1000):
+        """العملاء كتدفق ClientRow"""
+        if structure_id:
+            return self._iter_rows(ClientRow, f'''
+                SELECT {CLIENT_COLUMNS} FROM clients WHERE structure_id = ? ORDER BY created_date DESC
+            ''', (structure_id,), batch_size)
+        return self._iter_rows(ClientRow, f'SELECT {CLIENT_COLUMNS} FROM clients ORDER BY created_date DESC',
+                               batch_size=batch_size)
+
+    @perf_monitor.track('db.get_clients')
     def get_clients(self, structure_id=None):
         """الحصول على العملاء"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if structure_id:
-            cursor.execute('SELECT * FROM clients WHERE structure_id = ? ORDER BY created_date DESC', (structure_id,))
-        else:
-            cursor.execute('SELECT * FROM clients ORDER BY created_date DESC')
-        
-        clients = cursor.fetchall()
-        conn.close()
-        
-        return clients
+        return list(self.iter_clients(structure_id))
+
+    def get_client(self, client_id):
+        """الحصول على عميل واحد بمعرفه (ClientRow أو None)"""
+        return next(self._iter_rows(ClientRow, f'SELECT {CLIENT_COLUMNS} FROM clients WHERE id = ?', (client_id,)), None)
     
+    @perf_monitor.track('db.add_project')
+    @retry_on_busy
     def add_project(self, name, project_number, client_id, folder_path, description=""):
         """إضافة مشروع جديد"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
             current_time = datetime.now().isoformat()
             cursor.execute('''
-                INSERT INTO projects (name, project_number, client_id, folder_path, created_date, last_modified, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (name, project_number, client_id, folder_path, current_time, current_time, description))
+                INSERT INTO projects (name, project_number, client_id, folder_path, created_date, last_modified,
+                                      description, name_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, project_number, client_id, folder_path, current_time, current_time, description,
+                  normalize_name(name)))
             
             project_id = cursor.lastrowid
             conn.commit()
@@ -159,35 +931,206 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def get_projects(self, client_id=None):
-        """الحصول على المشاريع"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    @staticmethod
+    def _status_condition(status):
+        """شرط الحالة في استعلامات المشاريع (الحالة النشطة قيمة حرفية حتى يستخدم SQLite الفهرس الجزئي)"""
+        if status is None:
+            return [], []
+        if status == PROJECT_STATUS_ACTIVE:
+            return [f"p.status = '{PROJECT_STATUS_ACTIVE}'"], []
+        return ['p.status = ?'], [status]
+
+    def iter_projects(self, client_id=None, batch_size=1000, status=None):
+        """المشاريع كتدفق ProjectRow (كلها أو بحالة معينة فقط)"""
+        conditions, params = self._status_condition(status)
         if client_id:
-            cursor.execute('''
-                SELECT p.*, c.name as client_name, c.type as client_type 
-                FROM projects p 
-                JOIN clients c ON p.client_id = c.id 
-                WHERE p.client_id = ? 
-                ORDER BY p.created_date DESC
-            ''', (client_id,))
-        else:
-            cursor.execute('''
-                SELECT p.*, c.name as client_name, c.type as client_type 
-                FROM projects p 
-                JOIN clients c ON p.client_id = c.id 
-                ORDER BY p.created_date DESC
-            ''')
-        
-        projects = cursor.fetchall()
-        conn.close()
-        
-        return projects
+            conditions.append('p.client_id = ?')
+            params.append(client_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self._iter_rows(ProjectRow, f'''
+            SELECT {PROJECT_COLUMNS}
+            FROM projects p
+            JOIN clients c ON p.client_id = c.id
+            {where}
+            ORDER BY p.created_date DESC
+        ''', params, batch_size)
+
+    @perf_monitor.track('db.get_projects')
+    def get_projects(self, client_id=None, status=None):
+        """الحصول على المشاريع"""
+        return list(self.iter_projects(client_id, status=status))
+
+    @perf_monitor.track('db.set_projects_status')
+    @retry_on_busy
+    def set_projects_status(self, project_ids, status):
+        """نقل عدة مشاريع إلى حالة جديدة بعبارة واحدة وإرجاع عدد المشاريع المنقولة
+
+        المشاريع التي لا تسمح حالتها الحالية بالانتقال (PROJECT_STATUS_TRANSITIONS) تبقى كما هي.
+        """
+        import json
+
+        if status not in PROJECT_STATUS_TRANSITIONS:
+            raise ValueError(f"حالة مشروع غير معروفة: {status}")
+        sources = PROJECT_STATUS_TRANSITIONS[status]
+        conn = self._connect()
+        try:
+            cursor = conn.execute(f'''
+                UPDATE projects SET status = ?, last_modified = ?
+                WHERE id IN (SELECT value FROM json_each(?))
+                  AND status IN ({', '.join('?' * len(sources))})
+            ''', (status, datetime.now().isoformat(), json.dumps(list(project_ids)), *sources))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    @perf_monitor.track('db.get_project_by_number')
+    def get_project_by_number(self, project_number):
+        """الحصول على مشروع واحد برقمه (ProjectRow أو None)"""
+        return next(self._iter_rows(ProjectRow, f'''
+            SELECT {PROJECT_COLUMNS}
+            FROM projects p
+            JOIN clients c ON p.client_id = c.id
+            WHERE p.project_number = ?
+        ''', (project_number,)), None)
     
+    @perf_monitor.track('db.get_recent_projects')
+    def get_recent_projects(self, structure_id, limit=200, status=None):
+        """أحدث مشاريع هيكل معين"""
+        conditions, params = self._status_condition(status)
+        return list(self._iter_rows(ProjectRow, f'''
+            SELECT {PROJECT_COLUMNS}
+            FROM projects p
+            JOIN clients c ON p.client_id = c.id
+            WHERE {' AND '.join(conditions + ['c.structure_id = ?'])}
+            ORDER BY p.created_date DESC
+            LIMIT ?
+        ''', (*params, structure_id, limit)))
+
+    @staticmethod
+    def _prefix_range(prefix):
+        """حدود بحث النطاق عن كل القيم التي تبدأ بـ prefix (تستخدم الفهرس مثل LIKE 'x%')"""
+        return prefix, prefix + '\U0010ffff'
+
+    @perf_monitor.track('db.search_clients')
+    def search_clients(self, structure_id, text, limit=20):
+        """عملاء الهيكل الذين يبدأ اسمهم الموحد بالنص المكتوب (للإكمال التلقائي)"""
+        low, high = self._prefix_range(normalize_name(text))
+        return list(self._iter_rows(ClientRow, f'''
+            SELECT {CLIENT_COLUMNS} FROM clients
+            WHERE structure_id = ? AND name_key >= ? AND name_key < ?
+            ORDER BY name_key
+            LIMIT ?
+        ''', (structure_id, low, high, limit)))
+
+    @perf_monitor.track('db.search_projects')
+    def search_projects(self, text, limit=20, structure_id=None, status=None):
+        """المشاريع التي يبدأ رقمها أو اسمها الموحد بالنص المكتوب (للإكمال التلقائي)
+
+        كل بحث يقرأ من الفهرس أول limit مطابقة فقط، فيبقى الزمن ثابتاً مهما كثرت المشاريع.
+        بدون نص ترجع أحدث المشاريع.
+        """
+        key, number = normalize_name(text), (text or '').strip().upper()
+        if not key:
+            if structure_id:
+                return self.get_recent_projects(structure_id, limit, status)
+            if status == PROJECT_STATUS_ACTIVE:
+                return list(itertools.islice(self.iter_projects(status=status, batch_size=limit), limit))
+
+        conditions, params = self._status_condition(status)
+        if structure_id:
+            conditions.append('c.structure_id = ?')
+            params.append(structure_id)
+
+        def first_matches(column, prefix):
+            # CROSS JOIN يثبت ترتيب الحلقات: المرور على فهرس العمود بالترتيب والتوقف بعد limit،
+            # بدلاً من قراءة كل مشاريع الهيكل ثم ترتيبها
+            where = ' AND '.join([f'p.{column} >= ?', f'p.{column} < ?'] + conditions)
+            return (f'''SELECT * FROM (SELECT p.id FROM projects p CROSS JOIN clients c ON p.client_id = c.id
+                        WHERE {where} ORDER BY p.{column} LIMIT ?)''',
+                    [*self._prefix_range(prefix), *params, limit])
+
+        by_number, number_params = first_matches('project_number', number)
+        by_name, name_params = first_matches('name_key', key)
+        return list(self._iter_rows(ProjectRow, f'''
+            SELECT {PROJECT_COLUMNS}
+            FROM projects p
+            JOIN clients c ON p.client_id = c.id
+            WHERE p.id IN ({by_number} UNION {by_name})
+            ORDER BY p.created_date DESC
+            LIMIT ?
+        ''', (*number_params, *name_params, limit)))
+
+    def get_setting(self, key, default=None):
+        """قراءة إعداد محفوظ"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else default
+
+    @retry_on_busy
+    def set_setting(self, key, value):
+        """حفظ إعداد (أو حذفه عند تمرير None)"""
+        conn = self._connect()
+        try:
+            if value is None:
+                conn.execute('DELETE FROM settings WHERE key = ?', (key,))
+            else:
+                conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, str(value)))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def change_cursor(self):
+        """آخر رقم في سجل التغييرات (نقطة البداية لمستهلك قرأ الجداول كاملة للتو)"""
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+        finally:
+            conn.close()
+
+    @perf_monitor.track('db.tail_changes')
+    def tail_changes(self, cursor=0, limit=1000, tables=None):
+        """التغييرات بعد cursor بالترتيب: (قائمة ChangeRow, المؤشر التالي)
+
+        المؤشر قيمة يحفظها المستهلك ويمررها في الاستدعاء التالي كما هي.
+        """
+        query = 'SELECT seq, table_name, row_id, op, changed_at FROM change_log WHERE seq > ?'
+        params = [cursor or 0]
+        if tables:
+            query += f" AND table_name IN ({', '.join('?' * len(tables))})"
+            params.extend(tables)
+        query += ' ORDER BY seq LIMIT ?'
+        params.append(limit)
+
+        changes = list(self._iter_rows(ChangeRow, query, params))
+        return changes, (changes[-1].seq if changes else cursor or 0)
+
+    def iter_changes(self, cursor=0, batch_size=1000, tables=None):
+        """كل التغييرات بعد cursor كتدفق على دفعات"""
+        while True:
+            changes, cursor = self.tail_changes(cursor, batch_size, tables)
+            yield from changes
+            if len(changes) < batch_size:
+                return
+
+    @retry_on_busy
+    def prune_changes(self, cursor):
+        """حذف سجلات التغييرات حتى cursor (بعد أن يقرأها كل المستهلكين)"""
+        conn = self._connect()
+        try:
+            deleted = conn.execute('DELETE FROM change_log WHERE seq <= ?', (cursor,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return deleted
+
+    @perf_monitor.track('db.check_project_exists')
     def check_project_exists(self, project_number):
         """التحقق من وجود المشروع"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         cursor.execute('SELECT id FROM projects WHERE project_number = ?', (project_number,))
@@ -196,24 +1139,56 @@ class DatabaseManager:
 
         return result is not None
 
-    def generate_next_project_number(self):
-        """توليد رقم المشروع التالي تلقائياً"""
-        conn = sqlite3.connect(self.db_path)
+    def generated_file_exists(self, filename, project_id):
+        """هل اسم الملف مسجل من قبل لنفس المشروع (أو بدون مشروع عند project_id=None)"""
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT 1 FROM generated_files WHERE ifnull(project_id, 0) = ? AND filename = ?',
+                                (project_id or 0, filename)).fetchone() is not None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def parse_number_range(value):
+        """نطاق أرقام المشاريع لهذا الجهاز من نص مثل '300-399' (الافتراضي كامل النطاق)"""
+        if not value:
+            return 1, 999
+        try:
+            low, high = (int(part) for part in str(value).split('-'))
+        except ValueError:
+            raise ValueError(f"نطاق أرقام غير صالح: {value}")
+        if not 1 <= low <= high <= 999:
+            raise ValueError(f"نطاق أرقام غير صالح: {value}")
+        return low, high
+
+    @perf_monitor.track('db.generate_next_project_number')
+    def generate_next_project_number(self, number_range=None):
+        """توليد رقم المشروع التالي تلقائياً
+
+        إذا حدد للجهاز نطاق أرقام (الإعداد project_number_range) يتم الترقيم داخله فقط،
+        فلا تتصادم أرقام الأجهزة التي تعمل دون اتصال ثم تتزامن.
+        """
+        conn = self._connect()
         cursor = conn.cursor()
 
+        if number_range is None:
+            cursor.execute("SELECT value FROM settings WHERE key = 'project_number_range'")
+            row = cursor.fetchone()
+            number_range = row[0] if row else None
+        low, high = self.parse_number_range(number_range)
+
         # الحصول على السنة والشهر الحالي
         current_date = datetime.now()
         year = current_date.strftime('%y')  # السنة بصيغة مختصرة (24 بدلاً من 2024)
         month = current_date.strftime('%m')  # الشهر بصيغة رقمية (01-12)
 
-        # البحث عن آخر رقم مشروع في نفس السنة والشهر
-        pattern = f"P_{year}{month}%"
+        # البحث عن آخر رقم مشروع في نفس السنة والشهر (داخل نطاق الجهاز)
         cursor.execute('''
             SELECT project_number FROM projects
-            WHERE project_number LIKE ?
+            WHERE project_number BETWEEN ? AND ?
             ORDER BY project_number DESC
             LIMIT 1
-        ''', (pattern,))
+        ''', (f"P_{year}{month}_{low:03d}", f"P_{year}{month}_{high:03d}"))
 
         result = cursor.fetchone()
         conn.close()
@@ -222,47 +1197,3291 @@ class DatabaseManager:
             # استخراج الرقم التسلسلي من آخر مشروع
             last_number = result[0]
             try:
-                # استخراج الجزء الرقمي الأخير (مثل: P_2401_003 -> 003)
-                sequence_part = last_number.split('_')[-1]
-                next_sequence = int(sequence_part) + 1
-            except (ValueError, IndexError):
-                next_sequence = 1
-        else:
-            # أول مشروع في هذا الشهر
-            next_sequence = 1
+                # استخراج الجزء الرقمي الأخير (مثل: P_2401_003 -> 003)
+                sequence_part = last_number.split('_')[-1]
+                next_sequence = int(sequence_part) + 1
+            except (ValueError, IndexError):
+                next_sequence = low
+        else:
+            # أول مشروع في هذا الشهر
+            next_sequence = low
+
+        if next_sequence > high:
+            raise ValueError(f"نطاق أرقام المشاريع لهذا الجهاز ({low}-{high}) ممتلئ لهذا الشهر")
+
+        # تكوين رقم المشروع الجديد
+        project_number = f"P_{year}{month}_{next_sequence:03d}"
+
+        return project_number
+    
+    @perf_monitor.track('db.check_client_exists')
+    def check_client_exists(self, name, structure_id):
+        """التحقق من وجود العميل (بالاسم الموحد: المسافات وحالة الأحرف وأشكال الحروف لا تهم)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT id FROM clients WHERE structure_id = ? AND name_key = ?',
+                       (structure_id, normalize_name(name)))
+        result = cursor.fetchone()
+        conn.close()
+        
+        return result
+
+    @perf_monitor.track('db.merge_clients')
+    @retry_on_busy
+    def merge_clients(self, target_id, source_ids, move_folders=True):
+        """دمج عملاء مكررين في عميل واحد من نفس الهيكل
+
+        تنقل مجلدات مشاريعهم إلى مجلد العميل الهدف، ثم يحول client_id والمسارات ويحذف
+        العملاء المدمجون في معاملة واحدة. إذا فشلت المعاملة تعاد المجلدات المنقولة لأماكنها.
+        يرجع {'projects': عدد المشاريع المنقولة, 'clients': عدد العملاء المدمجين}.
+        """
+        import json
+        import shutil
+
+        source_ids = sorted(set(source_ids) - {target_id})
+        conn = self._connect()
+        moved = []
+        try:
+            target = conn.execute('SELECT structure_id, folder_path FROM clients WHERE id = ?',
+                                  (target_id,)).fetchone()
+            sources = conn.execute('SELECT id, structure_id, folder_path FROM clients '
+                                   'WHERE id IN (SELECT value FROM json_each(?))',
+                                   (json.dumps(source_ids),)).fetchall()
+            if target is None or len(sources) != len(source_ids) or any(s[1] != target[0] for s in sources):
+                raise ValueError("العملاء المدمجون يجب أن يكونوا موجودين وفي نفس هيكل العميل الهدف")
+
+            projects = conn.execute('SELECT id, folder_path FROM projects '
+                                    'WHERE client_id IN (SELECT value FROM json_each(?))',
+                                    (json.dumps(source_ids),)).fetchall()
+            updates, taken = [], set()
+            for project_id, old_path in projects:
+                folder_name = os.path.basename(os.path.normpath(old_path))
+                new_path, suffix = os.path.join(target[1], folder_name), 2
+                while new_path in taken or os.path.exists(new_path) or conn.execute(
+                        'SELECT 1 FROM projects WHERE folder_path = ?', (new_path,)).fetchone():
+                    new_path, suffix = os.path.join(target[1], f"{folder_name}_{suffix}"), suffix + 1
+                taken.add(new_path)
+
+                if move_folders and os.path.isdir(old_path):
+                    os.makedirs(target[1], exist_ok=True)
+                    shutil.move(old_path, new_path)
+                    moved.append((new_path, old_path))
+                updates.append((project_id, old_path, new_path))
+
+            current_time = datetime.now().isoformat()
+            conn.executemany('UPDATE projects SET client_id = ?, folder_path = ?, last_modified = ? WHERE id = ?',
+                             [(target_id, new_path, current_time, project_id)
+                              for project_id, _, new_path in updates])
+            # مسارات الملفات المولدة داخل مجلدات المشاريع المنقولة
+            conn.executemany('''
+                UPDATE generated_files SET file_path = ? || substr(file_path, ?)
+                WHERE project_id = ? AND substr(file_path, 1, ?) = ?
+            ''', [(new_path, len(old_path) + 1, project_id, len(old_path), old_path)
+                  for project_id, old_path, new_path in updates])
+            conn.execute('DELETE FROM clients WHERE id IN (SELECT value FROM json_each(?))', (json.dumps(source_ids),))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            for new_path, old_path in reversed(moved):
+                with contextlib.suppress(OSError):
+                    shutil.move(new_path, old_path)
+            raise
+        finally:
+            conn.close()
+
+        # مجلدات العملاء المدمجين تحذف إذا أصبحت فارغة
+        if move_folders:
+            for _, _, folder in sources:
+                with contextlib.suppress(OSError):
+                    os.rmdir(folder)
+        return {'projects': len(updates), 'clients': len(sources)}
+
+    # خطوات حذف بيانات هيكل (الأبناء قبل الآباء) وكل استعلام يحذف دفعة محدودة
+    STRUCTURE_DELETE_STEPS = (
+        ('files', '''
+            DELETE FROM generated_files WHERE id IN (
+                SELECT f.id FROM generated_files f
+                JOIN projects p ON f.project_id = p.id
+                JOIN clients c ON p.client_id = c.id
+                WHERE c.structure_id = ? LIMIT ?)
+        '''),
+        ('projects', '''
+            DELETE FROM projects WHERE id IN (
+                SELECT p.id FROM projects p
+                JOIN clients c ON p.client_id = c.id
+                WHERE c.structure_id = ? LIMIT ?)
+        '''),
+        ('clients', 'DELETE FROM clients WHERE id IN (SELECT id FROM clients WHERE structure_id = ? LIMIT ?)'),
+    )
+
+    def count_structure_rows(self, structure_id):
+        """عدد الملفات والمشاريع والعملاء المرتبطين بهيكل"""
+        conn = self._connect()
+        try:
+            clients, projects, files = conn.execute('''
+                SELECT COUNT(DISTINCT c.id), COUNT(DISTINCT p.id), COUNT(f.id)
+                FROM clients c
+                LEFT JOIN projects p ON p.client_id = c.id
+                LEFT JOIN generated_files f ON f.project_id = p.id
+                WHERE c.structure_id = ?
+            ''', (structure_id,)).fetchone()
+        finally:
+            conn.close()
+        return {'files': files, 'projects': projects, 'clients': clients}
+
+    @retry_on_busy
+    def _delete_batch(self, query, params):
+        """تنفيذ دفعة حذف واحدة في معاملة قصيرة وإرجاع عدد الصفوف المحذوفة"""
+        conn = self._connect()
+        try:
+            deleted = conn.execute(query, params).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return deleted
+
+    @perf_monitor.track('db.delete_structure')
+    def delete_structure(self, structure_id, batch_size=500, progress=None):
+        """حذف هيكل مع عملائه ومشاريعه وملفاته المولدة على دفعات
+
+        كل دفعة معاملة مستقلة حتى لا يحتجز قفل الكتابة طويلاً أثناء حذف هيكل كبير.
+        المشاريع تحذف قبل عملائها حتى تجد triggers التجميع نوع العميل، وسجل الوارد يحذف
+        مع مشاريعه عبر ON DELETE CASCADE. إذا توقف الحذف يمكن إعادة استدعائه ليكمل.
+        progress(deleted, total) تستدعى بعد كل دفعة.
+        """
+        total = sum(self.count_structure_rows(structure_id).values())
+        stats = {'files': 0, 'projects': 0, 'clients': 0}
+
+        for key, query in self.STRUCTURE_DELETE_STEPS:
+            while True:
+                deleted = self._delete_batch(query, (structure_id, batch_size))
+                stats[key] += deleted
+                if progress:
+                    progress(sum(stats.values()), total)
+                if deleted < batch_size:
+                    break
+
+        stats['structures'] = self._delete_batch('DELETE FROM structures WHERE id = ?', (structure_id,))
+        return stats
+
+    @perf_monitor.track('db.add_generated_file')
+    @retry_on_busy
+    def add_generated_file(self, filename, project_id, file_type, file_path=""):
+        """إضافة ملف مولد (يرجع None إذا كان الاسم مسجلاً للمشروع من قبل)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                INSERT OR IGNORE INTO generated_files (filename, project_id, file_type, created_date, file_path)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (filename, project_id, file_type, datetime.now().isoformat(), file_path))
+
+            conn.commit()
+            return cursor.lastrowid if cursor.rowcount else None
+        finally:
+            conn.close()
+
+    @perf_monitor.track('db.add_generated_files')
+    @retry_on_busy
+    def add_generated_files(self, records):
+        """إضافة مجموعة ملفات مولدة في معاملة واحدة
+
+        الاسم المسجل من قبل لنفس المشروع (أو المكرر داخل الدفعة) يتجاهله المفتاح الفريد،
+        ويرجع عدد الصفوف المضافة فعلاً.
+        """
+        if not records:
+            return 0
+
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        try:
+            current_time = datetime.now().isoformat()
+            cursor.executemany('''
+                INSERT OR IGNORE INTO generated_files (filename, project_id, file_type, created_date, file_path)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(filename, project_id, file_type, current_time, file_path)
+                  for filename, project_id, file_type, file_path in records])
+
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def iter_export_rows(self, dataset, filters=None, batch_size=1000):
+        """قراءة صفوف التصدير على دفعات باستخدام fetchmany (ذاكرة ثابتة)
+
+        يرجع (أسماء الأعمدة, مولد للصفوف). أسماء الأعمدة تقرأ باستعلام LIMIT 0 في اتصال قصير،
+        والمولد يفتح اتصاله عند أول قراءة ويغلقه عند انتهائه أو إغلاقه أو فشل الاستعلام.
+        """
+        if dataset not in EXPORT_DATASETS:
+            raise ValueError(f"مجموعة بيانات غير معروفة: {dataset}")
+
+        query, filter_columns = EXPORT_DATASETS[dataset]
+        conditions = []
+        params = []
+
+        for key, value in (filters or {}).items():
+            if value in (None, ''):
+                continue
+            if key not in filter_columns:
+                raise ValueError(f"الفلتر '{key}' غير مدعوم لـ {dataset}")
+            column, operator = filter_columns[key]
+            conditions.append(f"{column} {operator} ?")
+            params.append(value)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        conn = self._connect()
+        try:
+            columns = [description[0] for description in conn.execute(query + " LIMIT 0", params).description]
+        finally:
+            conn.close()
+
+        def rows():
+            conn = None
+            try:
+                conn = self._connect()
+                cursor = conn.execute(query, params)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield from batch
+            finally:
+                if conn is not None:
+                    conn.close()
+
+        return columns, rows()
+
+
+class RemoteDatabaseManager(StorageBackend):
+    """واجهة مطابقة لـ DatabaseManager تعمل عبر خادم منظم المشاريع (organizer_server.py)"""
+
+    def __init__(self, base_url, timeout=10, token=None):
+        import uuid
+
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.db_path = self.base_url
+        # الرمز المشترك الذي يطلبه الخادم المتاح على الشبكة
+        self.token = os.environ.get('PROJECT_ORGANIZER_TOKEN', '') if token is None else token
+        # يميز هذا الجهاز عند الخادم (أرقام المشاريع المحجوزة له تبقى متاحة له فقط)
+        self.client_id = uuid.uuid4().hex
+        # التأكد من أن الخادم متاح قبل استخدامه
+        self._call('ping')
+
+    def _call(self, method, *args, **kwargs):
+        """استدعاء عملية على الخادم وإرجاع النتيجة"""
+        import json
+        import urllib.error
+        import urllib.request
+
+        payload = json.dumps({'args': args, 'kwargs': kwargs}).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'X-Organizer-Client': self.client_id}
+        if self.token:
+            headers['X-Organizer-Token'] = self.token
+        request = urllib.request.Request(f"{self.base_url}/rpc/{method}", data=payload, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            body = json.loads(e.read().decode('utf-8') or '{}')
+            if body.get('type') == 'ValueError':
+                raise ValueError(body.get('error'))
+            if body.get('type') == 'PermissionError':
+                raise PermissionError(body.get('error'))
+            raise RuntimeError(body.get('error', f"خطأ من الخادم: {e.code}"))
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"تعذر الاتصال بالخادم {self.base_url}: {e.reason}")
+
+        return body.get('result')
+
+    @staticmethod
+    def _rows(rows, row_type):
+        """تحويل الصفوف من JSON إلى نفس أنواع الصفوف المحلية"""
+        return [row_type._make(row) for row in rows]
+
+    def add_structure(self, name, base_path, structure_data):
+        """إضافة هيكل جديد"""
+        return self._call('add_structure', name, base_path, structure_data)
+
+    def get_structures(self):
+        """الحصول على جميع الهياكل"""
+        return self._rows(self._call('get_structures'), StructureRow)
+
+    def add_client(self, name, client_type, folder_path, structure_id):
+        """إضافة عميل جديد"""
+        return self._call('add_client', name, client_type, folder_path, structure_id)
+
+    def get_clients(self, structure_id=None):
+        """الحصول على العملاء"""
+        return self._rows(self._call('get_clients', structure_id), ClientRow)
+
+    def add_project(self, name, project_number, client_id, folder_path, description=""):
+        """إضافة مشروع جديد"""
+        return self._call('add_project', name, project_number, client_id, folder_path, description)
+
+    def get_projects(self, client_id=None, status=None):
+        """الحصول على المشاريع"""
+        return self._rows(self._call('get_projects', client_id, status), ProjectRow)
+
+    def set_projects_status(self, project_ids, status):
+        """نقل عدة مشاريع إلى حالة جديدة"""
+        return self._call('set_projects_status', list(project_ids), status)
+
+    def iter_structures(self, batch_size=1000):
+        """الهياكل كتدفق (يتم جلبها من الخادم دفعة واحدة)"""
+        return iter(self.get_structures())
+
+    def iter_clients(self, structure_id=None, batch_size=1000):
+        """العملاء كتدفق (يتم جلبهم من الخادم دفعة واحدة)"""
+        return iter(self.get_clients(structure_id))
+
+    def iter_projects(self, client_id=None, batch_size=1000, status=None):
+        """المشاريع كتدفق (يتم جلبها من الخادم دفعة واحدة)"""
+        return iter(self.get_projects(client_id, status))
+
+    def get_project_by_number(self, project_number):
+        """الحصول على مشروع واحد برقمه"""
+        row = self._call('get_project_by_number', project_number)
+        return ProjectRow._make(row) if row else None
+
+    def get_recent_projects(self, structure_id, limit=200, status=None):
+        """أحدث مشاريع هيكل معين"""
+        return self._rows(self._call('get_recent_projects', structure_id, limit, status), ProjectRow)
+
+    def search_clients(self, structure_id, text, limit=20):
+        """عملاء الهيكل الذين يبدأ اسمهم بالنص المكتوب"""
+        return self._rows(self._call('search_clients', structure_id, text, limit), ClientRow)
+
+    def get_client(self, client_id):
+        """الحصول على عميل واحد بمعرفه"""
+        row = self._call('get_client', client_id)
+        return ClientRow._make(row) if row else None
+
+    def search_projects(self, text, limit=20, structure_id=None, status=None):
+        """المشاريع التي يبدأ رقمها أو اسمها بالنص المكتوب"""
+        return self._rows(self._call('search_projects', text, limit, structure_id, status), ProjectRow)
+
+    def get_setting(self, key, default=None):
+        """قراءة إعداد محفوظ في الخادم"""
+        return self._call('get_setting', key, default)
+
+    def set_setting(self, key, value):
+        """حفظ إعداد في الخادم"""
+        self._call('set_setting', key, value)
+
+    def change_cursor(self):
+        """آخر رقم في سجل التغييرات في الخادم"""
+        return self._call('change_cursor')
+
+    def tail_changes(self, cursor=0, limit=1000, tables=None):
+        """التغييرات بعد cursor من الخادم"""
+        changes, cursor = self._call('tail_changes', cursor, limit, tables)
+        return self._rows(changes, ChangeRow), cursor
+
+    def iter_changes(self, cursor=0, batch_size=1000, tables=None):
+        while True:
+            changes, cursor = self.tail_changes(cursor, batch_size, tables)
+            yield from changes
+            if len(changes) < batch_size:
+                return
+
+    def prune_changes(self, cursor):
+        """حذف سجلات التغييرات حتى cursor في الخادم"""
+        return self._call('prune_changes', cursor)
+
+    def check_project_exists(self, project_number):
+        """التحقق من وجود المشروع"""
+        return self._call('check_project_exists', project_number)
+
+    def generated_file_exists(self, filename, project_id):
+        return self._call('generated_file_exists', filename, project_id)
+
+    def generate_next_project_number(self):
+        """حجز رقم المشروع التالي مركزياً من الخادم"""
+        return self._call('generate_next_project_number')
+
+    def merge_clients(self, target_id, source_ids, move_folders=True):
+        """دمج عملاء مكررين (تنقل المجلدات على جهاز الخادم)"""
+        return self._call('merge_clients', target_id, list(source_ids), move_folders)
+
+    def iter_export_rows(self, dataset, filters=None, batch_size=1000):
+        """صفوف التصدير من الخادم (تصل كلها في رد واحد)"""
+        columns, rows = self._call('iter_export_rows', dataset, filters)
+        return columns, map(tuple, rows)
+
+    def check_client_exists(self, name, structure_id):
+        """التحقق من وجود العميل"""
+        result = self._call('check_client_exists', name, structure_id)
+        return tuple(result) if result else None
+
+    def delete_structure(self, structure_id, batch_size=500, progress=None):
+        """حذف هيكل في الخادم (يتم على دفعات هناك، والتقدم يبلغ عند الانتهاء فقط)"""
+        stats = self._call('delete_structure', structure_id, batch_size)
+        if progress:
+            progress(1, 1)
+        return stats
+
+    def add_generated_file(self, filename, project_id, file_type, file_path=""):
+        """إضافة ملف مولد (يتم تجميعه وكتابته دفعة واحدة في الخادم)"""
+        return self._call('add_generated_file', filename, project_id, file_type, file_path)
+
+    def add_generated_files(self, records):
+        """إضافة مجموعة ملفات مولدة"""
+        return self._call('add_generated_files', [list(record) for record in records])
+
+    def generate_filename(self, date, file_type, client_project, brief_desc, version, extension):
+        """توليد اسم ملف عبر الخادم"""
+        return self._call('generate_filename', date, file_type, client_project,
+                          brief_desc, version, extension)
+
+
+class ShardedDatabaseManager(StorageBackend):
+    """قاعدة بيانات منفصلة لكل هيكل (shard) مع قاعدة فهرس صغيرة تحتوي الهياكل فقط
+
+    معرفات العملاء والمشاريع والملفات في كل shard تبدأ من structure_id * SHARD_ID_SPAN،
+    لذلك يمكن معرفة الـ shard من المعرف نفسه. الاستعلامات المحددة بهيكل تفتح ملفاً واحداً،
+    والاستعلامات العامة توزع على كل الملفات بالتوازي وتدمج النتائج.
+    """
+
+    CATALOG_NAME = "catalog.db"
+    SHARD_ID_SPAN = 10 ** 9
+
+    def __init__(self, shards_dir, profile=None, busy_retries=5, max_workers=8):
+        os.makedirs(shards_dir, exist_ok=True)
+        self.shards_dir = shards_dir
+        self.db_path = shards_dir
+        self.profile = profile
+        self.busy_retries = busy_retries
+        self.max_workers = max_workers
+        # الفهرس يستخدم نفس المخطط، وتبقى فيه الملفات المولدة غير المرتبطة بمشروع
+        self.catalog = DatabaseManager(os.path.join(shards_dir, self.CATALOG_NAME), profile, busy_retries)
+        self._shards = {}
+        self._lock = threading.Lock()
+        # يسلسل فحص رقم المشروع وإضافته بين الخيوط (وقفل الفهرس يسلسلها بين العمليات)
+        self._number_lock = threading.Lock()
+
+    def shard_path(self, structure_id):
+        return os.path.join(self.shards_dir, f"structure_{structure_id}.db")
+
+    def shard_for(self, structure_id):
+        """DatabaseManager الخاص بهيكل (الفهرس إذا لم يحدد هيكل)"""
+        if not structure_id:
+            return self.catalog
+        with self._lock:
+            shard = self._shards.get(structure_id)
+            if shard is None:
+                shard = self._shards[structure_id] = self._open_shard(structure_id)
+            return shard
+
+    def shard_for_id(self, row_id):
+        """الـ shard الذي يحتوي عميلاً أو مشروعاً من معرفه"""
+        return self.shard_for(row_id // self.SHARD_ID_SPAN if row_id else None)
+
+    def _open_shard(self, structure_id):
+        is_new = not os.path.exists(self.shard_path(structure_id))
+        shard = DatabaseManager(self.shard_path(structure_id), self.profile, self.busy_retries)
+        if is_new:
+            catalog_conn = self.catalog._connect()
+            try:
+                row = catalog_conn.execute('''
+                    SELECT id, name, base_path, structure_data, created_date, last_modified
+                    FROM structures WHERE id = ?
+                ''', (structure_id,)).fetchone()
+            finally:
+                catalog_conn.close()
+
+            conn = shard._connect()
+            try:
+                # نسخة من صف الهيكل حتى تعمل الاستعلامات المرتبطة بالهياكل داخل الـ shard
+                if row:
+                    conn.execute('''
+                        INSERT OR IGNORE INTO structures (id, name, base_path, structure_data, created_date, last_modified)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', row)
+
+                # بداية نطاق المعرفات لهذا الهيكل
+                base = structure_id * self.SHARD_ID_SPAN
+                for table in ('clients', 'projects', 'generated_files'):
+                    conn.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+                    conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, base))
+                conn.commit()
+            finally:
+                conn.close()
+        return shard
+
+    def shards(self, include_catalog=False):
+        """كل الـ shards الموجودة (مع الفهرس اختيارياً)"""
+        shards = [self.shard_for(structure.id) for structure in self.catalog.iter_structures()]
+        return [self.catalog] + shards if include_catalog else shards
+
+    def fan_out(self, func, include_catalog=False):
+        """تنفيذ func(shard) على كل الـ shards بالتوازي وإرجاع النتائج بنفس الترتيب"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        shards = self.shards(include_catalog)
+        if len(shards) <= 1:
+            return [func(shard) for shard in shards]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(shards))) as executor:
+            return list(executor.map(func, shards))
+
+    @staticmethod
+    def _merge_by_date(results):
+        """دمج قوائم مرتبة تنازلياً حسب تاريخ الإنشاء"""
+        import heapq
+        return heapq.merge(*results, key=lambda row: row.created_date, reverse=True)
+
+    def add_structure(self, name, base_path, structure_data):
+        """إضافة هيكل جديد وإنشاء الـ shard الخاص به"""
+        structure_id = self.catalog.add_structure(name, base_path, structure_data)
+        if structure_id is not None:
+            self.shard_for(structure_id)
+        return structure_id
+
+    def iter_structures(self, batch_size=1000):
+        return self.catalog.iter_structures(batch_size)
+
+    def get_structures(self):
+        """الحصول على جميع الهياكل"""
+        return self.catalog.get_structures()
+
+    def add_client(self, name, client_type, folder_path, structure_id):
+        """إضافة عميل جديد في shard الهيكل"""
+        return self.shard_for(structure_id).add_client(name, client_type, folder_path, structure_id)
+
+    def iter_clients(self, structure_id=None, batch_size=1000):
+        if structure_id:
+            return self.shard_for(structure_id).iter_clients(structure_id, batch_size)
+        return self._merge_by_date(self.fan_out(lambda shard: shard.get_clients(), include_catalog=True))
+
+    def get_clients(self, structure_id=None):
+        """الحصول على العملاء"""
+        return list(self.iter_clients(structure_id))
+
+    def add_project(self, name, project_number, client_id, folder_path, description=""):
+        """إضافة مشروع جديد في shard العميل (رقم المشروع فريد على مستوى كل الـ shards)
+
+        الفحص والإضافة يتمان وقفل الكتابة على الفهرس محجوز (BEGIN IMMEDIATE)، فلا يضيف
+        كاتبان (في نفس العملية أو في عمليتين) نفس الرقم في shardين مختلفين.
+        """
+        shard = self.shard_for_id(client_id)
+        with self._number_lock:
+            if shard is self.catalog:
+                # الإضافة في الفهرس نفسه لا تتم مع قفله من اتصال آخر
+                if self.check_project_exists(project_number):
+                    return None
+                return shard.add_project(name, project_number, client_id, folder_path, description)
+
+            conn = self.catalog._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                if self.check_project_exists(project_number):
+                    return None
+                return shard.add_project(name, project_number, client_id, folder_path, description)
+            finally:
+                conn.rollback()
+                conn.close()
+
+    def iter_projects(self, client_id=None, batch_size=1000, status=None):
+        if client_id:
+            return self.shard_for_id(client_id).iter_projects(client_id, batch_size, status)
+        return self._merge_by_date(self.fan_out(lambda shard: shard.get_projects(status=status),
+                                                include_catalog=True))
+
+    def get_projects(self, client_id=None, status=None):
+        """الحصول على المشاريع"""
+        return list(self.iter_projects(client_id, status=status))
+
+    def set_projects_status(self, project_ids, status):
+        """نقل المشاريع إلى حالة جديدة (عبارة واحدة لكل shard)"""
+        by_shard = {}
+        for project_id in project_ids:
+            by_shard.setdefault(project_id // self.SHARD_ID_SPAN, []).append(project_id)
+        return sum(self.shard_for(structure_id).set_projects_status(ids, status)
+                   for structure_id, ids in by_shard.items())
+
+    def get_project_by_number(self, project_number):
+        """الحصول على مشروع واحد برقمه"""
+        found = self.fan_out(lambda shard: shard.get_project_by_number(project_number), include_catalog=True)
+        return next((project for project in found if project), None)
+
+    def get_recent_projects(self, structure_id, limit=200, status=None):
+        """أحدث مشاريع هيكل معين (من shard الهيكل فقط)"""
+        return self.shard_for(structure_id).get_recent_projects(structure_id, limit, status)
+
+    def search_clients(self, structure_id, text, limit=20):
+        return self.shard_for(structure_id).search_clients(structure_id, text, limit)
+
+    def search_projects(self, text, limit=20, structure_id=None, status=None):
+        """البحث في shard الهيكل، أو في كل الـ shards بالتوازي ودمج أحدث النتائج"""
+        if structure_id:
+            return self.shard_for(structure_id).search_projects(text, limit, structure_id, status)
+        found = self.fan_out(lambda shard: shard.search_projects(text, limit, status=status), include_catalog=True)
+        return list(itertools.islice(self._merge_by_date(found), limit))
+
+    def get_setting(self, key, default=None):
+        """الإعدادات تحفظ في الفهرس"""
+        return self.catalog.get_setting(key, default)
+
+    def set_setting(self, key, value):
+        self.catalog.set_setting(key, value)
+
+    def _keyed_shards(self):
+        """(مفتاح المؤشر, الـ shard) للفهرس وكل الهياكل"""
+        return [('0', self.catalog)] + [(str(structure.id), self.shard_for(structure.id))
+                                        for structure in self.catalog.iter_structures()]
+
+    def change_cursor(self):
+        """مؤشر لكل shard: {معرف الهيكل كنص ('0' للفهرس): آخر seq}"""
+        return {key: shard.change_cursor() for key, shard in self._keyed_shards()}
+
+    def tail_changes(self, cursor=None, limit=1000, tables=None):
+        """التغييرات بعد cursor من كل الـ shards (الترتيب محفوظ داخل كل shard)
+
+        صفوف الهياكل تؤخذ من الفهرس فقط، فنسخها داخل الـ shards لا تكرر الأحداث.
+        """
+        cursor = dict(cursor or {})
+        tables = tables or self.catalog.CHANGE_LOG_TABLES
+        shard_tables = [table for table in tables if table != 'structures']
+        changes = []
+        for key, shard in self._keyed_shards():
+            if len(changes) >= limit:
+                break
+            wanted = tables if key == '0' else shard_tables
+            if not wanted:
+                continue
+            found, cursor[key] = shard.tail_changes(cursor.get(key, 0), limit - len(changes), wanted)
+            changes.extend(found)
+        return changes, cursor
+
+    def iter_changes(self, cursor=None, batch_size=1000, tables=None):
+        while True:
+            changes, cursor = self.tail_changes(cursor, batch_size, tables)
+            yield from changes
+            if len(changes) < batch_size:
+                return
+
+    def prune_changes(self, cursor):
+        """حذف سجلات التغييرات حتى المؤشر في كل shard"""
+        return sum(shard.prune_changes(cursor[key]) for key, shard in self._keyed_shards() if key in cursor)
+
+    def check_project_exists(self, project_number):
+        """التحقق من وجود المشروع في أي shard"""
+        return any(self.fan_out(lambda shard: shard.check_project_exists(project_number), include_catalog=True))
+
+    def generated_file_exists(self, filename, project_id):
+        return self.shard_for_id(project_id).generated_file_exists(filename, project_id)
+
+    def generate_next_project_number(self):
+        """رقم المشروع التالي (الأكبر بين كل الـ shards، داخل نطاق الجهاز المحفوظ في الفهرس)"""
+        number_range = self.catalog.get_setting('project_number_range', '')
+        return max(self.fan_out(lambda shard: shard.generate_next_project_number(number_range),
+                                include_catalog=True))
+
+    def get_client(self, client_id):
+        """الحصول على عميل واحد من shard هيكله"""
+        return self.shard_for_id(client_id).get_client(client_id)
+
+    def check_client_exists(self, name, structure_id):
+        """التحقق من وجود العميل"""
+        return self.shard_for(structure_id).check_client_exists(name, structure_id)
+
+    def merge_clients(self, target_id, source_ids, move_folders=True):
+        """دمج عملاء مكررين (كلهم في shard هيكل العميل الهدف)"""
+        return self.shard_for_id(target_id).merge_clients(target_id, source_ids, move_folders)
+
+    def delete_structure(self, structure_id, batch_size=500, progress=None):
+        """حذف هيكل: حذف ملف الـ shard بالكامل بدلاً من حذف الصفوف، ثم صف الهيكل من الفهرس"""
+        stats = {'files': 0, 'projects': 0, 'clients': 0}
+        path = self.shard_path(structure_id)
+        if os.path.exists(path):
+            stats = self.shard_for(structure_id).count_structure_rows(structure_id)
+            with self._lock:
+                self._shards.pop(structure_id, None)
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path + suffix)
+
+        stats['structures'] = self.catalog.delete_structure(structure_id, batch_size)['structures']
+        if progress:
+            progress(1, 1)
+        return stats
+
+    def add_generated_file(self, filename, project_id, file_type, file_path=""):
+        """إضافة ملف مولد في shard المشروع"""
+        return self.shard_for_id(project_id).add_generated_file(filename, project_id, file_type, file_path)
+
+    def add_generated_files(self, records):
+        """إضافة مجموعة ملفات مولدة (دفعة واحدة لكل shard)"""
+        groups = {}
+        for record in records:
+            groups.setdefault(record[1] // self.SHARD_ID_SPAN if record[1] else None, []).append(record)
+        return sum(self.shard_for(structure_id).add_generated_files(group)
+                   for structure_id, group in groups.items())
+
+    def iter_export_rows(self, dataset, filters=None, batch_size=1000):
+        """صفوف التصدير من shard الهيكل المحدد في الفلاتر أو من كل الـ shards بالتتابع"""
+        structure_id = (filters or {}).get('structure_id')
+        if structure_id:
+            return self.shard_for(structure_id).iter_export_rows(dataset, filters, batch_size)
+
+        shards = self.shards(include_catalog=True)
+        columns, first_rows = shards[0].iter_export_rows(dataset, filters, batch_size)
+
+        def rows():
+            yield from first_rows
+            for shard in shards[1:]:
+                yield from shard.iter_export_rows(dataset, filters, batch_size)[1]
+
+        return columns, rows()
+
+    def rebuild_report_rollups(self):
+        """إعادة حساب جداول التجميع في كل الـ shards"""
+        self.fan_out(lambda shard: shard.rebuild_report_rollups(), include_catalog=True)
+
+    def import_database(self, source_path):
+        """نقل قاعدة بيانات واحدة موجودة إلى shards (مع إزاحة المعرفات لنطاق كل هيكل)"""
+        source = sqlite3.connect(source_path)
+        stats = {'structures': 0, 'clients': 0, 'projects': 0, 'files': 0}
+        try:
+            client_shards = {}
+            project_shards = {}
+
+            for row in source.execute('''
+                SELECT id, name, base_path, structure_data, created_date, last_modified FROM structures ORDER BY id
+            ''').fetchall():
+                conn = self.catalog._connect()
+                try:
+                    cursor = conn.execute('''
+                        INSERT INTO structures (name, base_path, structure_data, created_date, last_modified)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', row[1:])
+                    structure_id = cursor.lastrowid
+                    conn.commit()
+                finally:
+                    conn.close()
+
+                shard = self.shard_for(structure_id)
+                offset = structure_id * self.SHARD_ID_SPAN
+                clients = source.execute('''
+                    SELECT id, name, type, folder_path, created_date FROM clients WHERE structure_id = ?
+                ''', (row[0],)).fetchall()
+                projects = source.execute('''
+                    SELECT p.id, p.name, p.project_number, p.client_id, p.folder_path, p.status,
+                           p.created_date, p.last_modified, p.description
+                    FROM projects p JOIN clients c ON p.client_id = c.id WHERE c.structure_id = ?
+                ''', (row[0],)).fetchall()
+
+                conn = shard._connect()
+                try:
+                    conn.executemany('''
+                        INSERT INTO clients (id, name, type, folder_path, structure_id, created_date, name_key)
+                        VALUES (?, ?, ?, ?, ?, ?, normalize_name(?))
+                    ''', [(offset + c[0], c[1], c[2], c[3], structure_id, c[4], c[1]) for c in clients])
+                    conn.executemany('''
+                        INSERT INTO projects (id, name, project_number, client_id, folder_path, status,
+                                              created_date, last_modified, description, name_key)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, normalize_name(?))
+                    ''', [(offset + p[0], p[1], p[2], offset + p[3]) + tuple(p[4:]) + (p[1],) for p in projects])
+                    conn.commit()
+                finally:
+                    conn.close()
+
+                client_shards.update((c[0], structure_id) for c in clients)
+                project_shards.update((p[0], structure_id) for p in projects)
+                stats['structures'] += 1
+                stats['clients'] += len(clients)
+                stats['projects'] += len(projects)
+
+            # الملفات المولدة تتبع shard مشروعها، وغير المرتبطة تبقى في الفهرس
+            groups = {}
+            for filename, project_id, file_type, created_date, file_path in source.execute(
+                    'SELECT filename, project_id, file_type, created_date, file_path FROM generated_files'):
+                structure_id = project_shards.get(project_id)
+                new_project_id = structure_id * self.SHARD_ID_SPAN + project_id if structure_id else None
+                groups.setdefault(structure_id, []).append(
+                    (filename, new_project_id, file_type, created_date, file_path))
+
+            for structure_id, records in groups.items():
+                conn = self.shard_for(structure_id)._connect()
+                try:
+                    conn.executemany('''
+                        INSERT INTO generated_files (filename, project_id, file_type, created_date, file_path)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', records)
+                    conn.commit()
+                finally:
+                    conn.close()
+                stats['files'] += len(records)
+        finally:
+            source.close()
+
+        return stats
+
+
+class MemoryDatabaseManager(StorageBackend):
+    """تخزين في الذاكرة بالكامل للاختبارات والتشغيل الدفعي وقياس الأداء
+
+    الجداول قواميس بالمعرف مع فهارس للقيم الفريدة والعملاء لكل هيكل والمشاريع لكل عميل،
+    وفهارس مرتبة للبحث ببداية الاسم تبنى عند أول بحث بعد التعديل. لا يكتب شيء على القرص
+    حتى flush() التي تحفظ كل البيانات في ملف SQLite عادي في معاملة واحدة.
+    مع snapshot_path يحمل الملف عند الإنشاء ويحفظ عند الخروج من with.
+    """
+
+    # جداول لا يديرها التخزين في الذاكرة لكنها تنقل كما هي من load() إلى flush()
+    # (سجل نقل صندوق الوارد، سجل المحذوفات للمزامنة، سجل الصيانة، حجم المجلدات)
+    CARRIED_TABLES = ('inbox_moves', 'sync_tombstones', 'maintenance_log', 'disk_usage_cache')
+
+    def __init__(self, snapshot_path=None):
+        self.snapshot_path = snapshot_path
+        self.db_path = snapshot_path or ':memory:'
+        self._lock = threading.RLock()
+        self._structures = {}
+        self._clients = {}
+        self._projects = {}
+        self._files = []
+        self._file_keys = set()
+        self._settings = {}
+        self._carried = {}
+        self._changes = []
+        self._uuids = {}
+        self._last_ids = dict.fromkeys(DatabaseManager.CHANGE_LOG_TABLES, 0)
+
+        self._structure_names = {}
+        self._client_folders = {}
+        self._clients_by_structure = defaultdict(list)
+        # (الهيكل, الاسم الموحد) -> معرفات العملاء بترتيب الإضافة (لـ check_client_exists)
+        self._clients_by_key = defaultdict(list)
+        self._project_numbers = {}
+        self._project_folders = {}
+        self._projects_by_client = defaultdict(list)
+        self._numbers_by_month = defaultdict(set)
+        self._search_index = None
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load(DatabaseManager(snapshot_path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.snapshot_path:
+            self.flush()
+
+    def _next_id(self, table):
+        self._last_ids[table] += 1
+        return self._last_ids[table]
+
+    def _log(self, table, row_id, op):
+        self._changes.append(ChangeRow(len(self._changes) + 1, table, row_id, op, datetime.now().isoformat()))
+
+    def _index_client(self, client):
+        self._clients[client.id] = client
+        self._client_folders[client.folder_path] = client.id
+        self._clients_by_structure[client.structure_id].append(client.id)
+        self._clients_by_key[(client.structure_id, normalize_name(client.name))].append(client.id)
+
+    def _unindex_client(self, client_id):
+        client = self._clients.pop(client_id)
+        del self._client_folders[client.folder_path]
+        self._clients_by_structure[client.structure_id].remove(client_id)
+        self._clients_by_key[(client.structure_id, normalize_name(client.name))].remove(client_id)
+        self._projects_by_client.pop(client_id, None)
+        self._remove_row('clients', client_id)
+
+    def _index_project(self, project):
+        self._projects[project.id] = project
+        self._project_numbers[project.project_number] = project.id
+        self._project_folders[project.folder_path] = project.id
+        self._projects_by_client[project.client_id].append(project.id)
+        self._numbers_by_month[project.project_number.rsplit('_', 1)[0]].add(project.project_number)
+
+    def _unindex_project(self, project_id):
+        project = self._projects.pop(project_id)
+        del self._project_numbers[project.project_number]
+        del self._project_folders[project.folder_path]
+        self._projects_by_client[project.client_id].remove(project_id)
+        self._numbers_by_month[project.project_number.rsplit('_', 1)[0]].discard(project.project_number)
+        self._remove_row('projects', project_id)
+
+    def _remove_row(self, table, row_id):
+        """تسجيل حذف صف في سجل التغييرات وسجل المحذوفات كما تفعل triggers ملف SQLite"""
+        self._log(table, row_id, 'D')
+        uuid = self._uuids.pop((table, row_id), None)
+        if uuid:
+            columns, rows = self._carried.setdefault(
+                'sync_tombstones', (['table_name', 'row_id', 'uuid', 'deleted_at'], []))
+            values = {'table_name': table, 'row_id': row_id, 'uuid': uuid, 'deleted_at': datetime.now().isoformat()}
+            rows.append(tuple(values.get(column) for column in columns))
+
+    @staticmethod
+    def _newest_first(rows):
+        return sorted(rows, key=lambda row: row.created_date, reverse=True)
+
+    def add_structure(self, name, base_path, structure_data):
+        import json
+
+        with self._lock:
+            if name in self._structure_names:
+                return None
+            current_time = datetime.now().isoformat()
+            structure = StructureRow(self._next_id('structures'), name, base_path, json.dumps(structure_data),
+                                     current_time, current_time)
+            self._structures[structure.id] = structure
+            self._structure_names[name] = structure.id
+            self._log('structures', structure.id, 'I')
+            return structure.id
+
+    def iter_structures(self, batch_size=1000):
+        return iter(self._newest_first(list(self._structures.values())))
+
+    def add_client(self, name, client_type, folder_path, structure_id):
+        with self._lock:
+            if folder_path in self._client_folders or (structure_id and structure_id not in self._structures):
+                return None
+            client = ClientRow(self._next_id('clients'), name, client_type, folder_path, structure_id,
+                               datetime.now().isoformat())
+            self._index_client(client)
+            self._search_index = None
+            self._log('clients', client.id, 'I')
+            return client.id
+
+    def iter_clients(self, structure_id=None, batch_size=1000):
+        if structure_id:
+            clients = [self._clients[client_id] for client_id in self._clients_by_structure.get(structure_id, ())]
+        else:
+            clients = list(self._clients.values())
+        return iter(self._newest_first(clients))
+
+    def get_client(self, client_id):
+        return self._clients.get(client_id)
+
+    def check_client_exists(self, name, structure_id):
+        client_ids = self._clients_by_key.get((structure_id, normalize_name(name)))
+        return (client_ids[0],) if client_ids else None
+
+    def merge_clients(self, target_id, source_ids, move_folders=True):
+        """نفس دمج DatabaseManager: تنقل المجلدات أولاً وتعاد لأماكنها إذا فشل النقل"""
+        import shutil
+
+        source_ids = sorted(set(source_ids) - {target_id})
+        with self._lock:
+            target = self._clients.get(target_id)
+            sources = [self._clients.get(client_id) for client_id in source_ids]
+            if target is None or None in sources or any(c.structure_id != target.structure_id for c in sources):
+                raise ValueError("العملاء المدمجون يجب أن يكونوا موجودين وفي نفس هيكل العميل الهدف")
+
+            updates, taken, moved = [], set(), []
+            try:
+                for client in sources:
+                    for project_id in self._projects_by_client.get(client.id, ()):
+                        old_path = self._projects[project_id].folder_path
+                        folder_name = os.path.basename(os.path.normpath(old_path))
+                        new_path, suffix = os.path.join(target.folder_path, folder_name), 2
+                        while new_path in taken or os.path.exists(new_path) or new_path in self._project_folders:
+                            new_path, suffix = os.path.join(target.folder_path, f"{folder_name}_{suffix}"), suffix + 1
+                        taken.add(new_path)
+
+                        if move_folders and os.path.isdir(old_path):
+                            os.makedirs(target.folder_path, exist_ok=True)
+                            shutil.move(old_path, new_path)
+                            moved.append((new_path, old_path))
+                        updates.append((project_id, old_path, new_path))
+            except Exception:
+                for new_path, old_path in reversed(moved):
+                    with contextlib.suppress(OSError):
+                        shutil.move(new_path, old_path)
+                raise
+
+            current_time = datetime.now().isoformat()
+            for project_id, old_path, new_path in updates:
+                project = self._projects[project_id]
+                del self._project_folders[old_path]
+                self._projects_by_client[project.client_id].remove(project_id)
+                self._projects[project_id] = project._replace(
+                    client_id=target_id, folder_path=new_path, last_modified=current_time,
+                    client_name=target.name, client_type=target.type)
+                self._project_folders[new_path] = project_id
+                self._projects_by_client[target_id].append(project_id)
+                self._log('projects', project_id, 'U')
+
+            # مسارات الملفات المولدة داخل مجلدات المشاريع المنقولة
+            paths = {project_id: (old_path, new_path) for project_id, old_path, new_path in updates}
+            for index, row in enumerate(self._files):
+                old_path, new_path = paths.get(row[2], (None, None))
+                if old_path and (row[5] or '').startswith(old_path):
+                    self._files[index] = row[:5] + (new_path + row[5][len(old_path):],)
+                    self._log('generated_files', row[0], 'U')
+            for client in sources:
+                self._unindex_client(client.id)
+            self._search_index = None
+
+        # مجلدات العملاء المدمجين تحذف إذا أصبحت فارغة
+        if move_folders:
+            for client in sources:
+                with contextlib.suppress(OSError):
+                    os.rmdir(client.folder_path)
+        return {'projects': len(updates), 'clients': len(sources)}
+
+    def add_project(self, name, project_number, client_id, folder_path, description=""):
+        with self._lock:
+            client = self._clients.get(client_id)
+            if client is None or project_number in self._project_numbers or folder_path in self._project_folders:
+                return None
+            current_time = datetime.now().isoformat()
+            project = ProjectRow(self._next_id('projects'), name, project_number, client_id, folder_path,
+                                 PROJECT_STATUS_ACTIVE, current_time, current_time, description,
+                                 client.name, client.type)
+            self._index_project(project)
+            self._search_index = None
+            self._log('projects', project.id, 'I')
+            return project.id
+
+    def iter_projects(self, client_id=None, batch_size=1000, status=None):
+        if client_id:
+            projects = [self._projects[project_id] for project_id in self._projects_by_client.get(client_id, ())]
+        else:
+            projects = list(self._projects.values())
+        return iter(self._newest_first([p for p in projects if status is None or p.status == status]))
+
+    def get_project_by_number(self, project_number):
+        project_id = self._project_numbers.get(project_number)
+        return self._projects[project_id] if project_id else None
+
+    def get_recent_projects(self, structure_id, limit=200, status=None):
+        import heapq
+
+        projects = (self._projects[project_id]
+                    for client_id in self._clients_by_structure.get(structure_id, ())
+                    for project_id in self._projects_by_client.get(client_id, ()))
+        return heapq.nlargest(limit, (p for p in projects if status is None or p.status == status),
+                              key=lambda p: p.created_date)
+
+    def set_projects_status(self, project_ids, status):
+        if status not in PROJECT_STATUS_TRANSITIONS:
+            raise ValueError(f"حالة مشروع غير معروفة: {status}")
+        sources = PROJECT_STATUS_TRANSITIONS[status]
+        changed = 0
+        with self._lock:
+            current_time = datetime.now().isoformat()
+            for project_id in set(project_ids):
+                project = self._projects.get(project_id)
+                if project and project.status in sources:
+                    self._projects[project_id] = project._replace(status=status, last_modified=current_time)
+                    self._log('projects', project_id, 'U')
+                    changed += 1
+        return changed
+
+    def delete_structure(self, structure_id, batch_size=500, progress=None):
+        """حذف هيكل مع عملائه ومشاريعه وملفاته المولدة وسجل وارده (دفعة واحدة في الذاكرة)"""
+        with self._lock:
+            client_ids = list(self._clients_by_structure.get(structure_id, ()))
+            project_ids = {project_id for client_id in client_ids
+                           for project_id in self._projects_by_client.get(client_id, ())}
+            files = [row for row in self._files if row[2] in project_ids]
+            total = len(files) + len(project_ids) + len(client_ids)
+
+            self._files = [row for row in self._files if row[2] not in project_ids]
+            for row in files:
+                self._file_keys.discard((row[2], row[1]))
+                self._remove_row('generated_files', row[0])
+            if 'inbox_moves' in self._carried:
+                columns, rows = self._carried['inbox_moves']
+                project_column = columns.index('project_id')
+                rows[:] = [row for row in rows if row[project_column] not in project_ids]
+            for project_id in project_ids:
+                self._unindex_project(project_id)
+            for client_id in client_ids:
+                self._unindex_client(client_id)
+            self._clients_by_structure.pop(structure_id, None)
+
+            structure = self._structures.pop(structure_id, None)
+            if structure:
+                del self._structure_names[structure.name]
+                self._remove_row('structures', structure_id)
+            self._search_index = None
+
+        if progress:
+            progress(total, total)
+        return {'files': len(files), 'projects': len(project_ids), 'clients': len(client_ids),
+                'structures': int(structure is not None)}
+
+    def generate_next_project_number(self, number_range=None):
+        """نفس ترقيم DatabaseManager: P_YYMM_XXX داخل نطاق الجهاز"""
+        if number_range is None:
+            number_range = self._settings.get('project_number_range')
+        low, high = DatabaseManager.parse_number_range(number_range)
+        prefix = datetime.now().strftime('P_%y%m')
+        used = [int(number.rsplit('_', 1)[1]) for number in self._numbers_by_month.get(prefix, ())
+                if f"{prefix}_{low:03d}" <= number <= f"{prefix}_{high:03d}"]
+        next_sequence = max(used) + 1 if used else low
+        if next_sequence > high:
+            raise ValueError(f"نطاق أرقام المشاريع لهذا الجهاز ({low}-{high}) ممتلئ لهذا الشهر")
+        return f"{prefix}_{next_sequence:03d}"
+
+    def _build_search_index(self):
+        """قوائم مرتبة (مفتاح, معرف) للبحث ببداية النص بـ bisect"""
+        if self._search_index is None:
+            self._search_index = (
+                sorted((client.structure_id or 0, normalize_name(client.name), client.id)
+                       for client in self._clients.values()),
+                sorted((project.project_number, project.id) for project in self._projects.values()),
+                sorted((normalize_name(project.name), project.id) for project in self._projects.values()),
+            )
+        return self._search_index
+
+    def search_clients(self, structure_id, text, limit=20):
+        import bisect
+
+        with self._lock:
+            clients_index = self._build_search_index()[0]
+        key = normalize_name(text)
+        start = bisect.bisect_left(clients_index, (structure_id or 0, key))
+        found = []
+        for sid, client_key, client_id in itertools.islice(clients_index, start, None):
+            if sid != (structure_id or 0) or not client_key.startswith(key) or len(found) >= limit:
+                break
+            found.append(self._clients[client_id])
+        return found
+
+    def search_projects(self, text, limit=20, structure_id=None, status=None):
+        import bisect
+
+        key, number = normalize_name(text), (text or '').strip().upper()
+        if not key:
+            if structure_id:
+                return self.get_recent_projects(structure_id, limit, status)
+            return list(itertools.islice(self.iter_projects(status=status), limit))
+
+        with self._lock:
+            _, numbers_index, names_index = self._build_search_index()
+
+        def first_matches(index, prefix):
+            found = []
+            for value, project_id in itertools.islice(index, bisect.bisect_left(index, (prefix,)), None):
+                if not value.startswith(prefix) or len(found) >= limit:
+                    break
+                project = self._projects[project_id]
+                if status is not None and project.status != status:
+                    continue
+                if structure_id and self._clients[project.client_id].structure_id != structure_id:
+                    continue
+                found.append(project)
+            return found
+
+        matches = {p.id: p for p in first_matches(numbers_index, number) + first_matches(names_index, key)}
+        return self._newest_first(matches.values())[:limit]
+
+    def add_generated_file(self, filename, project_id, file_type, file_path=""):
+        with self._lock:
+            return self._add_generated_file(filename, project_id, file_type, file_path, datetime.now().isoformat())
+
+    def add_generated_files(self, records):
+        with self._lock:
+            current_time = datetime.now().isoformat()
+            return sum(self._add_generated_file(*record, current_time) is not None for record in records)
+
+    def _add_generated_file(self, filename, project_id, file_type, file_path, current_time):
+        if project_id is not None and project_id not in self._projects:
+            raise ValueError(f"مشروع غير موجود: {project_id}")
+        if (project_id, filename) in self._file_keys:
+            return None
+        file_id = self._next_id('generated_files')
+        self._files.append((file_id, filename, project_id, file_type, current_time, file_path))
+        self._file_keys.add((project_id, filename))
+        self._log('generated_files', file_id, 'I')
+        return file_id
+
+    def generated_file_exists(self, filename, project_id):
+        return (project_id, filename) in self._file_keys
+
+    def iter_export_rows(self, dataset, filters=None, batch_size=1000):
+        """نفس أعمدة وفلاتر EXPORT_DATASETS في DatabaseManager (بترتيب المعرف)"""
+        if dataset not in EXPORT_DATASETS:
+            raise ValueError(f"مجموعة بيانات غير معروفة: {dataset}")
+        filters = {key: value for key, value in (filters or {}).items() if value not in (None, '')}
+        for key in filters:
+            if key not in EXPORT_DATASETS[dataset][1]:
+                raise ValueError(f"الفلتر '{key}' غير مدعوم لـ {dataset}")
+
+        no_client = ClientRow(None, None, None, None, None, None)
+        if dataset == 'clients':
+            columns = ['id', 'name', 'type', 'folder_path', 'structure_id', 'created_date']
+            records = ((tuple(c), c, None, c.created_date) for c in self._clients.values())
+        elif dataset == 'projects':
+            columns = ['id', 'project_number', 'name', 'status', 'created_date', 'last_modified',
+                       'description', 'folder_path', 'client_id', 'client_name', 'client_type', 'structure_id']
+            records = []
+            for p in self._projects.values():
+                c = self._clients.get(p.client_id)
+                if c:
+                    records.append(((p.id, p.project_number, p.name, p.status, p.created_date, p.last_modified,
+                                     p.description, p.folder_path, c.id, c.name, c.type, c.structure_id),
+                                    c, p.status, p.created_date))
+        else:
+            columns = ['id', 'filename', 'file_type', 'created_date', 'file_path', 'project_number',
+                       'project_name', 'status', 'client_name', 'client_type', 'structure_id']
+            records = []
+            for file_id, filename, project_id, file_type, created_date, file_path in self._files:
+                p = self._projects.get(project_id)
+                c = self._clients.get(p.client_id, no_client) if p else no_client
+                records.append(((file_id, filename, file_type, created_date, file_path,
+                                 p and p.project_number, p and p.name, p and p.status,
+                                 c.name, c.type, c.structure_id), c, p and p.status, created_date))
+
+        def matches(client, status, created_date):
+            return all({'structure_id': lambda v: client.structure_id == v,
+                        'client_type': lambda v: client.type == v,
+                        'status': lambda v: status == v,
+                        'date_from': lambda v: created_date >= v,
+                        'date_to': lambda v: created_date[:10] <= v}[key](value)
+                       for key, value in filters.items())
+
+        rows = sorted((row for row, client, status, created_date in records if matches(client, status, created_date)),
+                      key=lambda row: row[0])
+        return columns, iter(rows)
+
+    def get_setting(self, key, default=None):
+        return self._settings.get(key, default)
+
+    def set_setting(self, key, value):
+        with self._lock:
+            if value is None:
+                self._settings.pop(key, None)
+            else:
+                self._settings[key] = str(value)
+
+    def change_cursor(self):
+        return len(self._changes)
+
+    def tail_changes(self, cursor=0, limit=1000, tables=None):
+        changes = [change for change in itertools.islice(self._changes, cursor or 0, None)
+                   if not tables or change.table_name in tables][:limit]
+        return changes, (changes[-1].seq if changes else cursor or 0)
+
+    def load(self, db):
+        """تحميل كل بيانات ملف SQLite (DatabaseManager) إلى الذاكرة"""
+        conn = db._connect()
+        try:
+            for row in conn.execute(f'SELECT {STRUCTURE_COLUMNS}, uuid FROM structures ORDER BY id'):
+                structure = StructureRow._make(row[:-1])
+                self._structures[structure.id] = structure
+                self._structure_names[structure.name] = structure.id
+                self._uuids[('structures', structure.id)] = row[-1]
+            for row in conn.execute(f'SELECT {CLIENT_COLUMNS}, uuid FROM clients ORDER BY id'):
+                self._index_client(ClientRow._make(row[:-1]))
+                self._uuids[('clients', row[0])] = row[-1]
+            for row in conn.execute(f'''
+                SELECT {PROJECT_COLUMNS}, p.uuid FROM projects p LEFT JOIN clients c ON p.client_id = c.id
+                ORDER BY p.id
+            '''):
+                self._index_project(ProjectRow._make(row[:-1]))
+                self._uuids[('projects', row[0])] = row[-1]
+            for row in conn.execute('''
+                SELECT id, filename, project_id, file_type, created_date, file_path, uuid
+                FROM generated_files ORDER BY id
+            '''):
+                self._files.append(row[:-1])
+                self._file_keys.add((row[2], row[1]))
+                self._uuids[('generated_files', row[0])] = row[-1]
+            self._settings.update(conn.execute('SELECT key, value FROM settings'))
+            for table in self.CARRIED_TABLES:
+                cursor = conn.execute(f'SELECT * FROM {table} ORDER BY rowid')
+                self._carried[table] = ([column[0] for column in cursor.description], cursor.fetchall())
+            self._last_ids.update((name, seq) for name, seq in conn.execute('SELECT name, seq FROM sqlite_sequence')
+                                  if name in self._last_ids)
+        finally:
+            conn.close()
+        self._search_index = None
+
+    @perf_monitor.track('memory.flush')
+    def flush(self, path=None):
+        """حفظ كل البيانات في ملف SQLite عادي في معاملة واحدة (يستبدل الملف بالكامل)
+
+        يكتب أولاً في ملف مؤقت ثم يستبدل به الملف الأصلي، فلا يبقى ملف نصف مكتوب عند الانقطاع.
+        """
+        path = path or self.snapshot_path
+        if not path:
+            raise ValueError("لم يحدد مسار ملف الحفظ")
+
+        temp_path = f"{path}.partial"
+        for suffix in ('', '-journal'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path + suffix)
+
+        with self._lock:
+            # بدون WAL حتى يكون الملف المؤقت كاملاً في ملف واحد
+            conn = DatabaseManager(temp_path, profile='safe')._connect()
+            try:
+                uuid = self._uuids.get
+                conn.executemany(f'INSERT INTO structures ({STRUCTURE_COLUMNS}, uuid) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 (row + (uuid(('structures', row.id)),) for row in self._structures.values()))
+                conn.executemany(f'''
+                    INSERT INTO clients ({CLIENT_COLUMNS}, name_key, uuid)
+                    VALUES (?, ?, ?, ?, ?, ?, normalize_name(?), ?)
+                ''', (row + (row.name, uuid(('clients', row.id))) for row in self._clients.values()))
+                conn.executemany(f'''
+                    INSERT INTO projects ({', '.join(ProjectRow._fields[:-2])}, name_key, uuid)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, normalize_name(?), ?)
+                ''', (row[:-2] + (row.name, uuid(('projects', row.id))) for row in self._projects.values()))
+                conn.executemany('''
+                    INSERT INTO generated_files (id, filename, project_id, file_type, created_date, file_path, uuid)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (row + (uuid(('generated_files', row[0])),) for row in self._files))
+                for table, (columns, rows) in self._carried.items():
+                    conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) "
+                                     f"VALUES ({', '.join('?' * len(columns))})", rows)
+                # مؤشرات المزامنة تشير لسجل التغييرات القديم، فتحذف لتعاد المزامنة الكاملة بأمان
+                conn.executemany('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                                 [(key, value) for key, value in self._settings.items()
+                                  if not key.startswith('sync_cursor:')])
+                conn.commit()
+            finally:
+                conn.close()
+
+        # نقل ما في WAL الملف الأصلي إليه أولاً، فلا يبقى في WAL ما يضيع أو يطبق على الملف الجديد
+        if os.path.exists(path):
+            conn = sqlite3.connect(path)
+            try:
+                busy = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()[0]
+            finally:
+                conn.close()
+            if busy:
+                raise RuntimeError(f"قاعدة البيانات مستخدمة حالياً ولا يمكن استبدالها: {path}")
+
+        os.replace(temp_path, path)
+        # ملفات WAL الفارغة المتبقية تخص الملف القديم
+        for suffix in ('-wal', '-shm'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path + suffix)
+        return path
+
+
+class GeneratedFileRecorder:
+    """تسجيل الملفات المولدة على دفعات بدلاً من معاملة لكل ملف
+
+    الأسماء تجمع في الذاكرة بدون تكرار على (المشروع, الاسم) ويكتبها خيط الكتابة بـ add_generated_files
+    في معاملة واحدة عند امتلاء الدفعة أو بعد flush_interval ثانية أو عند الإغلاق وخروج البرنامج.
+    يعمل مع أي StorageBackend.
+
+    الدفعة التي فشلت كتابتها تبقى منتظرة وتعاد محاولتها كل flush_interval ثانية حتى تنجح
+    أو يستدعى close(). يستدعى on_error(الخطأ, عدد الأسماء المنتظرة) من خيط الكتابة عند أول فشل بعد نجاح.
+    """
+
+    def __init__(self, db, batch_size=500, flush_interval=2.0, on_error=None):
+        import atexit
+
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self.stats = {'recorded': 0, 'duplicates': 0, 'written': 0, 'flushes': 0, 'failures': 0}
+
+        self._failures = 0
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        # يوقظ خيط الكتابة قبل انتهاء المهلة عند امتلاء الدفعة
+        self._flush_event = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def record(self, filename, project_id, file_type, file_path=""):
+        """إضافة ملف للدفعة (يرجع False إذا كان الاسم في الدفعة من قبل لنفس المشروع)
+
+        لا تكتب في قاعدة البيانات ولا ترفع أخطاءها، فيمكن استدعاؤها من خيط الواجهة.
+        """
+        key = (project_id, filename)
+        with self._pending_lock:
+            if key in self._pending:
+                self.stats['duplicates'] += 1
+                return False
+            self._pending[key] = (filename, project_id, file_type, file_path)
+            self.stats['recorded'] += 1
+            if len(self._pending) >= self.batch_size:
+                self._flush_event.set()
+        return True
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def is_pending(self, filename, project_id):
+        return (project_id, filename) in self._pending
+
+    def flush(self):
+        """كتابة الدفعة المنتظرة في معاملة واحدة، ويرجع عدد الصفوف المضافة
+
+        عند الفشل تعاد الدفعة للانتظار ثم يرفع الخطأ.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                records, self._pending = list(self._pending.values()), {}
+            if not records:
+                return 0
+            try:
+                written = self.db.add_generated_files(records) or 0
+            except Exception as e:
+                self._failures += 1
+                self.stats['failures'] += 1
+                with self._pending_lock:
+                    for record in records:
+                        self._pending.setdefault((record[1], record[0]), record)
+                    pending = len(self._pending)
+                if self.on_error and self._failures == 1:
+                    self.on_error(e, pending)
+                raise
+            self._failures = 0
+            self.stats['written'] += written
+            self.stats['flushes'] += 1
+            return written
+
+    def _flush_loop(self):
+        """كتابة دورية للدفعة حتى لا تتأخر الأسماء القليلة (الأخطاء تصل عبر on_error)"""
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("تعذر حفظ أسماء الملفات المولدة")
+                # انتظار المهلة كاملة قبل المحاولة التالية حتى لو امتلأت الدفعة
+                self._stop_event.wait(self.flush_interval)
+
+    def close(self):
+        """إيقاف الكتابة الدورية وكتابة ما تبقى (يرفع الخطأ إذا فشلت الكتابة الأخيرة)"""
+        import atexit
+
+        atexit.unregister(self.close)
+        self._stop_event.set()
+        self._flush_event.set()
+        if self._flush_thread.is_alive() and self._flush_thread is not threading.current_thread():
+            self._flush_thread.join()
+        return self.flush()
+
+
+# هيكل المجلدات الكامل
+FOLDER_STRUCTURE = {
+    "00_Inbox_صندوق_الوارد": [],
+    "10_Work_&_Study_العمل_والدراسة": {
+        "11_Clients_العملاء": [],
+        "12_University_الجامعة": []
+    },
+    "20_Knowledge_Base_قاعدة_المعرفة": {
+        "21_Courses_الكورسات": ["2023", "2024"],
+        "22_Tutorials_شروحاتي": ["01_Scripts_&_Notes", "02_Final_Videos"],
+        "23_Resources_الموارد": [
+            "Books_&_Articles", "Code_Snippets", "Stock_Media",
+            "Templates_القوالب", "Software_&_Tools"
+        ],
+        "24_Portfolio_نماذج_الأعمال": ["Web", "Apps", "Graphics"]
+    },
+    "30_Admin_&_Finance_الإدارة_والمالية": {
+        "31_Invoices_الفواتير": ["2023", "2024"],
+        "32_Proposals_&_Contracts": [],
+        "33_Receipts_الإيصالات": [],
+        "34_Reports_تقارير_مالية": []
+    },
+    "40_Personal_شخصي": [
+        "CV_&_CoverLetters", "ID_&_Documents",
+        "Goals_&_Planning", "Personal_Projects"
+    ],
+    "99_Archive_الأرشيف": {
+        "Work_Archive": ["2023"],
+        "Study_Archive": ["2022"]
+    }
+}
+
+
+@perf_monitor.track('fs.create_folder_tree')
+def create_folder_tree(base_path, structure):
+    """إنشاء المجلدات بشكل تكراري"""
+    _create_folder_tree(base_path, structure)
+
+
+def _create_folder_tree(base_path, structure):
+    for folder_name, subfolders in structure.items():
+        folder_path = os.path.join(base_path, folder_name)
+        os.makedirs(folder_path, exist_ok=True)
+
+        if isinstance(subfolders, dict):
+            _create_folder_tree(folder_path, subfolders)
+        elif isinstance(subfolders, list):
+            for subfolder in subfolders:
+                subfolder_path = os.path.join(folder_path, subfolder)
+                os.makedirs(subfolder_path, exist_ok=True)
+
+
+# مجلد سلة المهملات الخاصة بالبرنامج (ينشأ بجانب المجلد المحذوف)
+TRASH_DIR_NAME = '.organizer_trash'
+
+
+@perf_monitor.track('fs.move_to_trash')
+def move_to_trash(path, progress=None):
+    """نقل مجلد إلى سلة المهملات بدلاً من حذفه نهائياً وإرجاع مساره الجديد
+
+    السلة على نفس القرص، لذلك يكون النقل عادة إعادة تسمية فورية. إذا تعذرت إعادة
+    التسمية تنقل الملفات واحداً واحداً مع استدعاء progress(done, total).
+    """
+    import shutil
+
+    path = os.path.normpath(os.path.abspath(path))
+    trash_dir = os.path.join(os.path.dirname(path), TRASH_DIR_NAME)
+    os.makedirs(trash_dir, exist_ok=True)
+    dest = os.path.join(trash_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.path.basename(path)}")
+
+    try:
+        os.rename(path, dest)
+    except OSError:
+        files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+        for done, source in enumerate(files, 1):
+            target = os.path.join(dest, os.path.relpath(source, path))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(source, target)
+            if progress:
+                progress(done, len(files))
+        shutil.rmtree(path)
+    else:
+        if progress:
+            progress(1, 1)
+    return dest
+
+
+# مجموعات بيانات التصدير: (الاستعلام, {الفلتر: (العمود, المعامل)})
+EXPORT_DATASETS = {
+    'projects': ('''
+        SELECT p.id, p.project_number, p.name, p.status, p.created_date, p.last_modified,
+               p.description, p.folder_path, c.id AS client_id, c.name AS client_name,
+               c.type AS client_type, c.structure_id
+        FROM projects p
+        JOIN clients c ON p.client_id = c.id
+    ''', {
+        'structure_id': ('c.structure_id', '='),
+        'client_type': ('c.type', '='),
+        'status': ('p.status', '='),
+        'date_from': ('p.created_date', '>='),
+        'date_to': ('substr(p.created_date, 1, 10)', '<=')
+    }),
+    'clients': ('''
+        SELECT c.id, c.name, c.type, c.folder_path, c.structure_id, c.created_date
+        FROM clients c
+    ''', {
+        'structure_id': ('c.structure_id', '='),
+        'client_type': ('c.type', '='),
+        'date_from': ('c.created_date', '>='),
+        'date_to': ('substr(c.created_date, 1, 10)', '<=')
+    }),
+    'generated_files': ('''
+        SELECT g.id, g.filename, g.file_type, g.created_date, g.file_path,
+               p.project_number, p.name AS project_name, p.status,
+               c.name AS client_name, c.type AS client_type, c.structure_id
+        FROM generated_files g
+        LEFT JOIN projects p ON g.project_id = p.id
+        LEFT JOIN clients c ON p.client_id = c.id
+    ''', {
+        'structure_id': ('c.structure_id', '='),
+        'client_type': ('c.type', '='),
+        'status': ('p.status', '='),
+        'date_from': ('g.created_date', '>='),
+        'date_to': ('substr(g.created_date, 1, 10)', '<=')
+    })
+}
+
+
+class DataExporter:
+    """تصدير البيانات بشكل متدفق إلى CSV أو JSONL أو ملف أعمدة مضغوط"""
+
+    FORMATS = ('csv', 'jsonl', 'pocol')
+
+    # ملف الأعمدة: مجموعات صفوف مضغوطة بـ zlib ثم فهرس في نهاية الملف
+    COLUMNAR_MAGIC = b'POCOL1'
+
+    def __init__(self, db, batch_size=1000, row_group_size=50000):
+        self.db = db
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size
+
+    @classmethod
+    def detect_format(cls, path):
+        """تحديد الصيغة من امتداد الملف"""
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension not in cls.FORMATS:
+            raise ValueError(f"صيغة تصدير غير مدعومة: {extension}")
+        return extension
+
+    def export(self, dataset, path, fmt=None, filters=None, progress=None):
+        """تصدير مجموعة بيانات إلى ملف وإرجاع عدد الصفوف"""
+        fmt = fmt or self.detect_format(path)
+        columns, rows = self.db.iter_export_rows(dataset, filters, self.batch_size)
+        writer = getattr(self, f"_write_{fmt}")
+        return writer(path, columns, rows, progress)
+
+    def _report(self, progress, count):
+        if progress and count % self.batch_size == 0:
+            progress(count)
+
+    def _write_csv(self, path, columns, rows, progress):
+        import csv
+
+        count = 0
+        # utf-8-sig حتى يفتح Excel الأسماء العربية بشكل صحيح
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+                self._report(progress, count)
+        return count
+
+    def _write_jsonl(self, path, columns, rows, progress):
+        import json
+
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                f.write('\n')
+                count += 1
+                self._report(progress, count)
+        return count
+
+    def _write_pocol(self, path, columns, rows, progress):
+        import json
+        import struct
+        import zlib
+
+        count = 0
+        row_groups = []
+
+        with open(path, 'wb') as f:
+            f.write(self.COLUMNAR_MAGIC)
+
+            def flush(group):
+                # تخزين كل عمود كمصفوفة منفصلة يحسن الضغط
+                data = json.dumps([list(column) for column in zip(*group)],
+                                  ensure_ascii=False).encode('utf-8')
+                compressed = zlib.compress(data, 6)
+                row_groups.append({'offset': f.tell(), 'length': len(compressed), 'rows': len(group)})
+                f.write(compressed)
+
+            group = []
+            for row in rows:
+                group.append(row)
+                count += 1
+                self._report(progress, count)
+                if len(group) >= self.row_group_size:
+                    flush(group)
+                    group = []
+            if group:
+                flush(group)
+
+            footer = json.dumps({'columns': columns, 'rows': count, 'row_groups': row_groups},
+                                ensure_ascii=False).encode('utf-8')
+            f.write(footer)
+            f.write(struct.pack('<Q', len(footer)))
+            f.write(self.COLUMNAR_MAGIC)
+
+        return count
+
+    @classmethod
+    def read_columnar(cls, path, columns=None):
+        """قراءة ملف الأعمدة مجموعة بعد مجموعة (مع إمكانية اختيار أعمدة محددة)"""
+        import json
+        import struct
+        import zlib
+
+        with open(path, 'rb') as f:
+            magic_length = len(cls.COLUMNAR_MAGIC)
+            if f.read(magic_length) != cls.COLUMNAR_MAGIC:
+                raise ValueError("ملف أعمدة غير صالح")
+
+            f.seek(-(magic_length + 8), os.SEEK_END)
+            footer_length = struct.unpack('<Q', f.read(8))[0]
+            f.seek(-(magic_length + 8 + footer_length), os.SEEK_END)
+            footer = json.loads(f.read(footer_length).decode('utf-8'))
+
+            names = footer['columns']
+            selected = [names.index(name) for name in columns] if columns else range(len(names))
+
+            for group in footer['row_groups']:
+                f.seek(group['offset'])
+                data = json.loads(zlib.decompress(f.read(group['length'])).decode('utf-8'))
+                yield from zip(*[data[index] for index in selected])
+
+
+class ReportEngine:
+    """تقارير زمنية فورية تقرأ من جداول التجميع بدلاً من الجداول الكاملة"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _query(self, sql, params=()):
+        conn = self.db._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def totals(self):
+        """الإجماليات العامة"""
+        row = self._query('''
+            SELECT (SELECT COUNT(*) FROM structures),
+                   (SELECT COUNT(*) FROM clients),
+                   (SELECT COALESCE(SUM(project_count), 0) FROM report_projects_by_month),
+                   (SELECT COALESCE(SUM(file_count), 0) FROM report_files_by_type_month)
+        ''')[0]
+        return {'structures': row[0], 'clients': row[1], 'projects': row[2], 'files': row[3]}
+
+    def monthly_projects(self, months=12):
+        """عدد المشاريع لآخر عدد من الأشهر [(الشهر, العدد)]"""
+        rows = self._query('''
+            SELECT month, project_count FROM report_projects_by_month
+            WHERE project_count > 0 ORDER BY month DESC LIMIT ?
+        ''', (months,))
+        return list(reversed(rows))
+
+    def monthly_projects_by_type(self, months=12):
+        """عدد المشاريع لكل نوع عميل في آخر عدد من الأشهر {الشهر: {النوع: العدد}}"""
+        rows = self._query('''
+            SELECT month, client_type, project_count FROM report_projects_by_type_month
+            WHERE project_count > 0 AND month IN (
+                SELECT month FROM report_projects_by_month
+                WHERE project_count > 0 ORDER BY month DESC LIMIT ?
+            )
+            ORDER BY month
+        ''', (months,))
+
+        trend = {}
+        for month, client_type, count in rows:
+            trend.setdefault(month, {})[client_type] = count
+        return trend
+
+    def top_clients(self, limit=10):
+        """العملاء الأكثر مشاريع [(الاسم, النوع, العدد, آخر مشروع)]"""
+        return self._query('''
+            SELECT c.name, c.type, r.project_count, r.last_project_date
+            FROM report_projects_by_client r
+            JOIN clients c ON c.id = r.client_id
+            WHERE r.project_count > 0
+            ORDER BY r.project_count DESC, r.last_project_date DESC
+            LIMIT ?
+        ''', (limit,))
+
+    def files_by_type(self, months=None):
+        """عدد الملفات المولدة لكل نوع (لكل الفترة أو لآخر عدد من الأشهر)"""
+        if months:
+            return self._query('''
+                SELECT file_type, SUM(file_count) FROM report_files_by_type_month
+                WHERE month >= (SELECT MIN(month) FROM (
+                    SELECT DISTINCT month FROM report_files_by_type_month ORDER BY month DESC LIMIT ?
+                ))
+                GROUP BY file_type HAVING SUM(file_count) > 0 ORDER BY 2 DESC
+            ''', (months,))
+        return self._query('''
+            SELECT file_type, SUM(file_count) FROM report_files_by_type_month
+            GROUP BY file_type HAVING SUM(file_count) > 0 ORDER BY 2 DESC
+        ''')
+
+    def trend_report(self, months=12):
+        """نص تقرير الاتجاهات للعرض في نافذة التقارير"""
+        lines = ["📅 المشاريع شهرياً:"]
+        monthly = self.monthly_projects(months)
+        by_type = self.monthly_projects_by_type(months)
+        peak = max((count for _, count in monthly), default=0)
+
+        for month, count in monthly:
+            bar = "█" * max(1, round(count / peak * 30)) if peak else ""
+            types = "، ".join(f"{t}: {c}" for t, c in sorted(by_type.get(month, {}).items()))
+            lines.append(f"  {month}  {bar} {count}  ({types})")
+
+        lines.append("")
+        lines.append("👥 العملاء الأكثر مشاريع:")
+        for name, client_type, count, last_date in self.top_clients():
+            lines.append(f"  • {name} ({client_type}): {count} مشروع - آخرها {(last_date or '')[:10]}")
+
+        lines.append("")
+        lines.append("🔖 الملفات المولدة حسب النوع:")
+        for file_type, count in self.files_by_type():
+            lines.append(f"  • {file_type}: {count}")
+
+        return "\n".join(lines)
+
+
+class ShardedReportEngine(ReportEngine):
+    """تقارير على كل الـ shards: يتم الاستعلام بالتوازي ودمج النتائج"""
+
+    def __init__(self, db):
+        super().__init__(db.catalog)
+        self.sharded_db = db
+
+    def _each(self, method, *args):
+        return self.sharded_db.fan_out(lambda shard: getattr(ReportEngine(shard), method)(*args),
+                                       include_catalog=True)
+
+    def totals(self):
+        """الإجماليات العامة"""
+        merged = {'structures': 0, 'clients': 0, 'projects': 0, 'files': 0}
+        for totals in self._each('totals'):
+            for key in ('clients', 'projects', 'files'):
+                merged[key] += totals[key]
+        merged['structures'] = self._query('SELECT COUNT(*) FROM structures')[0][0]
+        return merged
+
+    def monthly_projects(self, months=12):
+        """عدد المشاريع لآخر عدد من الأشهر [(الشهر, العدد)]"""
+        # آخر N شهر على المستوى العام موجودة حتماً ضمن آخر N شهر لكل shard يحتويها
+        merged = {}
+        for rows in self._each('monthly_projects', months):
+            for month, count in rows:
+                merged[month] = merged.get(month, 0) + count
+        return sorted(merged.items())[-months:]
+
+    def monthly_projects_by_type(self, months=12):
+        """عدد المشاريع لكل نوع عميل في آخر عدد من الأشهر {الشهر: {النوع: العدد}}"""
+        recent = {month for month, _ in self.monthly_projects(months)}
+        merged = {}
+        for trend in self._each('monthly_projects_by_type', months):
+            for month, types in trend.items():
+                if month not in recent:
+                    continue
+                month_types = merged.setdefault(month, {})
+                for client_type, count in types.items():
+                    month_types[client_type] = month_types.get(client_type, 0) + count
+        return dict(sorted(merged.items()))
+
+    def top_clients(self, limit=10):
+        """العملاء الأكثر مشاريع [(الاسم, النوع, العدد, آخر مشروع)]"""
+        rows = [row for result in self._each('top_clients', limit) for row in result]
+        rows.sort(key=lambda row: (row[2], row[3] or ''), reverse=True)
+        return rows[:limit]
+
+    def files_by_type(self, months=None):
+        """عدد الملفات المولدة لكل نوع (لكل الفترة أو لآخر عدد من الأشهر)"""
+        sql = 'SELECT month, file_type, file_count FROM report_files_by_type_month WHERE file_count > 0'
+        rows = [row for result in self.sharded_db.fan_out(lambda shard: ReportEngine(shard)._query(sql),
+                                                          include_catalog=True) for row in result]
+        if months:
+            recent = sorted({month for month, _, _ in rows})[-months:]
+            rows = [row for row in rows if recent and row[0] >= recent[0]]
+
+        merged = {}
+        for _, file_type, count in rows:
+            merged[file_type] = merged.get(file_type, 0) + count
+        return sorted(merged.items(), key=lambda item: item[1], reverse=True)
+
+
+class FolderImporter:
+    """استيراد مجلدات العملاء والمشاريع المنشأة يدوياً إلى قاعدة البيانات"""
+
+    # مجلدات العملاء داخل الهيكل ونوع العميل المفترض لكل منها (None = النوع الافتراضي)
+    CLIENT_ROOTS = (
+        (("10_Work_&_Study_العمل_والدراسة", "11_Clients_العملاء"), None),
+        (("10_Work_&_Study_العمل_والدراسة", "12_University_الجامعة"), "مشروع جامعي"),
+    )
+
+    # P_YYMM_XXX_اسم_المشروع
+    PROJECT_FOLDER_PATTERN = re.compile(r'^(P_(\d{2})(\d{2})_\d{3,})(?:_(.*))?$')
+
+    def __init__(self, db, default_client_type="عميل حر", batch_size=1000):
+        self.db = db
+        self.default_client_type = default_client_type
+        self.batch_size = batch_size
+
+    @classmethod
+    def parse_project_folder(cls, folder_name):
+        """استخراج (رقم المشروع, اسم المشروع, تاريخ الإنشاء) من اسم المجلد أو None"""
+        match = cls.PROJECT_FOLDER_PATTERN.match(folder_name)
+        if not match:
+            return None
+
+        project_number, year, month, name = match.groups()
+        if not 1 <= int(month) <= 12:
+            return None
+
+        created_date = f"20{year}-{month}-01T00:00:00"
+        return project_number, name.replace("_", " ") if name else project_number, created_date
+
+    def _scan_clients(self, base_path):
+        """المرور على مجلدات العملاء [(مسار المجلد, الاسم, النوع)]"""
+        for parts, client_type in self.CLIENT_ROOTS:
+            root = os.path.join(base_path, *parts)
+            if not os.path.isdir(root):
+                continue
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_dir() and not entry.name.startswith('.'):
+                        yield entry.path, entry.name.replace("_", " "), client_type or self.default_client_type
+
+    def _scan_projects(self, client_folder):
+        """المرور على مجلدات المشاريع داخل مجلد عميل"""
+        with os.scandir(client_folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    yield entry
+
+    def import_structure(self, structure_id, base_path, progress=None):
+        """استيراد شجرة هيكل كاملة في مرور واحد وإرجاع إحصائيات الاستيراد"""
+        stats = {'clients_added': 0, 'projects_added': 0, 'projects_skipped': 0, 'folders_ignored': 0}
+        current_time = datetime.now().isoformat()
+
+        conn = self.db._connect()
+        try:
+            cursor = conn.cursor()
+
+            # العملاء الموجودون مسبقاً (حسب المسار)
+            cursor.execute('SELECT folder_path, id FROM clients')
+            client_ids = dict(cursor.fetchall())
+
+            clients = list(self._scan_clients(base_path))
+            new_clients = [(name, client_type, folder, structure_id, current_time)
+                           for folder, name, client_type in clients if folder not in client_ids]
+
+            if new_clients:
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO clients (name, type, folder_path, structure_id, created_date, name_key)
+                    VALUES (?, ?, ?, ?, ?, normalize_name(?))
+                ''', [client + (client[0],) for client in new_clients])
+                stats['clients_added'] = cursor.rowcount
+                conn.commit()
+
+                cursor.execute('SELECT folder_path, id FROM clients WHERE structure_id = ?', (structure_id,))
+                client_ids.update(cursor.fetchall())
+
+            insert_sql = '''
+                INSERT OR IGNORE INTO projects (name, project_number, client_id, folder_path,
+                                                created_date, last_modified, description, name_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, normalize_name(?))
+            '''
+
+            def flush(batch):
+                cursor.executemany(insert_sql, batch)
+                conn.commit()
+                # rowcount لا يحسب التعديلات التي تجريها triggers التجميع
+                added = cursor.rowcount
+                stats['projects_added'] += added
+                stats['projects_skipped'] += len(batch) - added
+                if progress:
+                    progress(stats)
+
+            batch = []
+            for client_folder, _, _ in clients:
+                client_id = client_ids.get(client_folder)
+                for entry in self._scan_projects(client_folder):
+                    parsed = self.parse_project_folder(entry.name)
+                    if not parsed:
+                        stats['folders_ignored'] += 1
+                        continue
+
+                    project_number, project_name, created_date = parsed
+                    batch.append((project_name, project_number, client_id, entry.path,
+                                  created_date, current_time, "", project_name))
+                    if len(batch) >= self.batch_size:
+                        flush(batch)
+                        batch = []
+
+            if batch:
+                flush(batch)
+        finally:
+            conn.close()
+
+        return stats
+
+
+def format_size(num_bytes):
+    """تحويل الحجم بالبايت إلى نص مقروء"""
+    size = float(num_bytes)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class DiskUsageEngine:
+    """حساب أحجام مجلدات العملاء والمشاريع بالتوازي مع ذاكرة مؤقتة حسب mtime
+
+    تحفظ لكل مجلد مجموع أحجام ملفاته المباشرة وأسماء مجلداته الفرعية، ولا يعاد
+    فحص محتوى المجلد إلا إذا تغير mtime الخاص به (إضافة أو حذف أو إعادة تسمية).
+    تعديل محتوى ملف موجود لا يغير mtime المجلد، لذلك يتوفر خيار full لإعادة الفحص الكامل.
+    """
+
+    def __init__(self, db, max_workers=8):
+        self.db = db
+        self.max_workers = max_workers
+
+    def _load_cache(self):
+        import json
+
+        conn = self.db._connect()
+        try:
+            rows = conn.execute('SELECT path, mtime_ns, files_size, subdirs FROM disk_usage_cache').fetchall()
+        finally:
+            conn.close()
+        return {path: (mtime_ns, files_size, json.loads(subdirs)) for path, mtime_ns, files_size, subdirs in rows}
+
+    @retry_on_busy
+    def _save_cache(self, changed, removed):
+        import json
+
+        conn = self.db._connect()
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO disk_usage_cache (path, mtime_ns, files_size, subdirs)
+                VALUES (?, ?, ?, ?)
+            ''', [(path, mtime_ns, files_size, json.dumps(subdirs, ensure_ascii=False))
+                  for path, (mtime_ns, files_size, subdirs) in changed.items()])
+            conn.executemany('DELETE FROM disk_usage_cache WHERE path = ?', [(path,) for path in removed])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _dir_total(self, path, cache, totals, changed, full):
+        """الحجم الكلي لمجلد (تكراري) مع إعادة استخدام الذاكرة المؤقتة"""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+
+        entry = cache.get(path)
+        if entry and entry[0] == mtime_ns and not full:
+            files_size, subdirs = entry[1], entry[2]
+        else:
+            files_size, subdirs = 0, []
+            try:
+                with os.scandir(path) as entries:
+                    for item in entries:
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                subdirs.append(item.name)
+                            elif item.is_file(follow_symlinks=False):
+                                files_size += item.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue
+            except OSError:
+                return 0
+            changed[path] = cache[path] = (mtime_ns, files_size, subdirs)
+
+        total = files_size
+        for name in subdirs:
+            total += self._dir_total(os.path.join(path, name), cache, totals, changed, full)
+        totals[path] = total
+        return total
+
+    def compute(self, paths, full=False):
+        """حساب أحجام مجموعة مسارات بالتوازي {المسار: الحجم}"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        cache = self._load_cache()
+        totals = {}
+        changed = {}
+
+        # المسارات المتداخلة (مشروع داخل مجلد عميل) تحسب مرة واحدة ضمن الأب. الترتيب بمكونات المسار
+        # يضع كل مجلد قبل ما بداخله مباشرة (الترتيب النصي يضع '/a/C-x' بين '/a/C' و '/a/C/P')
+        roots = []
+        for path in sorted(set(paths), key=lambda path: os.path.normpath(path).split(os.sep)):
+            if roots and path.startswith(roots[-1] + os.sep):
+                continue
+            roots.append(path)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(lambda root: self._dir_total(root, cache, totals, changed, full), roots))
+
+        # حذف المجلدات التي لم تعد موجودة من الذاكرة المؤقتة
+        removed = [path for path in cache
+                   if path not in totals and any(path == root or path.startswith(root + os.sep) for root in roots)]
+        self._save_cache(changed, removed)
+
+        return {path: totals.get(path, 0) for path in paths}
+
+    def project_and_client_sizes(self, full=False):
+        """أحجام جميع المشاريع والعملاء ({معرف المشروع: الحجم}, {معرف العميل: الحجم})"""
+        conn = self.db._connect()
+        try:
+            clients = conn.execute('SELECT id, folder_path FROM clients').fetchall()
+            projects = conn.execute('SELECT id, folder_path FROM projects').fetchall()
+        finally:
+            conn.close()
+
+        sizes = self.compute([path for _, path in clients] + [path for _, path in projects], full)
+        return ({project_id: sizes[path] for project_id, path in projects},
+                {client_id: sizes[path] for client_id, path in clients})
+
+
+class DatabaseMaintenance:
+    """صيانة ملف قاعدة البيانات على خطوات صغيرة
+
+    كل استدعاء next() على steps() ينفذ خطوة قصيرة واحدة: تحرير دفعة صفحات فارغة
+    (incremental_vacuum)، ثم PRAGMA optimize، ثم quick_check لجدول واحد في كل خطوة.
+    القاعدة القديمة (قبل auto_vacuum=INCREMENTAL) تحتاج VACUUM كاملاً مرة واحدة، وهو لا يقسم
+    على خطوات ويقفل الملف، لذلك لا يكون ضمن steps() بل بطلب صريح عبر full_vacuum().
+    عند انتهاء الخطوات يسجل التشغيل في maintenance_log مع إحصائيات الملف قبله وبعده.
+    """
+
+    def __init__(self, db, vacuum_pages=256):
+        self.db = db
+        self.vacuum_pages = vacuum_pages
+
+    def page_stats(self, conn):
+        """حجم الملف وعدد الصفحات والصفحات الفارغة ووضع auto_vacuum"""
+        return {
+            'file_size': os.path.getsize(self.db.db_path),
+            'page_size': conn.execute('PRAGMA page_size').fetchone()[0],
+            'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+            'freelist_count': conn.execute('PRAGMA freelist_count').fetchone()[0],
+            'auto_vacuum': conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        }
+
+    def steps(self):
+        """مولد خطوات تشغيل صيانة واحد (يعيد اسم المهمة بعد كل خطوة)"""
+        conn = self.db._connect()
+        try:
+            before = self.page_stats(conn)
+            tasks = {}
+            errors = []
+            slices = 0
+            busy = 0.0
+
+            def step(task, func):
+                nonlocal slices, busy
+                started = time.perf_counter()
+                func()
+                busy += time.perf_counter() - started
+                slices += 1
+                tasks[task] = tasks.get(task, 0) + 1
+                return task
+
+            # sqlite3.execute ينفذ خطوة واحدة فقط (صفحة واحدة)، و executescript ينفذ الأمر حتى نهايته
+            # (2 = INCREMENTAL، وبدونه لا يحرر incremental_vacuum شيئاً)
+            while before['auto_vacuum'] == 2 and conn.execute('PRAGMA freelist_count').fetchone()[0]:
+                yield step('incremental_vacuum',
+                           lambda: conn.executescript(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})'))
+
+            if tasks.get('incremental_vacuum') and self.db.journal_mode == 'WAL':
+                # نقل الصفحات من ملف WAL حتى يصغر الملف الرئيسي فعلاً
+                yield step('checkpoint', lambda: conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall())
+
+            yield step('optimize', lambda: conn.execute('PRAGMA optimize'))
+
+            tables = [name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            for table in tables:
+                yield step('quick_check', lambda: errors.extend(
+                    row[0] for row in conn.execute(f'PRAGMA quick_check("{table}")') if row[0] != 'ok'))
+
+            after = self.page_stats(conn)
+        finally:
+            conn.close()
+
+        self._log_run(before, after, tasks, slices, busy, errors)
+
+    @retry_on_busy
+    def _log_run(self, before, after, tasks, slices, busy, errors):
+        conn = self.db._connect()
+        try:
+            conn.execute('''
+                INSERT INTO maintenance_log (run_date, tasks, slices, busy_ms,
+                    file_size_before, file_size_after, page_count_before, page_count_after,
+                    freelist_before, freelist_after, integrity)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (datetime.now().isoformat(), ', '.join(f"{task}×{count}" for task, count in tasks.items()),
+                  slices, round(busy * 1000, 1), before['file_size'], after['file_size'],
+                  before['page_count'], after['page_count'], before['freelist_count'],
+                  after['freelist_count'], '\n'.join(errors[:20]) or 'ok'))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run(self):
+        """تنفيذ كل الخطوات مباشرة (للسكربتات والقياس)"""
+        for _ in self.steps():
+            pass
+
+    def needs_full_vacuum(self):
+        """هل القاعدة قديمة (بدون auto_vacuum=INCREMENTAL) وتحتاج VACUUM كاملاً للتحويل"""
+        conn = self.db._connect()
+        try:
+            return conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2
+        finally:
+            conn.close()
+
+    @retry_on_busy
+    def full_vacuum(self):
+        """تحويل القاعدة إلى auto_vacuum=INCREMENTAL بإعادة بنائها (VACUUM كامل يقفل الملف حتى ينتهي)
+
+        يستدعى بطلب من المستخدم وفي خيط منفصل، ويسجل في maintenance_log.
+        """
+        conn = self.db._connect()
+        try:
+            before = self.page_stats(conn)
+            started = time.perf_counter()
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            if self.db.journal_mode == 'WAL':
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+            busy = time.perf_counter() - started
+            after = self.page_stats(conn)
+        finally:
+            conn.close()
+        self._log_run(before, after, {'vacuum': 1}, 1, busy, [])
+        return before, after
+
+    def last_runs(self, limit=10):
+        """آخر تشغيلات الصيانة المسجلة"""
+        conn = self.db._connect()
+        try:
+            return conn.execute('''
+                SELECT run_date, tasks, slices, busy_ms, file_size_before, file_size_after,
+                       page_count_before, page_count_after, freelist_before, freelist_after, integrity
+                FROM maintenance_log ORDER BY id DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        finally:
+            conn.close()
+
+
+class BackupEngine:
+    """نسخ احتياطي أثناء العمل عبر sqlite3 backup API مع لقطات مضغوطة ودورية
+
+    النسخ يتم على خطوات من pages_per_step صفحة، وبين الخطوات يحرر قفل القراءة
+    فلا ينتظر الكتّاب أكثر من خطوة واحدة (وفي وضع WAL لا ينتظرون أبداً).
+    كل لقطة تفحص بـ quick_check قبل ضغطها، وتحفظ باسم <القاعدة>_<التاريخ>.db.gz.
+    """
+
+    SUFFIX = '.db.gz'
+    STAMP_FORMAT = '%Y%m%d_%H%M%S_%f'
+
+    def __init__(self, db, backup_dir=None, pages_per_step=256, keep_last=10, keep_daily=14, keep_weekly=8):
+        self.db = db
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(os.path.abspath(db.db_path)), 'backups')
+        self.name = os.path.splitext(os.path.basename(db.db_path))[0]
+        self.pages_per_step = pages_per_step
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+
+    def snapshots(self):
+        """لقطات هذه القاعدة من الأحدث للأقدم: [(المسار, التاريخ, الحجم)]"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        pattern = re.compile(rf'^{re.escape(self.name)}_(\d{{8}}_\d{{6}}_\d{{6}}){re.escape(self.SUFFIX)}$')
+        found = []
+        for entry in os.scandir(self.backup_dir):
+            match = pattern.match(entry.name)
+            if match:
+                found.append((entry.path, datetime.strptime(match.group(1), self.STAMP_FORMAT),
+                              entry.stat().st_size))
+        return sorted(found, key=lambda snapshot: snapshot[1], reverse=True)
+
+    @perf_monitor.track('backup.create_snapshot')
+    def create_snapshot(self, progress=None):
+        """أخذ لقطة من القاعدة دون إيقافها وإرجاع مسار الملف المضغوط
+
+        progress(copied_pages, total_pages) تستدعى بعد كل خطوة نسخ.
+        """
+        import gzip
+        import shutil
+
+        os.makedirs(self.backup_dir, exist_ok=True)
+        path = os.path.join(self.backup_dir, f"{self.name}_{datetime.now().strftime(self.STAMP_FORMAT)}{self.SUFFIX}")
+        temp_path = path + '.tmp'
+
+        source = self.db._connect()
+        target = sqlite3.connect(temp_path)
+        try:
+            if self.db.journal_mode == 'WAL':
+                # تثبيت لقطة قراءة: بدونها يعاد النسخ من البداية عند كل كتابة من اتصال آخر،
+                # وفي WAL لا تمنع القراءة الكتّاب (في الأوضاع الأخرى تمنعهم فلا تثبت)
+                source.execute('BEGIN')
+                source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            source.backup(target, pages=self.pages_per_step,
+                          progress=(lambda status, remaining, total: progress(total - remaining, total))
+                          if progress else None)
+            problems = [row[0] for row in target.execute('PRAGMA quick_check') if row[0] != 'ok']
+        finally:
+            target.close()
+            source.close()
+
+        try:
+            if problems:
+                raise sqlite3.DatabaseError(f"اللقطة غير سليمة: {problems[0]}")
+            # الضغط إلى ملف مؤقت ثم إعادة التسمية، فلا توجد لقطة ناقصة باسم صحيح
+            with open(temp_path, 'rb') as raw, gzip.open(path + '.partial', 'wb', compresslevel=6) as packed:
+                shutil.copyfileobj(raw, packed, 1024 * 1024)
+            os.replace(path + '.partial', path)
+        finally:
+            for leftover in (temp_path, path + '.partial'):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(leftover)
+
+        self.apply_retention()
+        return path
+
+    def apply_retention(self):
+        """حذف اللقطات الزائدة وإرجاع مساراتها
+
+        تبقى آخر keep_last لقطة، وأحدث لقطة من كل يوم لآخر keep_daily يوماً،
+        وأحدث لقطة من كل أسبوع لآخر keep_weekly أسبوعاً.
+        """
+        snapshots = self.snapshots()
+        keep = {path for path, _, _ in snapshots[:self.keep_last]}
+        days = set()
+        weeks = set()
+        for path, created, _ in snapshots:
+            if created.date() not in days and len(days) < self.keep_daily:
+                days.add(created.date())
+                keep.add(path)
+            week = created.isocalendar()[:2]
+            if week not in weeks and len(weeks) < self.keep_weekly:
+                weeks.add(week)
+                keep.add(path)
+
+        removed = [path for path, _, _ in snapshots if path not in keep]
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    @perf_monitor.track('backup.restore')
+    def restore(self, snapshot_path):
+        """استعادة لقطة فوق القاعدة الحالية وإرجاع مسار لقطة الأمان للحالة السابقة
+
+        تؤخذ لقطة من الحالة الحالية أولاً حتى لا يضيع شيء، ثم تنسخ اللقطة المفكوكة
+        في خطوة واحدة (أسرع طريق، والكتّاب ينتظرون حتى انتهائها فقط).
+        """
+        import gzip
+        import shutil
+
+        safety_path = self.create_snapshot()
+        temp_path = os.path.join(self.backup_dir, f".restore_{self.name}.db")
+        try:
+            with gzip.open(snapshot_path, 'rb') as packed, open(temp_path, 'wb') as raw:
+                shutil.copyfileobj(packed, raw, 1024 * 1024)
+
+            source = sqlite3.connect(temp_path)
+            target = self.db._connect()
+            try:
+                problems = [row[0] for row in source.execute('PRAGMA quick_check') if row[0] != 'ok']
+                if problems:
+                    raise sqlite3.DatabaseError(f"اللقطة غير سليمة: {problems[0]}")
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+
+        # لقطة من إصدار أقدم تحتاج ترحيل المخطط
+        self.db.init_database()
+        return safety_path
+
+
+class SyncEngine:
+    """مزامنة قاعدتي بيانات محليتين (جهاز محمول ونسخة المكتب مثلاً) دون خادم
+
+    الصفوف تطابق بالـ uuid، وكل طرف يرسل للآخر ما تغير منذ آخر مزامنة بينهما فقط
+    (من change_log) مع المحذوفات. التعارضات تحل بنفس النتيجة على الطرفين:
+    - تعديل نفس الصف: الأحدث (last_modified) يفوز، وعند التساوي المقارنة بالقيم نفسها.
+    - نفس الهيكل أو العميل أو المشروع أنشئ على الجهازين (نفس الاسم أو المسار): يدمجان بأصغر uuid.
+    - رقم مشروع واحد لمشروعين مختلفين: الأقدم إنشاءً يحتفظ به، والآخر يأخذ رقماً جديداً
+      من نطاق أرقام الجهاز الذي يطبق التغيير (project_number_range). المجلدات لا يعاد تسميتها.
+    - الحذف يفوز على التعديل.
+    """
+
+    # (الجدول, الأعمدة المنقولة, عمود الأب, جدول الأب, المفتاح الطبيعي, عمود زمن التعديل)
+    TABLES = (
+        ('structures', ('name', 'base_path', 'structure_data', 'created_date', 'last_modified'),
+         None, None, 'name', 'last_modified'),
+        ('clients', ('name', 'type', 'folder_path', 'created_date'),
+         'structure_id', 'structures', 'folder_path', 'created_date'),
+        ('projects', ('name', 'project_number', 'folder_path', 'status', 'created_date', 'last_modified', 'description'),
+         'client_id', 'clients', 'folder_path', 'last_modified'),
+        ('generated_files', ('filename', 'file_type', 'created_date', 'file_path'),
+         'project_id', 'projects', None, 'created_date'),
+    )
+
+    @staticmethod
+    def device_id(db):
+        """معرف ثابت للجهاز (يحفظ في إعدادات القاعدة عند أول مزامنة)"""
+        device = db.get_setting('device_id')
+        if not device:
+            import uuid
+            device = uuid.uuid4().hex
+            db.set_setting('device_id', device)
+        return device
+
+    def ensure_uuids(self, db):
+        """تعيين uuid للصفوف التي أنشئت بعد آخر مزامنة"""
+        conn = db._connect()
+        try:
+            for table, *_ in self.TABLES:
+                conn.execute(f'UPDATE {table} SET uuid = lower(hex(randomblob(16))) WHERE uuid IS NULL')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _log_pruned(conn, since):
+        """هل حذفت سجلات تغييرات بعد since (فلا يكفي السجل ويلزم إرسال كل شيء)"""
+        first = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+        if first is None:
+            counter = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+            return bool(counter) and counter[0] > since
+        return first > since + 1
+
+    @perf_monitor.track('sync.export_delta')
+    def export_delta(self, db, peer_id):
+        """التغييرات في db التي لم ترسل بعد إلى الجهاز peer_id
+
+        الصفوف قوائم مضغوطة [uuid, uuid الأب, ...الأعمدة] والمراجع بالـ uuid بدلاً من المعرفات.
+        """
+        self.ensure_uuids(db)
+        since = db.get_setting(f'sync_cursor:{peer_id}')
+        conn = db._connect()
+        try:
+            last_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+            since = int(since) if since is not None else None
+            if since is not None and self._log_pruned(conn, since):
+                since = None
+
+            delta = {'device_id': self.device_id(db), 'cursor': last_seq, 'tables': {}, 'deleted': []}
+            for table, columns, parent_column, parent_table, _, _ in self.TABLES:
+                query = f"SELECT t.uuid, {'p.uuid' if parent_column else 'NULL'}, " + \
+                        ', '.join(f't.{column}' for column in columns) + f' FROM {table} t'
+                if parent_column:
+                    query += f' LEFT JOIN {parent_table} p ON t.{parent_column} = p.id'
+                params = ()
+                if since is not None:
+                    query += ''' WHERE t.id IN (SELECT row_id FROM change_log
+                                 WHERE table_name = ? AND op != 'D' AND seq > ? AND seq <= ?)'''
+                    params = (table, since, last_seq)
+                delta['tables'][table] = [list(row) for row in conn.execute(query + ' ORDER BY t.id', params)]
+
+            if since is None:
+                deleted = conn.execute('SELECT table_name, uuid FROM sync_tombstones')
+            else:
+                deleted = conn.execute('''
+                    SELECT t.table_name, t.uuid FROM change_log c
+                    JOIN sync_tombstones t ON t.table_name = c.table_name AND t.row_id = c.row_id
+                    WHERE c.op = 'D' AND c.seq > ? AND c.seq <= ?
+                ''', (since, last_seq))
+            delta['deleted'] = [list(row) for row in deleted]
+        finally:
+            conn.close()
+        return delta
+
+    @staticmethod
+    def write_delta(path, delta):
+        """حفظ دفعة تغييرات في ملف JSON مضغوط (للنقل اليدوي بين الأجهزة)"""
+        import gzip
+        import json
+
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(delta, f, ensure_ascii=False, separators=(',', ':'))
+
+    @staticmethod
+    def read_delta(path):
+        import gzip
+        import json
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    @perf_monitor.track('sync.apply_delta')
+    def apply_delta(self, db, delta):
+        """تطبيق دفعة تغييرات من جهاز آخر في معاملة واحدة وإرجاع الإحصائيات"""
+        stats = {'inserted': 0, 'updated': 0, 'merged': 0, 'renumbered': 0, 'deleted': 0, 'skipped': 0}
+        self.ensure_uuids(db)
+        number_range = db.parse_number_range(db.get_setting('project_number_range'))
+        conn = db._connect()
+        try:
+            ids = {}
+            for spec in self.TABLES:
+                table = spec[0]
+                rows = delta['tables'].get(table, [])
+                # الصفوف الموجودة أولاً: تعديل أرقام المشاريع المعروفة يحرر أرقامها قبل إضافة الجديدة
+                known = {uuid for (uuid,) in conn.execute(
+                    f"SELECT uuid FROM {table} WHERE uuid IN (SELECT value FROM json_each(?))",
+                    (self._json([row[0] for row in rows]),))}
+                for row in sorted(rows, key=lambda row: row[0] not in known):
+                    self._apply_row(conn, spec, row, ids, number_range, stats)
+
+            # حذف الأبناء قبل الآباء
+            order = {spec[0]: index for index, spec in enumerate(self.TABLES)}
+            for table, uuid in sorted(delta['deleted'], key=lambda item: -order[item[0]]):
+                stats['deleted'] += conn.execute(f'DELETE FROM {table} WHERE uuid = ?', (uuid,)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return stats
+
+    @staticmethod
+    def _json(value):
+        import json
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+    @staticmethod
+    def _local_id(conn, ids, table, uuid):
+        if (table, uuid) not in ids:
+            row = conn.execute(f'SELECT id FROM {table} WHERE uuid = ?', (uuid,)).fetchone()
+            ids[(table, uuid)] = row[0] if row else None
+        return ids[(table, uuid)]
+
+    def _apply_row(self, conn, spec, row, ids, number_range, stats):
+        table, columns, parent_column, parent_table, natural_key, stamp = spec
+        uuid, parent_uuid, *values = row
+        record = dict(zip(columns, values))
+
+        parent_id = None
+        if parent_column and parent_uuid:
+            parent_id = self._local_id(conn, ids, parent_table, parent_uuid)
+            if parent_id is None:
+                # الأب حذف على هذا الجهاز
+                stats['skipped'] += 1
+                return
+
+        select = f"SELECT id, uuid, {parent_column or 'NULL'}, {', '.join(columns)} FROM {table}"
+        local = conn.execute(f'{select} WHERE uuid = ?', (uuid,)).fetchone()
+        if local is None and conn.execute('SELECT 1 FROM sync_tombstones WHERE uuid = ? AND table_name = ?',
+                                          (uuid, table)).fetchone():
+            # حذف على هذا الجهاز وعدل على الآخر: الحذف يفوز ولا يعاد الصف (وحذفه يصل للآخر في نفس المزامنة)
+            stats['skipped'] += 1
+            return
+        if local is None and (natural_key or table == 'generated_files'):
+            if natural_key:
+                local = conn.execute(f'{select} WHERE {natural_key} = ?', (record[natural_key],)).fetchone()
+            else:
+                # الملفات المولدة مفتاحها (المشروع, الاسم) والمفتاح الفريد يمنع إدخال صف ثانٍ
+                local = conn.execute(f'{select} WHERE ifnull(project_id, 0) = ? AND filename = ?',
+                                     (parent_id or 0, record['filename'])).fetchone()
+            if local:
+                # نفس الصف أنشئ على الجهازين: يأخذان أصغر uuid فتتطابق النتيجة على الطرفين
+                if uuid < local[1]:
+                    conn.execute(f'UPDATE {table} SET uuid = ? WHERE id = ?', (uuid, local[0]))
+                stats['merged'] += 1
+
+        if local:
+            local_id = local[0]
+            ids[(table, uuid)] = local_id
+            local_record = dict(zip(columns, local[3:]))
+            if (local_record, local[2]) == (record, parent_id) or table == 'generated_files':
+                return
+            if (record[stamp], self._json(values)) <= (local_record[stamp], self._json(list(local[3:]))):
+                return
+            if table == 'projects' and record['project_number'] != local_record['project_number']:
+                self._claim_project_number(conn, record, uuid, local_id, number_range, stats)
+            assignments = ', '.join(f'{column} = ?' for column in columns)
+            params = [record[column] for column in columns]
+            if parent_column:
+                assignments += f', {parent_column} = ?'
+                params.append(parent_id)
+            conn.execute(f'UPDATE {table} SET {assignments} WHERE id = ?', params + [local_id])
+            if table in DatabaseManager.NAME_KEY_TABLES:
+                conn.execute(f'UPDATE {table} SET name_key = normalize_name(name) WHERE id = ?', (local_id,))
+            stats['updated'] += 1
+            return
+
+        if table == 'projects':
+            self._claim_project_number(conn, record, uuid, None, number_range, stats)
+        insert_columns = ['uuid'] + list(columns) + ([parent_column] if parent_column else [])
+        params = [uuid] + [record[column] for column in columns] + ([parent_id] if parent_column else [])
+        cursor = conn.execute(f"INSERT INTO {table} ({', '.join(insert_columns)}) "
+                              f"VALUES ({', '.join('?' * len(insert_columns))})", params)
+        ids[(table, uuid)] = cursor.lastrowid
+        if table in DatabaseManager.NAME_KEY_TABLES:
+            conn.execute(f'UPDATE {table} SET name_key = normalize_name(name) WHERE id = ?', (cursor.lastrowid,))
+        stats['inserted'] += 1
+
+    def _claim_project_number(self, conn, record, uuid, own_id, number_range, stats):
+        """حل تعارض رقم المشروع: الأقدم إنشاءً (ثم الأصغر uuid) يحتفظ بالرقم"""
+        clash = conn.execute('SELECT id, uuid, created_date, project_number FROM projects '
+                             'WHERE project_number = ? AND id IS NOT ?',
+                             (record['project_number'], own_id)).fetchone()
+        if not clash:
+            return
+
+        now = datetime.now().isoformat()
+        if (record['created_date'], uuid) < (clash[2], clash[1]):
+            conn.execute('UPDATE projects SET project_number = ?, last_modified = ? WHERE id = ?',
+                         (self._free_project_number(conn, clash[3], number_range), now, clash[0]))
+        else:
+            record['project_number'] = self._free_project_number(conn, record['project_number'], number_range)
+            record['last_modified'] = now
+        stats['renumbered'] += 1
+
+    @staticmethod
+    def _free_project_number(conn, project_number, number_range):
+        """أول رقم متاح في نفس الشهر داخل نطاق هذا الجهاز"""
+        low, high = number_range
+        prefix = project_number.rsplit('_', 1)[0]
+        last = conn.execute('SELECT MAX(project_number) FROM projects WHERE project_number BETWEEN ? AND ?',
+                            (f"{prefix}_{low:03d}", f"{prefix}_{high:03d}")).fetchone()[0]
+        sequence = int(last.rsplit('_', 1)[1]) + 1 if last else low
+        if sequence > high:
+            raise ValueError(f"نطاق أرقام المشاريع لهذا الجهاز ({low}-{high}) ممتلئ لـ {prefix}")
+        return f"{prefix}_{sequence:03d}"
+
+    def sync(self, db_a, db_b):
+        """مزامنة في الاتجاهين وإرجاع الإحصائيات {'a_to_b': ..., 'b_to_a': ...}
+
+        تغييرات A تطبق على B أولاً ثم ترسل تغييرات B (بما فيها صدى ما طبق للتو،
+        وهو يتجاهل عند المقارنة) إلى A، فتصل أرقام المشاريع المعدلة للطرفين في نفس المزامنة.
+        """
+        a_id, b_id = self.device_id(db_a), self.device_id(db_b)
+
+        delta_a = self.export_delta(db_a, b_id)
+        a_to_b = self.apply_delta(db_b, delta_a)
+        delta_b = self.export_delta(db_b, a_id)
+
+        before = db_a.change_cursor()
+        b_to_a = self.apply_delta(db_a, delta_b)
+
+        # ما كتب في A أثناء التطبيق صدى يعرفه B، إلا إذا أعيد ترقيم مشروع محلي أو كتب شيء آخر منذ التصدير
+        if before == delta_a['cursor'] and not b_to_a['renumbered']:
+            db_a.set_setting(f'sync_cursor:{b_id}', db_a.change_cursor())
+        else:
+            db_a.set_setting(f'sync_cursor:{b_id}', delta_a['cursor'])
+        db_b.set_setting(f'sync_cursor:{a_id}', delta_b['cursor'])
+
+        return {'a_to_b': a_to_b, 'b_to_a': b_to_a}
+
+
+class ClientMatcher:
+    """مطابقة تقريبية لأسماء العملاء بالمقاطع الثلاثية (trigrams) لاكتشاف التكرار
+
+    يبنى في الذاكرة من صفوف ClientRow (عملاء هيكل واحد عادة). الأسماء تقارن بمفتاحها الموحد
+    (normalize_name) فتتطابق "Sanaa Uni" و"SanaaUni" تماماً، وتتقارب "Sanaa Univ" و"Sana Uni".
+    الأسماء المكتوبة بلغتين مختلفتين ("جامعة صنعاء" و"Sanaa Uni") لا تكتشف.
+    """
+
+    def __init__(self, clients=(), threshold=0.6):
+        self.threshold = threshold
+        self.clients = {}
+        self._keys = {}
+        self._sizes = {}
+        self._index = defaultdict(set)
+        for client in clients:
+            self.add(client)
+
+    @staticmethod
+    def trigrams(key):
+        """المقاطع الثلاثية للمفتاح مع علامتي البداية والنهاية (حتى تقارن الأسماء القصيرة)"""
+        padded = f"^{key}$"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, client):
+        key = normalize_name(client.name)
+        grams = self.trigrams(key)
+        self.clients[client.id] = client
+        self._keys[client.id] = key
+        self._sizes[client.id] = len(grams)
+        for gram in grams:
+            self._index[gram].add(client.id)
+
+    def suggest(self, name, limit=5, exclude=None):
+        """أقرب العملاء للاسم: قائمة (الدرجة, ClientRow) تنازلياً، والدرجة 1.0 للمفتاح المطابق"""
+        key = normalize_name(name)
+        grams = self.trigrams(key)
+        if not key:
+            return []
+
+        # المرشحون فقط: من يشترك في مقطع واحد على الأقل
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._index.get(gram, ()))
+
+        scored = []
+        for client_id, count in shared.items():
+            if client_id == exclude:
+                continue
+            if self._keys[client_id] == key:
+                score = 1.0
+            else:
+                score = 2 * count / (len(grams) + self._sizes[client_id])
+            if score >= self.threshold:
+                scored.append((score, client_id))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(round(score, 3), self.clients[client_id]) for score, client_id in scored[:limit]]
+
+    def duplicate_groups(self):
+        """مجموعات العملاء المتشابهين، وأقدم عميل أول كل مجموعة (الهدف المقترح للدمج)"""
+        parent = {client_id: client_id for client_id in self.clients}
+
+        def find(client_id):
+            while parent[client_id] != client_id:
+                parent[client_id] = parent[parent[client_id]]
+                client_id = parent[client_id]
+            return client_id
+
+        for client_id, client in self.clients.items():
+            for _, other in self.suggest(client.name, limit=len(self.clients), exclude=client_id):
+                parent[find(other.id)] = find(client_id)
+
+        groups = defaultdict(list)
+        for client_id, client in self.clients.items():
+            groups[find(client_id)].append(client)
+        return sorted((sorted(group, key=lambda c: (c.created_date, c.id)) for group in groups.values()
+                       if len(group) > 1), key=lambda group: group[0].name)
+
+
+# أنواع الملفات والإصدارات والامتدادات المعتمدة في قواعد التسمية
+FILE_TYPES = ("Report", "Invoice", "Proposal", "HW", "Lecture", "Research",
+              "Design", "Tutorial", "Presentation", "Contract", "Analysis")
+# عدد النتائج المعروضة في القوائم المنسدلة ذات الإكمال التلقائي
+TYPEAHEAD_LIMIT = 20
+FILE_VERSIONS = ("v01", "v02", "v03", "v04", "v05", "vFINAL", "vDRAFT")
+FILE_EXTENSIONS = ("pdf", "docx", "xlsx", "pptx", "zip", "ai", "psd", "fig",
+                   "mp4", "png", "jpg", "jpeg", "svg", "txt", "md")
+
+ParsedFilename = namedtuple('ParsedFilename', 'kind date file_type client description version extension')
+
+
+class FilenameParser:
+    """تحليل أسماء الملفات حسب قواعد التسمية والتحقق من مطابقتها
+
+    الأنماط مترجمة مرة واحدة، ويتم اختيار النمط من أول حرف في الاسم.
+    """
+
+    # YYYY-MM-DD_[النوع]_[العميل-المشروع]_[وصف_موجز]_vXX.[الامتداد]
+    GENERAL_PATTERN = re.compile(
+        r'(\d{4})-(\d{2})-(\d{2})_([A-Za-z]+)_([^_]+)_(.+)_(v[0-9A-Za-z]+)\.([A-Za-z0-9]+)')
+    # Lec[رقم]_[المادة]_[الموضوع].[امتداد]
+    LECTURE_PATTERN = re.compile(r'(Lec\d+)_([^_]+)_(.+)\.([A-Za-z0-9]+)')
+    # [Lec..وصف]_[المادة].[امتداد] (عندما يبدأ الوصف بـ Lec)
+    LECTURE_DESC_PATTERN = re.compile(r'([Ll]ec\d*[^_]*)_([^_]+)\.([A-Za-z0-9]+)')
+    # Tutorial_[الموضوع]_[التفاصيل]_[الإصدار].[امتداد]
+    TUTORIAL_PATTERN = re.compile(r'Tutorial_([^_]+)_(.+)_(v[0-9A-Za-z]+)\.([A-Za-z0-9]+)')
+    VERSION_PATTERN = re.compile(r'v(\d{2}|FINAL|DRAFT)')
+
+    ISSUE_MESSAGES = {
+        'pattern': "لا يتبع أي قاعدة تسمية",
+        'date': "تاريخ غير صالح",
+        'type': "نوع ملف غير معروف",
+        'version': "رقم إصدار غير صالح (vXX أو vFINAL أو vDRAFT)",
+        'extension': "امتداد غير معتمد"
+    }
+
+    # ملفات لا تخضع لقواعد التسمية
+    IGNORED_FILES = {"README.md", "desktop.ini", ".DS_Store", "Thumbs.db"}
+
+    def __init__(self):
+        self._types = frozenset(FILE_TYPES)
+        self._extensions = frozenset(FILE_EXTENSIONS)
+
+    def parse(self, filename):
+        """تحليل اسم ملف إلى ParsedFilename أو None إذا لم يطابق أي قاعدة"""
+        first = filename[:1]
+        if first.isdigit():
+            match = self.GENERAL_PATTERN.fullmatch(filename)
+            if match:
+                year, month, day, file_type, client, desc, version, ext = match.groups()
+                return ParsedFilename('general', f"{year}-{month}-{day}", file_type, client, desc, version, ext)
+        elif first == 'T':
+            match = self.TUTORIAL_PATTERN.fullmatch(filename)
+            if match:
+                client, desc, version, ext = match.groups()
+                return ParsedFilename('tutorial', None, "Tutorial", client, desc, version, ext)
+        elif first in ('L', 'l'):
+            match = self.LECTURE_PATTERN.fullmatch(filename)
+            if match:
+                lecture, client, desc, ext = match.groups()
+                return ParsedFilename('lecture', None, "Lecture", client, f"{lecture}_{desc}", None, ext)
+            match = self.LECTURE_DESC_PATTERN.fullmatch(filename)
+            if match:
+                desc, client, ext = match.groups()
+                return ParsedFilename('lecture', None, "Lecture", client, desc, None, ext)
+        return None
+
+    def validate(self, filename):
+        """قائمة رموز المخالفات لاسم ملف (قائمة فارغة = مطابق)"""
+        parsed = self.parse(filename)
+        if parsed is None:
+            return ['pattern']
+
+        issues = []
+        if parsed.date:
+            # strptime يرفض الأيام غير الموجودة في الشهر (مثل 2024-02-31)
+            try:
+                datetime.strptime(parsed.date, '%Y-%m-%d')
+            except ValueError:
+                issues.append('date')
+        if parsed.file_type not in self._types:
+            issues.append('type')
+        if parsed.version is not None and not self.VERSION_PATTERN.fullmatch(parsed.version):
+            issues.append('version')
+        if parsed.extension.lower() not in self._extensions:
+            issues.append('extension')
+        return issues
+
+    def iter_tree(self, root):
+        """فحص متدفق لكل الملفات تحت مجلد: يرجع (المسار, المخالفات) للملفات المخالفة فقط"""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name not in self.IGNORED_FILES:
+                            issues = self.validate(entry.name)
+                            if issues:
+                                yield entry.path, issues
+            except OSError:
+                continue
+
+    def validate_projects(self, db, structure_id=None):
+        """تقرير الملفات المخالفة لكل مشروع [(رقم المشروع, اسم المشروع, [(المسار النسبي, المخالفات)])]"""
+        conn = db._connect()
+        try:
+            query = '''
+                SELECT p.project_number, p.name, p.folder_path
+                FROM projects p JOIN clients c ON p.client_id = c.id
+            '''
+            params = ()
+            if structure_id:
+                query += ' WHERE c.structure_id = ?'
+                params = (structure_id,)
+            projects = conn.execute(query + ' ORDER BY p.project_number', params).fetchall()
+        finally:
+            conn.close()
+
+        report = []
+        for project_number, name, folder_path in projects:
+            invalid = [(os.path.relpath(path, folder_path), issues)
+                       for path, issues in self.iter_tree(folder_path)]
+            if invalid:
+                report.append((project_number, name, invalid))
+        return report
+
+    def format_report(self, report):
+        """نص تقرير المخالفات للعرض"""
+        if not report:
+            return "✅ جميع الملفات تتبع قواعد التسمية"
+
+        lines = []
+        for project_number, name, invalid in report:
+            lines.append(f"📁 {project_number} - {name} ({len(invalid)} ملف مخالف)")
+            for relative_path, issues in invalid:
+                reasons = "، ".join(self.ISSUE_MESSAGES[issue] for issue in issues)
+                lines.append(f"    • {relative_path}: {reasons}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+class InboxRouter:
+    """فرز ملفات صندوق الوارد إلى مجلدات المشاريع حسب قواعد التسمية"""
+
+    INBOX_FOLDER = "00_Inbox_صندوق_الوارد"
+
+    PROJECT_NUMBER_PATTERN = re.compile(r'P_\d{4}_\d{3,}')
+
+    # المجلد الفرعي داخل المشروع حسب نوع الملف
+    ADMIN_TYPES = {"Invoice", "Proposal", "Contract"}
+    DELIVERABLE_TYPES = {"Report", "Design", "Presentation", "Analysis", "Research"}
+    WORKING_EXTENSIONS = {"psd", "ai", "fig", "xd", "sketch"}
+
+    def __init__(self, db, structure_id, batch_size=500):
+        self.db = db
+        self.structure_id = structure_id
+        self.batch_size = batch_size
+        self._by_number = {}
+        self._by_project = {}
+        self._by_client = {}
+        self.parser = FilenameParser()
+
+    def build_index(self):
+        """بناء فهرس في الذاكرة للمشاريع النشطة في الهيكل حسب الرقم واسم المشروع واسم العميل
+
+        المشاريع المسلمة والمؤرشفة لا تستقبل ملفات. كل اسم يشير لقائمة مشاريعه حتى يعرف الاسم المشترك.
+        """
+        conn = self.db._connect()
+        try:
+            rows = conn.execute(f'''
+                SELECT p.id, p.project_number, p.name, p.folder_path, c.name
+                FROM projects p
+                JOIN clients c ON p.client_id = c.id
+                WHERE c.structure_id = ? AND p.status = '{PROJECT_STATUS_ACTIVE}'
+            ''', (self.structure_id,)).fetchall()
+        finally:
+            conn.close()
+
+        self._by_number = {}
+        self._by_project = {}
+        self._by_client = {}
+        for project_id, number, name, folder_path, client_name in rows:
+            project = (project_id, folder_path)
+            self._by_number[number] = project
+            self._by_project.setdefault(normalize_name(name), []).append(project)
+            self._by_client.setdefault(normalize_name(client_name), []).append(project)
+
+    def match_project(self, filename, parsed):
+        """إيجاد المشروع المناسب (المعرف, المسار) أو None
+
+        حقل العميل/المشروع في الاسم يطابق اسم مشروع أولاً ثم اسم عميل. إذا أشار لأكثر من مشروع نشط
+        (مثل عميل له عدة مشاريع) لا يمكن تحديد الوجهة فيبقى الملف في صندوق الوارد.
+        """
+        number = self.PROJECT_NUMBER_PATTERN.search(filename)
+        if number and number.group(0) in self._by_number:
+            return self._by_number[number.group(0)]
+        key = normalize_name(parsed.client)
+        projects = self._by_project.get(key) or self._by_client.get(key, [])
+        return projects[0] if len(projects) == 1 else None
+
+    def subfolder_for(self, parsed):
+        """المجلد الفرعي داخل مجلد المشروع"""
+        extension = parsed.extension.lower()
+        if parsed.file_type in self.ADMIN_TYPES:
+            return "01_Admin"
+        if extension in self.WORKING_EXTENSIONS:
+            return "03_Working_Files"
+        if parsed.file_type in self.DELIVERABLE_TYPES:
+            return "04_Exports_&_Deliverables"
+        return "03_Working_Files"
+
+    def plan(self, inbox_path):
+        """خطة النقل دون تنفيذ: (قائمة النقل, الملفات غير المطابقة)"""
+        if not self._by_number:
+            self.build_index()
+
+        moves = []
+        unmatched = []
+        with os.scandir(inbox_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                parsed = self.parser.parse(entry.name)
+                project = self.match_project(entry.name, parsed) if parsed else None
+                if not project:
+                    unmatched.append(entry.name)
+                    continue
+                project_id, folder_path = project
+                destination = os.path.join(folder_path, self.subfolder_for(parsed), entry.name)
+                moves.append((entry.name, entry.path, destination, project_id))
+
+        return moves, unmatched
+
+    def run(self, inbox_path, dry_run=False, progress=None):
+        """تنفيذ الفرز وإرجاع الإحصائيات"""
+        import shutil
+        import uuid
+
+        moves, unmatched = self.plan(inbox_path)
+        stats = {'planned': len(moves), 'moved': 0, 'conflicts': [], 'errors': [],
+                 'unmatched': unmatched, 'run_id': None}
+        if dry_run:
+            stats['moves'] = moves
+            return stats
+
+        run_id = uuid.uuid4().hex
+        stats['run_id'] = run_id
+        log = []
+
+        for index, (filename, source, destination, project_id) in enumerate(moves, 1):
+            if os.path.exists(destination):
+                stats['conflicts'].append(filename)
+                continue
+            try:
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.move(source, destination)
+            except OSError as e:
+                stats['errors'].append(f"{filename}: {e}")
+                continue
+            log.append((run_id, filename, source, destination, project_id, datetime.now().isoformat()))
+            stats['moved'] += 1
+            if progress and index % self.batch_size == 0:
+                progress(index, len(moves))
+
+        self._record_moves(log)
+        return stats
+
+    @retry_on_busy
+    def _record_moves(self, log):
+        """تسجيل كل عمليات النقل في معاملة واحدة"""
+        if not log:
+            return
+        conn = self.db._connect()
+        try:
+            conn.executemany('''
+                INSERT INTO inbox_moves (run_id, filename, source_path, dest_path, project_id, moved_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', log)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def build_filename(date, file_type, client_project, brief_desc, version, extension):
+    """توليد اسم ملف حسب قواعد التسمية الاحترافية"""
+    # الحصول على القيم
+    date = date or datetime.today().strftime('%Y-%m-%d')
+    client_project = client_project.strip().replace(" ", "")
+    brief_desc = brief_desc.strip().replace(" ", "-")
+
+    # التحقق من الحقول المطلوبة
+    if not file_type:
+        raise ValueError("يرجى اختيار نوع الملف")
+
+    if not client_project:
+        raise ValueError("يرجى إدخال اسم العميل/المشروع")
+
+    if not brief_desc:
+        raise ValueError("يرجى إدخال وصف موجز")
+
+    # تطبيق قواعد التسمية الخاصة
+    if file_type == "Lecture":
+        # للمحاضرات: Lec[رقم]_[المادة]_[الموضوع].[امتداد]
+        if brief_desc.startswith("Lec") or brief_desc.startswith("lec"):
+            return f"{brief_desc}_{client_project}.{extension}"
+        return f"Lec01_{client_project}_{brief_desc}.{extension}"
+    elif file_type == "Tutorial":
+        # للشروحات: Tutorial_[الموضوع]_[التفاصيل]_[الإصدار].[امتداد]
+        return f"Tutorial_{client_project}_{brief_desc}_{version}.{extension}"
+
+    # القاعدة العامة: YYYY-MM-DD_[النوع]_[العميل-المشروع]_[وصف_موجز]_vXX.[الامتداد]
+    return f"{date}_{file_type}_{client_project}_{brief_desc}_{version}.{extension}"
+
+
+class WindowManager:
+    """إنشاء النوافذ الفرعية مرة واحدة عند أول فتح، وإخفاؤها بدلاً من إغلاقها
+
+    عند إعادة الفتح يتم تحديث البيانات فقط دون إعادة بناء الواجهة.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._windows = {}
+
+    def show(self, key, build):
+        """إظهار النافذة key، والدالة build() تنشئها وترجع (النافذة, دالة التحديث أو None)"""
+        entry = self._windows.get(key)
+        if entry and entry[0].winfo_exists():
+            window, refresh = entry
+            if refresh:
+                with perf_monitor.timed(f'tk.refresh.{key}'):
+                    refresh()
+            window.deiconify()
+        else:
+            with perf_monitor.timed(f'tk.build.{key}'):
+                window, refresh = build()
+            window.protocol("WM_DELETE_WINDOW", window.withdraw)
+            self._windows[key] = (window, refresh)
+
+        window.lift()
+        window.focus_set()
+        return window
+
+    def hide(self, key):
+        """إخفاء النافذة مع الاحتفاظ بها لإعادة استخدامها"""
+        entry = self._windows.get(key)
+        if entry and entry[0].winfo_exists():
+            entry[0].withdraw()
+
+    def destroy_all(self):
+        """إغلاق كل النوافذ المحفوظة (مثلاً بعد تغيير قاعدة البيانات)"""
+        for window, _ in self._windows.values():
+            if window.winfo_exists():
+                window.destroy()
+        self._windows.clear()
+
+
+class MaintenanceScheduler:
+    """تشغيل DatabaseMaintenance على شرائح زمنية قصيرة أثناء خمول الواجهة
+
+    تعتبر الواجهة خاملة إذا لم يحدث إدخال من المستخدم لمدة idle_ms. كل شريحة تنفذ
+    داخل after_idle (بعد تفريغ طابور أحداث Tk) وتتوقف بعد slice_ms أو عند أي إدخال جديد،
+    ثم تكمل في الخمول التالي. كل قاعدة تصان مرة كل interval_hours ما لم يطلب ذلك بـ request().
+    """
+
+    SETTING_KEY = 'maintenance_last_run'
+
+    def __init__(self, root, databases, slice_ms=30, idle_ms=10000, poll_ms=2000,
+                 interval_hours=24, check_interval=60):
+        self.root = root
+        # دالة ترجع قواعد البيانات المحلية المطلوب صيانتها (ملف واحد أو كل الـ shards)
+        self.databases = databases
+        self.slice_ms = slice_ms
+        self.idle_ms = idle_ms
+        self.poll_ms = poll_ms
+        self.interval_hours = interval_hours
+        self.check_interval = check_interval
+        self._jobs = deque()
+        self._forced = False
+        self._next_check = 0.0
+        self._last_input = time.monotonic()
+
+        for sequence in ('<Any-KeyPress>', '<Any-ButtonPress>', '<Motion>'):
+            root.bind_all(sequence, self._on_input, add='+')
+
+    def start(self):
+        self.root.after(self.poll_ms, self._poll)
+
+    def request(self):
+        """طلب صيانة كل القواعد عند أول خمول (مثلاً بعد حذف كبير)"""
+        self._forced = True
+
+    def _on_input(self, event=None):
+        self._last_input = time.monotonic()
+
+    def is_idle(self):
+        return (time.monotonic() - self._last_input) * 1000 >= self.idle_ms
+
+    def _is_due(self, db):
+        last_run = db.get_setting(self.SETTING_KEY)
+        if self._forced or not last_run:
+            return True
+        return (datetime.now() - datetime.fromisoformat(last_run)).total_seconds() >= self.interval_hours * 3600
+
+    def _poll(self):
+        if not self._jobs and self.is_idle() and (self._forced or time.monotonic() >= self._next_check):
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                self._jobs.extend((db, DatabaseMaintenance(db).steps())
+                                  for db in self.databases() if self._is_due(db))
+            except (sqlite3.Error, OSError):
+                self._jobs.clear()
+            self._forced = False
+
+        if self._jobs and self.is_idle():
+            self.root.after_idle(self._run_slice)
+        else:
+            self.root.after(self.poll_ms, self._poll)
+
+    def _run_slice(self):
+        """تنفيذ خطوات الصيانة حتى انتهاء الشريحة الزمنية"""
+        deadline = time.perf_counter() + self.slice_ms / 1000
+
+        with perf_monitor.timed('maintenance.slice'):
+            while self._jobs and time.perf_counter() < deadline and self.is_idle():
+                db, steps = self._jobs[0]
+                try:
+                    next(steps)
+                except StopIteration:
+                    self._jobs.popleft()
+                    db.set_setting(self.SETTING_KEY, datetime.now().isoformat())
+                except (sqlite3.Error, OSError):
+                    # قاعدة مشغولة أو ملف غير متاح: تأجيلها للتشغيل القادم
+                    self._jobs.popleft()
+                    steps.close()
+
+        # ترك الفرصة لأحداث الواجهة قبل الشريحة التالية
+        if self._jobs and self.is_idle():
+            self.root.after(1, lambda: self.root.after_idle(self._run_slice))
+        else:
+            self.root.after(self.poll_ms, self._poll)
+
+
+class SessionCache:
+    """ذاكرة دافئة للهيكل النشط: صف الهيكل وعملاؤه وأحدث مشاريعه
+
+    يتم تحميلها في الخلفية عند التشغيل وبعد كل تعديل، فتفتح نوافذ المشروع الجديد
+    ومولد الأسماء وقوائمها جاهزة دون استعلام قاعدة البيانات.
+    """
+
+    def __init__(self, recent_limit=200):
+        self.recent_limit = recent_limit
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._clear()
+
+    def _clear(self):
+        self.structure_id = None
+        self.structure = None
+        self.clients = []
+        self.recent_projects = []
+        # مؤشر سجل التغييرات عند آخر تحميل
+        self.cursor = None
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._clear()
+
+    def load(self, db, structure_id):
+        """تحميل بيانات الهيكل (يمكن استدعاؤها من خيط منفصل)
+
+        عند فشل القراءة يسجل الخطأ وتبقى الذاكرة فارغة، فتقرأ النوافذ من قاعدة البيانات مباشرة.
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+
+        try:
+            # المؤشر يؤخذ قبل القراءة حتى لا تضيع تغييرات تحدث أثناءها
+            cursor = db.change_cursor()
+            structure = next((s for s in db.iter_structures() if s.id == structure_id), None)
+            clients = db.get_clients(structure_id) if structure else []
+            recent_projects = (db.get_recent_projects(structure_id, self.recent_limit, PROJECT_STATUS_ACTIVE)
+                               if structure else [])
+        except Exception:
+            logger.exception("تعذر تحميل بيانات الهيكل %s في الذاكرة", structure_id)
+            with self._lock:
+                if generation == self._generation:
+                    self._clear()
+            return
+
+        with self._lock:
+            # تجاهل النتيجة إذا بدأ تحميل أحدث أثناء القراءة
+            if generation != self._generation:
+                return
+            self.structure_id = structure_id if structure else None
+            self.structure = structure
+            self.clients = clients
+            self.recent_projects = recent_projects
+            self.cursor = cursor
+
+    def load_async(self, db, structure_id):
+        threading.Thread(target=self.load, args=(db, structure_id), daemon=True).start()
+
+    def refresh(self, db, structure_id):
+        """إعادة التحميل فقط إذا سجلت تغييرات بعد آخر تحميل"""
+        with self._lock:
+            cursor = self.cursor if structure_id and self.structure_id == structure_id else None
+        if cursor is not None:
+            try:
+                changes, _ = db.tail_changes(cursor, 1, ('structures', 'clients', 'projects'))
+            except Exception:
+                # لا يمكن التأكد من حداثة الذاكرة، فتعاد قراءتها كاملة (أو تبقى فارغة إذا فشلت أيضاً)
+                logger.exception("تعذر قراءة سجل التغييرات لتحديث ذاكرة الهيكل %s", structure_id)
+                changes = True
+            if not changes:
+                return
+        self.load(db, structure_id)
 
-        # تكوين رقم المشروع الجديد
-        project_number = f"P_{year}{month}_{next_sequence:03d}"
+    def refresh_async(self, db, structure_id):
+        threading.Thread(target=self.refresh, args=(db, structure_id), daemon=True).start()
+
+    def get(self, structure_id):
+        """(الهيكل, العملاء, أحدث المشاريع) أو None إذا لم تكن الذاكرة جاهزة لهذا الهيكل"""
+        with self._lock:
+            if structure_id and self.structure_id == structure_id:
+                return self.structure, self.clients, self.recent_projects
+        return None
 
-        return project_number
-    
-    def check_client_exists(self, name, structure_id):
-        """التحقق من وجود العميل"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id FROM clients WHERE name = ? AND structure_id = ?', (name, structure_id))
-        result = cursor.fetchone()
-        conn.close()
-        
-        return result
-    
-    def add_generated_file(self, filename, project_id, file_type, file_path=""):
-        """إضافة ملف مولد"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        current_time = datetime.now().isoformat()
-        cursor.execute('''
-            INSERT INTO generated_files (filename, project_id, file_type, created_date, file_path)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (filename, project_id, file_type, current_time, file_path))
-        
-        conn.commit()
-        conn.close()
 
 class ProjectOrganizer:
     def __init__(self):
+        # أزمنة مراحل التشغيل بالميلي ثانية (تعرض في نافذة التشخيص)
+        self._startup_started = time.perf_counter()
+        self.startup_timings = {}
+
         self.root = tk.Tk()
         self.root.title("🗂️ منظم المشاريع الاحترافي - الإصدار الذكي")
         self.root.geometry("1000x750")
@@ -297,15 +4516,115 @@ class ProjectOrganizer:
             'text_secondary': '#7f8c8d'
         }
 
-        # إنشاء مدير قاعدة البيانات
-        self.db = DatabaseManager()
+        # مدير قاعدة البيانات (محلي أو عبر خادم الفريق) يُنشأ بعد رسم الواجهة في _finish_startup
+        self.server_url = os.environ.get('PROJECT_ORGANIZER_SERVER', '')
+        # مجلد قواعد بيانات منفصلة لكل هيكل (اختياري للتثبيتات الكبيرة جداً)
+        self.shards_dir = os.environ.get('PROJECT_ORGANIZER_SHARDS', '')
+        self.db = None
+        # تسجيل أسماء الملفات المولدة على دفعات (يُنشأ مع قاعدة البيانات)
+        self.file_recorder = None
 
         # متغيرات عامة
         self.selected_path = tk.StringVar()
         self.current_structure_id = None
 
+        # النوافذ الفرعية المعاد استخدامها
+        self.window_manager = WindowManager(self.root)
+
+        # بيانات الهيكل النشط المحملة مسبقاً
+        self.session_cache = SessionCache()
+
+        # صيانة ملفات قاعدة البيانات أثناء الخمول (تبدأ بعد فتح القاعدة)
+        self.maintenance = MaintenanceScheduler(self.root, self.local_databases)
+
         self.create_main_interface()
-    
+        self._mark_startup('interface')
+
+        # نافذة التشخيص المخفية (Ctrl+Shift+D)
+        self.root.bind_all('<Control-Shift-D>', lambda e: self.show_diagnostics_window())
+
+        # فحص قاعدة البيانات والإحصائيات بعد أول رسم للنافذة
+        self.root.after_idle(self._finish_startup)
+
+    def _mark_startup(self, stage):
+        """تسجيل زمن مرحلة من مراحل التشغيل"""
+        elapsed = time.perf_counter() - self._startup_started
+        self.startup_timings[stage] = round(elapsed * 1000, 1)
+        perf_monitor.record(f'startup.{stage}', elapsed)
+
+    def _finish_startup(self):
+        """المرحلة الثانية من التشغيل: فتح قاعدة البيانات ثم الإحصائيات ومعلومات المطور"""
+        self.root.update_idletasks()
+        self._mark_startup('first_paint')
+
+        try:
+            self.set_database(RemoteDatabaseManager(self.server_url) if self.server_url else self.create_local_database())
+        except Exception as e:
+            messagebox.showerror("خطأ", f"تعذر الاتصال بالخادم، سيتم العمل محلياً:\n{str(e)}")
+            self.server_url = ''
+            self.set_database(self.create_local_database())
+        self._mark_startup('database')
+
+        self.restore_session()
+        self.refresh_main_interface()
+        self.create_developer_info(self.developer_frame_ref)
+        self._mark_startup('ready')
+
+        # صيانة قاعدة البيانات على شرائح قصيرة عند خمول الواجهة
+        self.maintenance.start()
+
+        # النسخة الاحتياطية اليومية بعد استقرار التشغيل
+        self.root.after(30000, self.start_auto_backup)
+
+    def set_database(self, db):
+        """تعيين قاعدة البيانات الحالية مع مسجل أسماء الملفات المولدة الخاص بها"""
+        if self.file_recorder:
+            # ما تبقى في دفعة القاعدة السابقة يكتب فيها قبل التبديل
+            try:
+                self.file_recorder.close()
+            except Exception as e:
+                messagebox.showerror("خطأ", f"تعذر حفظ أسماء الملفات المنتظرة في قاعدة البيانات السابقة:\n{str(e)}")
+        self.db = db
+        self.file_recorder = GeneratedFileRecorder(db, on_error=self._report_recorder_error)
+
+    def _report_recorder_error(self, error, pending):
+        """عرض فشل حفظ أسماء الملفات المولدة (يستدعى من خيط الكتابة)"""
+        message = (f"تعذر حفظ {pending} اسم ملف مولد في قاعدة البيانات، وستعاد المحاولة تلقائياً "
+                   f"حتى تنجح ما دام البرنامج مفتوحاً:\n{error}")
+        self.root.after(0, lambda: messagebox.showerror("خطأ", message))
+
+    def restore_session(self):
+        """استعادة الهيكل النشط من آخر جلسة وتحميل بياناته في الخلفية"""
+        self.current_structure_id = None
+        self.session_cache.clear()
+        try:
+            structure_id = int(self.db.get_setting('active_structure_id', 0))
+        except (TypeError, ValueError):
+            return
+        if structure_id:
+            self.current_structure_id = structure_id
+            self.session_cache.load_async(self.db, structure_id)
+
+    def set_active_structure(self, structure_id):
+        """تعيين الهيكل النشط وحفظه للجلسات القادمة"""
+        self.current_structure_id = structure_id
+        self.db.set_setting('active_structure_id', structure_id)
+        self.session_cache.load_async(self.db, structure_id)
+
+    def get_active_structure(self):
+        """صف الهيكل النشط (من الذاكرة الدافئة إن وجدت)"""
+        cached = self.session_cache.get(self.current_structure_id)
+        if cached and cached[0]:
+            return cached[0]
+        return next((s for s in self.db.iter_structures() if s.id == self.current_structure_id), None)
+
+    def get_active_clients(self):
+        """عملاء الهيكل النشط (من الذاكرة الدافئة إن وجدت)"""
+        cached = self.session_cache.get(self.current_structure_id)
+        if cached:
+            return cached[1]
+        return self.db.get_clients(self.current_structure_id)
+
     def create_main_interface(self):
         """إنشاء الواجهة الرئيسية مع إمكانية التمرير محسنة"""
         # إنشاء إطار رئيسي للتحكم في التخطيط
@@ -369,7 +4688,10 @@ class ProjectOrganizer:
         stats_frame = tk.Frame(scrollable_frame, bg=self.colors['bg_secondary'], relief='groove', bd=2)
         stats_frame.pack(pady=15, padx=20, fill='x')
 
-        self.update_stats_display(stats_frame)
+        # الإحصائيات تحمل بعد فتح قاعدة البيانات
+        tk.Label(stats_frame, text="⏳ جاري تحميل الإحصائيات...",
+                font=self.fonts['text'], bg=self.colors['bg_secondary'],
+                fg=self.colors['text_secondary']).pack(pady=30)
 
         # إطار الأزرار الرئيسية مع تحسينات
         buttons_container = tk.Frame(scrollable_frame, bg=self.colors['bg_main'])
@@ -421,6 +4743,19 @@ class ProjectOrganizer:
         self.create_styled_button(row4_frame, "💡 أمثلة قواعد التسمية",
                                  self.show_filename_examples_window, '#6c5ce7')
 
+        self.create_styled_button(row4_frame, "🌐 وضع الخادم",
+                                 self.switch_backend_window, self.colors['primary'])
+
+        # الصف الخامس من الأزرار
+        row5_frame = tk.Frame(buttons_grid, bg=self.colors['bg_main'])
+        row5_frame.pack(pady=8)
+
+        self.create_styled_button(row5_frame, "📥 فرز صندوق الوارد",
+                                 self.sort_inbox, self.colors['success'])
+
+        self.create_styled_button(row5_frame, "💾 النسخ الاحتياطي",
+                                 self.show_backups_window, self.colors['dark'])
+
         # إطار زر الخروج
         exit_frame = tk.Frame(buttons_container, bg=self.colors['bg_main'])
         exit_frame.pack(pady=25)
@@ -440,8 +4775,8 @@ class ProjectOrganizer:
         developer_frame = tk.Frame(scrollable_frame, bg=self.colors['bg_secondary'], relief='groove', bd=2)
         developer_frame.pack(pady=20, padx=20, fill='x')
 
-        # معلومات المطور
-        self.create_developer_info(developer_frame)
+        # معلومات المطور (تنشأ في _finish_startup)
+        self.developer_frame_ref = developer_frame
 
         # إضافة مساحة إضافية في الأسفل
         tk.Label(scrollable_frame, text="", bg=self.colors['bg_main'], height=2).pack()
@@ -453,14 +4788,163 @@ class ProjectOrganizer:
 
     def refresh_main_interface(self):
         """تحديث الإحصائيات في الواجهة الرئيسية"""
-        if hasattr(self, 'stats_frame_ref'):
+        if hasattr(self, 'stats_frame_ref') and self.db is not None:
             self.update_stats_display(self.stats_frame_ref)
+            if self.current_structure_id:
+                self.session_cache.refresh_async(self.db, self.current_structure_id)
+
+    def create_local_database(self):
+        """قاعدة البيانات المحلية: ملف واحد أو shard لكل هيكل حسب الإعدادات"""
+        return ShardedDatabaseManager(self.shards_dir) if self.shards_dir else DatabaseManager()
+
+    def local_databases(self):
+        """كل ملفات قواعد البيانات المحلية (للصيانة)، وقائمة فارغة في وضع الخادم"""
+        if isinstance(self.db, ShardedDatabaseManager):
+            return self.db.shards(include_catalog=True)
+        return [self.db] if isinstance(self.db, DatabaseManager) else []
+
+    def backup_engines(self):
+        """محرك نسخ احتياطي لكل ملف قاعدة بيانات محلي"""
+        return [BackupEngine(db) for db in self.local_databases()]
+
+    def start_auto_backup(self, interval_hours=24):
+        """أخذ لقطة يومية لكل قاعدة محلية في خيط منفصل"""
+        def worker():
+            for engine in self.backup_engines():
+                snapshots = engine.snapshots()
+                if snapshots and (datetime.now() - snapshots[0][1]).total_seconds() < interval_hours * 3600:
+                    continue
+                with contextlib.suppress(sqlite3.Error, OSError):
+                    engine.create_snapshot()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def local_db(self, structure_id=None):
+        """DatabaseManager للعمليات التي تحتاج اتصالاً مباشراً (None في وضع الخادم)
+
+        مع الـ shards يتم إرجاع shard الهيكل المحدد فقط.
+        """
+        if isinstance(self.db, ShardedDatabaseManager):
+            return self.db.shard_for(structure_id) if structure_id else None
+        return self.db if isinstance(self.db, DatabaseManager) else None
+
+    def report_engine(self):
+        """محرك التقارير المناسب لقاعدة البيانات الحالية (None في وضع الخادم)"""
+        if isinstance(self.db, ShardedDatabaseManager):
+            return ShardedReportEngine(self.db)
+        return ReportEngine(self.db) if isinstance(self.db, DatabaseManager) else None
+
+    def get_totals(self):
+        """إجماليات الهياكل والعملاء والمشاريع (استعلامات COUNT مع قاعدة البيانات المحلية)"""
+        report_engine = self.report_engine()
+        if report_engine:
+            return report_engine.totals()
+        return {'structures': len(self.db.get_structures()), 'clients': len(self.db.get_clients()),
+                'projects': len(self.db.get_projects()), 'files': 0}
+
+    def sort_inbox(self):
+        """فرز ملفات صندوق الوارد للهيكل النشط إلى مجلدات المشاريع"""
+        if not self.current_structure_id:
+            messagebox.showwarning("تحذير", "يرجى اختيار هيكل نشط أولاً من إدارة الهياكل")
+            return
+
+        local_db = self.local_db(self.current_structure_id)
+        if not local_db:
+            messagebox.showerror("خطأ", "الفرز متاح فقط مع قاعدة البيانات المحلية")
+            return
+
+        current_structure = self.get_active_structure()
+        if not current_structure:
+            messagebox.showerror("خطأ", "لم يتم العثور على الهيكل النشط")
+            return
+
+        inbox_path = os.path.join(current_structure[2], InboxRouter.INBOX_FOLDER)
+        if not os.path.isdir(inbox_path):
+            messagebox.showerror("خطأ", f"مجلد صندوق الوارد غير موجود:\n{inbox_path}")
+            return
+
+        router = InboxRouter(local_db, self.current_structure_id)
+        moves, unmatched = router.plan(inbox_path)
+
+        if not moves:
+            messagebox.showinfo("صندوق الوارد", f"لا توجد ملفات مطابقة لمشاريع الهيكل.\n\nملفات غير مطابقة: {len(unmatched)}")
+            return
+
+        if not messagebox.askyesno("تأكيد الفرز", f"سيتم نقل {len(moves)} ملف إلى مجلدات المشاريع.\nملفات غير مطابقة ستبقى في صندوق الوارد: {len(unmatched)}\n\nهل تريد المتابعة؟"):
+            return
+
+        def worker():
+            try:
+                stats = router.run(inbox_path)
+                message = f"""تم فرز صندوق الوارد!
+
+✅ ملفات منقولة: {stats['moved']}
+⚠️ موجودة مسبقاً في الوجهة: {len(stats['conflicts'])}
+❌ أخطاء: {len(stats['errors'])}
+❓ غير مطابقة: {len(stats['unmatched'])}"""
+                self.root.after(0, lambda: messagebox.showinfo("تم", message))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: messagebox.showerror("خطأ", f"فشل فرز صندوق الوارد:\n{error}"))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def switch_backend_window(self):
+        """التبديل بين قاعدة البيانات المحلية وخادم الفريق"""
+        url = simpledialog.askstring("🌐 وضع الخادم",
+                                     "أدخل عنوان خادم الفريق (مثل http://server:8765)\nاتركه فارغاً للعمل محلياً:",
+                                     initialvalue=self.server_url, parent=self.root)
+        if url is None:
+            return
+
+        url = url.strip()
+        try:
+            new_db = RemoteDatabaseManager(url) if url else self.create_local_database()
+        except Exception as e:
+            messagebox.showerror("خطأ", f"تعذر الاتصال بالخادم:\n{str(e)}")
+            return
+
+        self.set_database(new_db)
+        self.server_url = url
+        # بعض النوافذ تختلف بين الوضع المحلي ووضع الخادم
+        self.window_manager.destroy_all()
+        self.restore_session()
+        self.refresh_main_interface()
+        messagebox.showinfo("تم", f"تم التبديل إلى {'الخادم: ' + url if url else 'قاعدة البيانات المحلية'}")
 
     def generate_and_set_project_number(self, project_number_var):
         """توليد وتعيين رقم المشروع التلقائي"""
-        new_number = self.db.generate_next_project_number()
+        try:
+            new_number = self.db.generate_next_project_number()
+        except ValueError as e:
+            messagebox.showerror("خطأ", str(e))
+            return
         project_number_var.set(new_number)
 
+    def attach_typeahead(self, combobox, search, fixed_values=()):
+        """إكمال تلقائي لقائمة منسدلة: تستبدل قيمها بأفضل نتائج search(النص المكتوب)
+
+        البحث يتم مرة واحدة عند خمول الواجهة مهما كانت سرعة الكتابة، وترجع الدالة
+        دالة تحديث يمكن استدعاؤها لإعادة البحث بالنص الحالي.
+        """
+        pending = [None]
+
+        def lookup():
+            pending[0] = None
+            combobox['values'] = list(fixed_values) + list(search(combobox.get()))
+
+        def on_key(event):
+            if event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+                return
+            if pending[0]:
+                combobox.after_cancel(pending[0])
+            pending[0] = combobox.after_idle(lookup)
+
+        combobox.configure(state='normal')
+        combobox.bind('<KeyRelease>', on_key, add='+')
+        lookup()
+        return lookup
+
     def toggle_client_fields(self, choice, existing_frame, new_frame):
         """التبديل بين حقول العميل الجديد والموجود"""
         if choice == "موجود":
@@ -493,6 +4977,7 @@ class ProjectOrganizer:
             self.colors['danger']: '#c0392b',
             self.colors['warning']: '#d68910',
             self.colors['dark']: '#2c3e50',
+            self.colors['primary']: '#1a252f',
             '#6c5ce7': '#5b4cdb'  # للون البنفسجي الجديد
         }
         return color_map.get(color, color)
@@ -684,9 +5169,7 @@ class ProjectOrganizer:
             widget.destroy()
 
         # الحصول على الإحصائيات
-        structures = self.db.get_structures()
-        clients = self.db.get_clients()
-        projects = self.db.get_projects()
+        totals = self.get_totals()
 
         # عنوان الإحصائيات
         tk.Label(parent_frame, text="📊 إحصائيات سريعة",
@@ -698,16 +5181,16 @@ class ProjectOrganizer:
         stats_row.pack(pady=(0, 15))
 
         # إحصائية الهياكل
-        self.create_stat_card(stats_row, "🏗️", "الهياكل", len(structures), self.colors['success'])
+        self.create_stat_card(stats_row, "🏗️", "الهياكل", totals['structures'], self.colors['success'])
 
         # إحصائية العملاء
-        self.create_stat_card(stats_row, "👥", "العملاء", len(clients), self.colors['info'])
+        self.create_stat_card(stats_row, "👥", "العملاء", totals['clients'], self.colors['info'])
 
         # إحصائية المشاريع
-        self.create_stat_card(stats_row, "📁", "المشاريع", len(projects), self.colors['warning'])
+        self.create_stat_card(stats_row, "📁", "المشاريع", totals['projects'], self.colors['warning'])
 
         # إحصائية المتوسط
-        avg_projects = len(projects)/len(clients) if clients else 0
+        avg_projects = totals['projects']/totals['clients'] if totals['clients'] else 0
         self.create_stat_card(stats_row, "📈", "متوسط المشاريع", f"{avg_projects:.1f}", self.colors['purple'])
 
     def create_stat_card(self, parent, icon, title, value, color):
@@ -894,47 +5377,15 @@ class ProjectOrganizer:
 
         base_path = self.selected_path.get()
 
-        # هيكل المجلدات الكامل
-        folder_structure = {
-            "00_Inbox_صندوق_الوارد": [],
-            "10_Work_&_Study_العمل_والدراسة": {
-                "11_Clients_العملاء": [],
-                "12_University_الجامعة": []
-            },
-            "20_Knowledge_Base_قاعدة_المعرفة": {
-                "21_Courses_الكورسات": ["2023", "2024"],
-                "22_Tutorials_شروحاتي": ["01_Scripts_&_Notes", "02_Final_Videos"],
-                "23_Resources_الموارد": [
-                    "Books_&_Articles", "Code_Snippets", "Stock_Media",
-                    "Templates_القوالب", "Software_&_Tools"
-                ],
-                "24_Portfolio_نماذج_الأعمال": ["Web", "Apps", "Graphics"]
-            },
-            "30_Admin_&_Finance_الإدارة_والمالية": {
-                "31_Invoices_الفواتير": ["2023", "2024"],
-                "32_Proposals_&_Contracts": [],
-                "33_Receipts_الإيصالات": [],
-                "34_Reports_تقارير_مالية": []
-            },
-            "40_Personal_شخصي": [
-                "CV_&_CoverLetters", "ID_&_Documents",
-                "Goals_&_Planning", "Personal_Projects"
-            ],
-            "99_Archive_الأرشيف": {
-                "Work_Archive": ["2023"],
-                "Study_Archive": ["2022"]
-            }
-        }
-
         try:
             # إنشاء المجلدات
-            self._create_folders_recursive(base_path, folder_structure)
+            create_folder_tree(base_path, FOLDER_STRUCTURE)
 
             # حفظ الهيكل في قاعدة البيانات
-            structure_id = self.db.add_structure(structure_name, base_path, folder_structure)
+            structure_id = self.db.add_structure(structure_name, base_path, FOLDER_STRUCTURE)
 
             if structure_id:
-                self.current_structure_id = structure_id
+                self.set_active_structure(structure_id)
                 messagebox.showinfo("نجح", f"تم إنشاء الهيكل '{structure_name}' بنجاح في:\n{base_path}\n\nتم حفظ الهيكل في قاعدة البيانات.")
                 window.destroy()
                 self.refresh_main_interface()  # تحديث الإحصائيات
@@ -946,16 +5397,7 @@ class ProjectOrganizer:
 
     def _create_folders_recursive(self, base_path, structure):
         """إنشاء المجلدات بشكل تكراري"""
-        for folder_name, subfolders in structure.items():
-            folder_path = os.path.join(base_path, folder_name)
-            os.makedirs(folder_path, exist_ok=True)
-
-            if isinstance(subfolders, dict):
-                self._create_folders_recursive(folder_path, subfolders)
-            elif isinstance(subfolders, list):
-                for subfolder in subfolders:
-                    subfolder_path = os.path.join(folder_path, subfolder)
-                    os.makedirs(subfolder_path, exist_ok=True)
+        create_folder_tree(base_path, structure)
 
     def manage_structures_window(self):
         """نافذة إدارة الهياكل الموجودة"""
@@ -1012,9 +5454,17 @@ class ProjectOrganizer:
                  font=("Arial", 12), bg='#2196F3', fg='white').pack(side='left', padx=5)
 
         tk.Button(buttons_frame, text="🗑️ حذف",
-                 command=lambda: self.delete_structure(tree),
+                 command=lambda: self.delete_structure(tree, status_label),
                  font=("Arial", 12), bg='#f44336', fg='white').pack(side='left', padx=5)
 
+        tk.Button(buttons_frame, text="📥 استيراد المجلدات",
+                 command=lambda: self.import_structure_folders(tree),
+                 font=("Arial", 12), bg='#FF9800', fg='white').pack(side='left', padx=5)
+
+        # حالة العمليات الطويلة (مثل الحذف)
+        status_label = tk.Label(manage_window, text="", font=("Arial", 10), bg='#f0f0f0')
+        status_label.pack(pady=5)
+
     def select_active_structure(self, tree):
         """اختيار هيكل كهيكل نشط"""
         selection = tree.selection()
@@ -1026,11 +5476,13 @@ class ProjectOrganizer:
         structure_id = item['values'][0]
         structure_name = item['values'][1]
 
-        self.current_structure_id = structure_id
+        self.set_active_structure(structure_id)
         messagebox.showinfo("تم", f"تم اختيار '{structure_name}' كهيكل نشط")
 
     def show_structure_details(self, tree):
         """عرض تفاصيل الهيكل"""
+        import json
+
         selection = tree.selection()
         if not selection:
             messagebox.showwarning("تحذير", "يرجى اختيار هيكل من القائمة")
@@ -1064,20 +5516,109 @@ class ProjectOrganizer:
             details_text.insert('1.0', details_content)
             details_text.config(state='disabled')
 
-    def delete_structure(self, tree):
-        """حذف هيكل"""
+    def import_structure_folders(self, tree):
+        """استيراد مجلدات العملاء والمشاريع الموجودة على القرص للهيكل المختار"""
         selection = tree.selection()
         if not selection:
             messagebox.showwarning("تحذير", "يرجى اختيار هيكل من القائمة")
             return
 
         item = tree.item(selection[0])
+        structure_id = item['values'][0]
+        base_path = item['values'][2]
+
+        local_db = self.local_db(structure_id)
+        if not local_db:
+            messagebox.showerror("خطأ", "الاستيراد متاح فقط مع قاعدة البيانات المحلية")
+            return
+
+        if not messagebox.askyesno("تأكيد الاستيراد", f"سيتم البحث عن مجلدات العملاء والمشاريع في:\n{base_path}\n\nهل تريد المتابعة؟"):
+            return
+
+        importer = FolderImporter(local_db)
+
+        # الاستيراد في خيط منفصل حتى لا تتجمد الواجهة
+        def worker():
+            try:
+                stats = importer.import_structure(structure_id, base_path)
+                message = f"""تم الاستيراد بنجاح!
+
+👥 عملاء جدد: {stats['clients_added']}
+📁 مشاريع جديدة: {stats['projects_added']}
+⏭️ مشاريع موجودة مسبقاً: {stats['projects_skipped']}
+❓ مجلدات لا تتبع نظام الترقيم: {stats['folders_ignored']}"""
+                self.root.after(0, lambda: (messagebox.showinfo("تم", message), self.refresh_main_interface()))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: messagebox.showerror("خطأ", f"فشل الاستيراد:\n{error}"))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def delete_structure(self, tree, status_label):
+        """حذف هيكل مع بياناته في الخلفية (ونقل مجلداته لسلة المهملات اختيارياً)"""
+        selection = tree.selection()
+        if not selection:
+            messagebox.showwarning("تحذير", "يرجى اختيار هيكل من القائمة")
+            return
+
+        item_id = selection[0]
+        item = tree.item(item_id)
+        structure_id = item['values'][0]
         structure_name = item['values'][1]
+        base_path = item['values'][2]
+
+        if not messagebox.askyesno("تأكيد الحذف", f"هل أنت متأكد من حذف الهيكل '{structure_name}'؟\nسيتم حذف جميع البيانات المرتبطة به."):
+            return
 
-        if messagebox.askyesno("تأكيد الحذف", f"هل أنت متأكد من حذف الهيكل '{structure_name}'؟\nسيتم حذف جميع البيانات المرتبطة به."):
-            # TODO: إضافة منطق الحذف من قاعدة البيانات
-            messagebox.showinfo("تم", "تم حذف الهيكل بنجاح")
-            tree.delete(selection[0])
+        move_folders = os.path.isdir(base_path) and messagebox.askyesno(
+            "المجلدات", f"هل تريد أيضاً نقل مجلد الهيكل إلى سلة المهملات؟\n{base_path}")
+
+        def report(text):
+            self.root.after(0, lambda: status_label.config(text=text, fg='#666'))
+
+        # الحذف في خيط منفصل وعلى دفعات حتى لا تتجمد الواجهة ولا تقفل قاعدة البيانات طويلاً
+        def worker():
+            try:
+                # لقطة احتياطية قبل الحذف حتى يمكن التراجع عنه
+                local_db = self.local_db(structure_id)
+                if local_db:
+                    BackupEngine(local_db).create_snapshot(
+                        progress=lambda done, total: report(f"⏳ نسخة احتياطية: {done:,} من {total:,} صفحة"))
+                stats = self.db.delete_structure(
+                    structure_id,
+                    progress=lambda done, total: report(f"⏳ حذف البيانات: {done:,} من {total:,}"))
+                trash_path = None
+                if move_folders:
+                    trash_path = move_to_trash(
+                        base_path, progress=lambda done, total: report(f"⏳ نقل الملفات: {done:,} من {total:,}"))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: (status_label.config(text="", fg='#666'),
+                                            messagebox.showerror("خطأ", f"فشل حذف الهيكل:\n{error}")))
+                return
+
+            message = f"""تم حذف الهيكل '{structure_name}'
+
+👥 عملاء: {stats['clients']:,}
+📁 مشاريع: {stats['projects']:,}
+📄 ملفات مولدة: {stats['files']:,}"""
+            if trash_path:
+                message += f"\n\n🗑️ نقلت المجلدات إلى:\n{trash_path}"
+            self.root.after(0, lambda: finish(message))
+
+        def finish(message):
+            status_label.config(text="")
+            if tree.exists(item_id):
+                tree.delete(item_id)
+            if self.current_structure_id == structure_id:
+                self.set_active_structure(None)
+            # الحذف يترك صفحات فارغة تحررها الصيانة عند الخمول التالي
+            self.maintenance.request()
+            self.refresh_main_interface()
+            messagebox.showinfo("تم", message)
+
+        report("⏳ جاري الحذف...")
+        threading.Thread(target=worker, daemon=True).start()
 
     def create_new_project_window(self):
         """نافذة إنشاء مشروع جديد"""
@@ -1126,14 +5667,28 @@ class ProjectOrganizer:
 
         existing_client_var = tk.StringVar()
         existing_client_menu = ttk.Combobox(existing_client_frame, textvariable=existing_client_var,
-                                          font=("Arial", 10), width=50, state='readonly')
-
-        # تحميل العملاء الموجودين
-        clients = self.db.get_clients(self.current_structure_id)
-        client_options = [f"{client[1]} ({client[2]})" for client in clients]
-        existing_client_menu['values'] = client_options
+                                          font=("Arial", 10), width=50)
+
+        # النص المعروض لكل عميل مقترح -> معرفه، فيحدد العميل المختار بمعرفه وليس بتحليل النص
+        client_choices = {}
+
+        def client_label(client):
+            label = f"{client.name} ({client.type})"
+            if client_choices.get(label, client.id) != client.id:
+                # عميلان بنفس الاسم والنوع يميزان بالمعرف
+                label = f"{label} #{client.id}"
+            client_choices[label] = client.id
+            return label
+
+        # القائمة تعرض أول العملاء المطابقين لما يكتب فقط (بحث في الفهرس مع كل ضغطة مفتاح)
+        structure_id = self.current_structure_id
+        self.attach_typeahead(existing_client_menu, lambda text: [
+            client_label(client) for client in self.db.search_clients(structure_id, text, TYPEAHEAD_LIMIT)])
         existing_client_menu.pack(fill='x', pady=5)
 
+        # عملاء الهيكل (من الذاكرة الدافئة) لاقتراح المشابهين عند إضافة عميل جديد
+        clients = self.get_active_clients()
+
         # إطار العميل الجديد
         new_client_frame = tk.Frame(input_frame, bg='#f0f0f0')
         new_client_frame.grid(row=2, column=0, columnspan=2, sticky='ew', pady=5, padx=10)
@@ -1156,6 +5711,41 @@ class ProjectOrganizer:
         tk.Entry(new_client_frame, textvariable=client_name_var,
                 font=("Arial", 10), width=50).pack(fill='x', pady=5)
 
+        # اقتراح العملاء الموجودين المشابهين أثناء الكتابة لتجنب إنشاء عميل مكرر
+        suggestion_frame = tk.Frame(new_client_frame, bg='#f0f0f0')
+        suggestion_frame.pack(fill='x')
+        suggestion_label = tk.Label(suggestion_frame, text="", font=("Arial", 9), bg='#f0f0f0', fg='#E65100')
+        suggestion_label.pack(side='left')
+        use_suggestion_btn = tk.Button(suggestion_frame, text="استخدام العميل الموجود", font=("Arial", 9))
+
+        matcher = ClientMatcher(clients)
+        pending_suggestion = [None]
+
+        def use_suggestion(client):
+            client_choice_var.set("موجود")
+            self.toggle_client_fields("موجود", existing_client_frame, new_client_frame)
+            existing_client_var.set(client_label(client))
+
+        def show_suggestions():
+            pending_suggestion[0] = None
+            matches = matcher.suggest(client_name_var.get(), limit=3)
+            if not matches:
+                suggestion_label.config(text="")
+                use_suggestion_btn.pack_forget()
+                return
+            suggestion_label.config(text="⚠️ عملاء مشابهون: " + "، ".join(
+                f"{client.name} ({score:.0%})" for score, client in matches))
+            use_suggestion_btn.config(command=lambda client=matches[0][1]: use_suggestion(client))
+            use_suggestion_btn.pack(side='right')
+
+        def schedule_suggestions(*args):
+            # تأجيل قصير حتى لا تحسب الاقتراحات مع كل حرف عند الكتابة السريعة
+            if pending_suggestion[0]:
+                project_window.after_cancel(pending_suggestion[0])
+            pending_suggestion[0] = project_window.after(150, show_suggestions)
+
+        client_name_var.trace('w', schedule_suggestions)
+
         # إخفاء إطار العميل الموجود في البداية
         existing_client_frame.grid_remove()
 
@@ -1213,6 +5803,7 @@ class ProjectOrganizer:
         check_label.pack()
 
         # دالة التحقق الذكي
+        @perf_monitor.track('tk.smart_check')
         def smart_check(*args):
             if project_number_var.get():
                 if self.db.check_project_exists(project_number_var.get()):
@@ -1228,7 +5819,7 @@ class ProjectOrganizer:
         tk.Button(project_window, text="🚀 إنشاء المشروع",
                  command=lambda: self.create_new_project_smart_v2(
                      client_choice_var.get(), client_type_var.get(), client_name_var.get(),
-                     existing_client_var.get(), project_name_var.get(), project_number_var.get(),
+                     client_choices.get(existing_client_var.get()), project_name_var.get(), project_number_var.get(),
                      description_var.get(), project_window),
                  font=("Arial", 14), bg='#4CAF50', fg='white',
                  width=25, height=2).pack(pady=20)
@@ -1245,8 +5836,7 @@ class ProjectOrganizer:
             return
 
         # الحصول على الهيكل النشط
-        structures = self.db.get_structures()
-        current_structure = next((s for s in structures if s[0] == self.current_structure_id), None)
+        current_structure = self.get_active_structure()
 
         if not current_structure:
             messagebox.showerror("خطأ", "لم يتم العثور على الهيكل النشط")
@@ -1269,7 +5859,8 @@ class ProjectOrganizer:
         else:
             # إنشاء مجلد العميل
             client_folder = os.path.join(client_path, client_name.replace(" ", "_"))
-            os.makedirs(client_folder, exist_ok=True)
+            with perf_monitor.timed('fs.makedirs_client'):
+                os.makedirs(client_folder, exist_ok=True)
 
             # إضافة العميل لقاعدة البيانات
             client_id = self.db.add_client(client_name, client_type, client_folder, self.current_structure_id)
@@ -1291,13 +5882,14 @@ class ProjectOrganizer:
         ]
 
         try:
-            # إنشاء مجلد المشروع
-            os.makedirs(project_folder, exist_ok=True)
+            with perf_monitor.timed('fs.makedirs_project'):
+                # إنشاء مجلد المشروع
+                os.makedirs(project_folder, exist_ok=True)
 
-            # إنشاء مجلدات المشروع الفرعية
-            for subfolder in project_structure:
-                subfolder_path = os.path.join(project_folder, subfolder)
-                os.makedirs(subfolder_path, exist_ok=True)
+                # إنشاء مجلدات المشروع الفرعية
+                for subfolder in project_structure:
+                    subfolder_path = os.path.join(project_folder, subfolder)
+                    os.makedirs(subfolder_path, exist_ok=True)
 
             # إنشاء ملف README للمشروع
             readme_content = f"""# {project_name}
@@ -1320,8 +5912,9 @@ class ProjectOrganizer:
 """
 
             readme_path = os.path.join(project_folder, "README.md")
-            with open(readme_path, 'w', encoding='utf-8') as f:
-                f.write(readme_content)
+            with perf_monitor.timed('fs.write_readme'):
+                with open(readme_path, 'w', encoding='utf-8') as f:
+                    f.write(readme_content)
 
             # إضافة المشروع لقاعدة البيانات
             project_id = self.db.add_project(project_name, project_number, client_id, project_folder, description)
@@ -1336,9 +5929,9 @@ class ProjectOrganizer:
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء إنشاء المشروع:\n{str(e)}")
 
-    def create_new_project_smart_v2(self, client_choice, client_type, client_name, existing_client,
+    def create_new_project_smart_v2(self, client_choice, client_type, client_name, existing_client_id,
                                    project_name, project_number, description, window):
-        """إنشاء مشروع جديد مع دعم العميل الجديد أو الموجود"""
+        """إنشاء مشروع جديد مع دعم العميل الجديد أو الموجود (existing_client_id معرف العميل المختار)"""
         if not all([project_name, project_number]):
             messagebox.showerror("خطأ", "يرجى ملء اسم المشروع ورقم المشروع")
             return
@@ -1349,8 +5942,7 @@ class ProjectOrganizer:
             return
 
         # الحصول على الهيكل النشط
-        structures = self.db.get_structures()
-        current_structure = next((s for s in structures if s[0] == self.current_structure_id), None)
+        current_structure = self.get_active_structure()
 
         if not current_structure:
             messagebox.showerror("خطأ", "لم يتم العثور على الهيكل النشط")
@@ -1361,24 +5953,21 @@ class ProjectOrganizer:
         try:
             if client_choice == "موجود":
                 # استخدام عميل موجود
-                if not existing_client:
+                if not existing_client_id:
                     messagebox.showerror("خطأ", "يرجى اختيار عميل من القائمة")
                     return
 
-                # استخراج اسم العميل من النص المختار
-                actual_client_name = existing_client.split(" (")[0]
-
-                # البحث عن العميل في قاعدة البيانات
-                clients = self.db.get_clients(self.current_structure_id)
-                selected_client = next((c for c in clients if c[1] == actual_client_name), None)
+                # من قاعدة البيانات وليس من الذاكرة الدافئة: العميل قد يكون أضيف من جهاز آخر
+                selected_client = self.db.get_client(existing_client_id)
 
                 if not selected_client:
                     messagebox.showerror("خطأ", "لم يتم العثور على العميل المختار")
                     return
 
-                client_id = selected_client[0]
-                client_folder = selected_client[3]  # مسار مجلد العميل
-                actual_client_type = selected_client[2]
+                client_id = selected_client.id
+                client_folder = selected_client.folder_path
+                actual_client_name = selected_client.name
+                actual_client_type = selected_client.type
 
             else:
                 # إنشاء عميل جديد
@@ -1386,25 +5975,37 @@ class ProjectOrganizer:
                     messagebox.showerror("خطأ", "يرجى ملء نوع العميل واسم العميل")
                     return
 
-                # تحديد المسار حسب نوع العميل
-                if client_type in ["جهة رسمية", "عميل حر", "خدمات طلابية"]:
-                    client_path = os.path.join(base_path, "10_Work_&_Study_العمل_والدراسة", "11_Clients_العملاء")
-                elif client_type == "مشروع جامعي":
-                    client_path = os.path.join(base_path, "10_Work_&_Study_العمل_والدراسة", "12_University_الجامعة")
+                # عميل بنفس الاسم الموحد (المسافات وحالة الأحرف وأشكال الحروف لا تهم)
+                existing = self.db.check_client_exists(client_name, self.current_structure_id)
+                # الصف من قاعدة البيانات: العميل قد لا يكون في الذاكرة الدافئة إذا أضيف من جهاز آخر
+                match = self.db.get_client(existing[0]) if existing else None
+                if match and messagebox.askyesno(
+                        "عميل موجود",
+                        f"العميل '{match.name}' موجود مسبقاً في هذا الهيكل.\n"
+                        f"هل تريد إضافة المشروع إليه بدلاً من إنشاء عميل جديد؟"):
+                    client_id, client_folder = match.id, match.folder_path
+                    actual_client_name, actual_client_type = match.name, match.type
+                else:
+                    # تحديد المسار حسب نوع العميل
+                    if client_type in ["جهة رسمية", "عميل حر", "خدمات طلابية"]:
+                        client_path = os.path.join(base_path, "10_Work_&_Study_العمل_والدراسة", "11_Clients_العملاء")
+                    elif client_type == "مشروع جامعي":
+                        client_path = os.path.join(base_path, "10_Work_&_Study_العمل_والدراسة", "12_University_الجامعة")
 
-                # إنشاء مجلد العميل
-                client_folder = os.path.join(client_path, client_name.replace(" ", "_"))
-                os.makedirs(client_folder, exist_ok=True)
+                    # إنشاء مجلد العميل
+                    client_folder = os.path.join(client_path, client_name.replace(" ", "_"))
+                    with perf_monitor.timed('fs.makedirs_client'):
+                        os.makedirs(client_folder, exist_ok=True)
 
-                # إضافة العميل لقاعدة البيانات
-                client_id = self.db.add_client(client_name, client_type, client_folder, self.current_structure_id)
+                    # إضافة العميل لقاعدة البيانات
+                    client_id = self.db.add_client(client_name, client_type, client_folder, self.current_structure_id)
 
-                if not client_id:
-                    messagebox.showerror("خطأ", "فشل في إضافة العميل لقاعدة البيانات")
-                    return
+                    if not client_id:
+                        messagebox.showerror("خطأ", "فشل في إضافة العميل لقاعدة البيانات")
+                        return
 
-                actual_client_name = client_name
-                actual_client_type = client_type
+                    actual_client_name = client_name
+                    actual_client_type = client_type
 
             # إنشاء مجلد المشروع
             project_folder_name = f"{project_number}_{project_name.replace(' ', '_')}"
@@ -1418,13 +6019,14 @@ class ProjectOrganizer:
                 "04_Exports_&_Deliverables"
             ]
 
-            # إنشاء مجلد المشروع
-            os.makedirs(project_folder, exist_ok=True)
+            with perf_monitor.timed('fs.makedirs_project'):
+                # إنشاء مجلد المشروع
+                os.makedirs(project_folder, exist_ok=True)
 
-            # إنشاء مجلدات المشروع الفرعية
-            for subfolder in project_structure:
-                subfolder_path = os.path.join(project_folder, subfolder)
-                os.makedirs(subfolder_path, exist_ok=True)
+                # إنشاء مجلدات المشروع الفرعية
+                for subfolder in project_structure:
+                    subfolder_path = os.path.join(project_folder, subfolder)
+                    os.makedirs(subfolder_path, exist_ok=True)
 
             # إنشاء ملف README للمشروع
             readme_content = f"""# {project_name}
@@ -1447,8 +6049,9 @@ class ProjectOrganizer:
 """
 
             readme_path = os.path.join(project_folder, "README.md")
-            with open(readme_path, 'w', encoding='utf-8') as f:
-                f.write(readme_content)
+            with perf_monitor.timed('fs.write_readme'):
+                with open(readme_path, 'w', encoding='utf-8') as f:
+                    f.write(readme_content)
 
             # إضافة المشروع لقاعدة البيانات
             project_id = self.db.add_project(project_name, project_number, client_id, project_folder, description)
@@ -1473,6 +6076,9 @@ class ProjectOrganizer:
 
     def manage_projects_window(self):
         """نافذة إدارة العملاء والمشاريع"""
+        self.window_manager.show('manage_projects', self._build_manage_projects_window)
+
+    def _build_manage_projects_window(self):
         manage_window = tk.Toplevel(self.root)
         manage_window.title("👥 إدارة العملاء والمشاريع")
         manage_window.geometry("1000x700")
@@ -1491,43 +6097,303 @@ class ProjectOrganizer:
         notebook.add(clients_frame, text="العملاء")
 
         # قائمة العملاء
-        clients_columns = ('ID', 'الاسم', 'النوع', 'تاريخ الإنشاء')
+        clients_columns = ('ID', 'الاسم', 'النوع', 'تاريخ الإنشاء', 'الحجم')
         clients_tree = ttk.Treeview(clients_frame, columns=clients_columns, show='headings', height=15)
 
         for col in clients_columns:
-            clients_tree.heading(col, text=col)
+            clients_tree.heading(col, text=col, command=lambda c=col: self.sort_treeview(clients_tree, c))
             clients_tree.column(col, width=150)
 
-        clients = self.db.get_clients()
-        for client in clients:
-            clients_tree.insert('', 'end', values=(
-                client[0], client[1], client[2], client[5][:10]
-            ))
-
         clients_tree.pack(fill='both', expand=True, padx=10, pady=10)
 
+        tk.Button(clients_frame, text="🔗 دمج العملاء المكررين",
+                 command=self.show_duplicate_clients_window,
+                 font=("Arial", 11), bg='#2196F3', fg='white').pack(pady=(0, 10))
+
         # تبويب المشاريع
         projects_frame = ttk.Frame(notebook)
         notebook.add(projects_frame, text="المشاريع")
 
         # قائمة المشاريع
-        projects_columns = ('ID', 'اسم المشروع', 'رقم المشروع', 'العميل', 'الحالة', 'تاريخ الإنشاء')
+        projects_columns = ('ID', 'اسم المشروع', 'رقم المشروع', 'العميل', 'الحالة', 'تاريخ الإنشاء', 'الحجم')
         projects_tree = ttk.Treeview(projects_frame, columns=projects_columns, show='headings', height=15)
 
         for col in projects_columns:
-            projects_tree.heading(col, text=col)
+            projects_tree.heading(col, text=col, command=lambda c=col: self.sort_treeview(projects_tree, c))
             projects_tree.column(col, width=120)
 
-        projects = self.db.get_projects()
-        for project in projects:
-            projects_tree.insert('', 'end', values=(
-                project[0], project[1], project[2], project[9], project[5], project[6][:10]
-            ))
+        # تصفية حسب الحالة (النشطة افتراضياً) ونقل المشاريع المحددة إلى حالة أخرى دفعة واحدة
+        status_bar = tk.Frame(projects_frame)
+        status_bar.pack(fill='x', padx=10, pady=(10, 0), before=projects_tree)
+
+        tk.Label(status_bar, text="الحالة:", font=("Arial", 10)).pack(side='right')
+        all_statuses = "الكل"
+        filter_var = tk.StringVar(value=PROJECT_STATUS_ACTIVE)
+        filter_menu = ttk.Combobox(status_bar, textvariable=filter_var, state='readonly', width=12,
+                                   values=PROJECT_STATUSES + (all_statuses,))
+        filter_menu.pack(side='right', padx=5)
+
+        target_var = tk.StringVar(value=PROJECT_STATUSES[2])
+        tk.Button(status_bar, text="🔁 نقل المحدد إلى:", font=("Arial", 10),
+                 command=lambda: change_status()).pack(side='left')
+        ttk.Combobox(status_bar, textvariable=target_var, state='readonly', width=12,
+                     values=PROJECT_STATUSES).pack(side='left', padx=5)
+
+        tk.Button(projects_frame, text="✔️ فحص تسمية الملفات",
+                 command=self.show_naming_compliance_window,
+                 font=("Arial", 11), bg='#2196F3', fg='white').pack(pady=(0, 10))
+
+        def refresh():
+            for tree in (clients_tree, projects_tree):
+                tree.delete(*tree.get_children())
+
+            for client in self.db.iter_clients():
+                clients_tree.insert('', 'end', iid=f"c{client.id}", values=(
+                    client.id, client.name, client.type, client.created_date[:10], "⏳"
+                ))
+
+            status = filter_var.get()
+            for project in self.db.iter_projects(status=None if status == all_statuses else status):
+                projects_tree.insert('', 'end', iid=f"p{project.id}", values=(
+                    project.id, project.name, project.project_number, project.client_name,
+                    project.status, project.created_date[:10], "⏳"
+                ))
+
+            self.load_disk_usage_async(manage_window, clients_tree, projects_tree)
+
+        def change_status():
+            project_ids = [int(iid[1:]) for iid in projects_tree.selection()]
+            if not project_ids:
+                messagebox.showwarning("تحذير", "يرجى تحديد مشروع واحد أو أكثر", parent=manage_window)
+                return
+
+            status = target_var.get()
+            try:
+                changed = self.db.set_projects_status(project_ids, status)
+            except Exception as e:
+                messagebox.showerror("خطأ", f"فشل تغيير الحالة:\n{e}", parent=manage_window)
+                return
+
+            skipped = len(project_ids) - changed
+            if skipped:
+                messagebox.showinfo("تنبيه", f"تم نقل {changed} مشروع إلى '{status}'.\n"
+                                             f"{skipped} مشروع لا تسمح حالته الحالية بهذا الانتقال.",
+                                    parent=manage_window)
+            refresh()
+            self.refresh_main_interface()
+
+        filter_menu.bind('<<ComboboxSelected>>', lambda e: refresh())
+
+        refresh()
+        return manage_window, refresh
+
+    def show_duplicate_clients_window(self):
+        """اقتراح العملاء المكررين في الهيكل النشط ودمج كل مجموعة في أقدم عميل فيها"""
+        if not self.current_structure_id:
+            messagebox.showwarning("تحذير", "يرجى اختيار هيكل نشط أولاً من إدارة الهياكل")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("🔗 العملاء المكررون")
+        window.geometry("800x550")
+        window.configure(bg='#f0f0f0')
+
+        tk.Label(window, text="كل مجموعة تدمج في العميل ⭐ (الأقدم): تنقل مجلدات مشاريع الباقين إلى مجلده",
+                font=("Arial", 11), bg='#f0f0f0').pack(pady=10)
+
+        columns = ('النوع', 'المسار')
+        tree = ttk.Treeview(window, columns=columns, show='tree headings', height=15)
+        tree.heading('#0', text='العميل')
+        tree.column('#0', width=220)
+        for col in columns:
+            tree.heading(col, text=col)
+        tree.column('النوع', width=120)
+        tree.column('المسار', width=400)
+        tree.pack(fill='both', expand=True, padx=20, pady=10)
+
+        status_label = tk.Label(window, text="", font=("Arial", 10), bg='#f0f0f0', fg='#666')
+        status_label.pack(pady=5)
+
+        groups = {}
+
+        def load():
+            tree.delete(*tree.get_children())
+            groups.clear()
+            matcher = ClientMatcher(self.db.get_clients(self.current_structure_id))
+            for index, group in enumerate(matcher.duplicate_groups()):
+                iid = f"g{index}"
+                groups[iid] = group
+                tree.insert('', 'end', iid=iid, text=f"⭐ {group[0].name}",
+                            values=(group[0].type, group[0].folder_path), open=True)
+                for client in group[1:]:
+                    tree.insert(iid, 'end', iid=f"{iid}_{client.id}", text=client.name,
+                                values=(client.type, client.folder_path))
+            status_label.config(text=f"{len(groups)} مجموعة مكررة" if groups else "✅ لا يوجد عملاء مكررون")
+
+        def exclude_selected():
+            # استبعاد عميل اقترح خطأً من مجموعته
+            for iid in tree.selection():
+                parent = tree.parent(iid)
+                if parent and tree.exists(iid):
+                    client_id = int(iid.rsplit('_', 1)[1])
+                    groups[parent] = [c for c in groups[parent] if c.id != client_id]
+                    tree.delete(iid)
+                    if len(groups[parent]) < 2:
+                        del groups[parent]
+                        tree.delete(parent)
+
+        def merge(selected_only):
+            keys = {tree.parent(iid) or iid for iid in tree.selection()} if selected_only else set(groups)
+            chosen = [groups[key] for key in keys if key in groups]
+            if not chosen:
+                messagebox.showwarning("تحذير", "يرجى تحديد مجموعة", parent=window)
+                return
+            if not messagebox.askyesno("تأكيد الدمج", f"دمج {len(chosen)} مجموعة؟ سيتم نقل مجلدات المشاريع.",
+                                       parent=window):
+                return
+
+            status_label.config(text="⏳ جاري الدمج...")
+
+            def worker():
+                moved, errors = 0, []
+                for group in chosen:
+                    try:
+                        moved += self.db.merge_clients(group[0].id, [c.id for c in group[1:]])['projects']
+                    except Exception as e:
+                        errors.append(f"{group[0].name}: {e}")
+
+                def done():
+                    if errors:
+                        messagebox.showerror("خطأ", "فشل دمج بعض المجموعات:\n" + "\n".join(errors), parent=window)
+                    if window.winfo_exists():
+                        load()
+                        status_label.config(text=f"✅ تم نقل {moved} مشروع")
+                    self.refresh_main_interface()
+
+                self.root.after(0, done)
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        buttons = tk.Frame(window, bg='#f0f0f0')
+        buttons.pack(pady=10)
+        tk.Button(buttons, text="🔗 دمج المحدد", command=lambda: merge(True),
+                 font=("Arial", 11), bg='#4CAF50', fg='white').pack(side='left', padx=5)
+        tk.Button(buttons, text="🔗 دمج الكل", command=lambda: merge(False),
+                 font=("Arial", 11), bg='#FF9800', fg='white').pack(side='left', padx=5)
+        tk.Button(buttons, text="➖ استبعاد من المجموعة", command=exclude_selected,
+                 font=("Arial", 11)).pack(side='left', padx=5)
+
+        load()
+
+    def show_naming_compliance_window(self):
+        """تقرير الملفات المخالفة لقواعد التسمية في مشاريع الهيكل النشط (أو كل المشاريع)"""
+        local_db = self.local_db(self.current_structure_id)
+        if not local_db:
+            messagebox.showerror("خطأ", "الفحص متاح فقط مع قاعدة البيانات المحلية (ومع هيكل نشط عند استخدام الـ shards)")
+            return
+
+        report_window = tk.Toplevel(self.root)
+        report_window.title("✔️ فحص تسمية الملفات")
+        report_window.geometry("800x600")
+        report_window.configure(bg='#f0f0f0')
+
+        report_text = tk.Text(report_window, wrap='none', font=("Courier New", 10))
+        report_text.pack(pady=20, padx=20, fill='both', expand=True)
+        report_text.insert('1.0', "⏳ جاري فحص الملفات...")
 
-        projects_tree.pack(fill='both', expand=True, padx=10, pady=10)
+        parser = FilenameParser()
+
+        def show_report(text):
+            if report_window.winfo_exists():
+                report_text.delete('1.0', 'end')
+                report_text.insert('1.0', text)
+
+        def worker():
+            try:
+                text = parser.format_report(parser.validate_projects(local_db, self.current_structure_id))
+            except Exception as e:
+                text = f"❌ خطأ أثناء الفحص: {e}"
+            self.root.after(0, lambda: show_report(text))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def load_disk_usage_async(self, window, clients_tree, projects_tree):
+        """حساب أحجام المجلدات في الخلفية وتحديث أعمدة الحجم عند الانتهاء"""
+        if isinstance(self.db, ShardedDatabaseManager):
+            databases = self.db.shards(include_catalog=True)
+        elif isinstance(self.db, DatabaseManager):
+            databases = [self.db]
+        else:
+            databases = None
+
+        def mark_pending(text):
+            """استبدال "⏳" في الخلايا التي لم يصلها حجم"""
+            for tree in (clients_tree, projects_tree):
+                for iid in tree.get_children(''):
+                    if tree.set(iid, 'الحجم') == "⏳":
+                        tree.set(iid, 'الحجم', text)
+
+        def apply_sizes(project_sizes, client_sizes):
+            if not window.winfo_exists():
+                return
+            for tree, prefix, sizes in ((clients_tree, 'c', client_sizes), (projects_tree, 'p', project_sizes)):
+                tree.size_bytes = {}
+                for item_id, size in sizes.items():
+                    iid = f"{prefix}{item_id}"
+                    if tree.exists(iid):
+                        tree.size_bytes[iid] = size
+                        tree.set(iid, 'الحجم', format_size(size))
+            mark_pending("—")
+
+        def report_error():
+            if window.winfo_exists():
+                mark_pending("⚠ خطأ")
+
+        # الحجم يحسب من ملفات قاعدة البيانات المحلية فقط (غير متاح في وضع الخادم)
+        if databases is None:
+            mark_pending("—")
+            return
+
+        def worker():
+            project_sizes, client_sizes = {}, {}
+            try:
+                # المعرفات فريدة بين الـ shards لذلك يمكن دمج النتائج مباشرة
+                for database in databases:
+                    projects, clients = DiskUsageEngine(database).project_and_client_sizes()
+                    project_sizes.update(projects)
+                    client_sizes.update(clients)
+            except Exception:
+                logger.exception("فشل حساب أحجام المجلدات")
+                self.root.after(0, report_error)
+                return
+            self.root.after(0, lambda: apply_sizes(project_sizes, client_sizes))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def sort_treeview(self, tree, column):
+        """ترتيب الجدول حسب العمود (الحجم يرتب بالبايت) مع عكس الترتيب عند النقر مجدداً"""
+        descending = getattr(tree, 'sort_state', None) == (column, False)
+        tree.sort_state = (column, descending)
+
+        if column == 'الحجم':
+            sizes = getattr(tree, 'size_bytes', {})
+            key = lambda iid: sizes.get(iid, -1)
+        else:
+            def key(iid):
+                value = tree.set(iid, column)
+                try:
+                    return (0, float(value), '')
+                except ValueError:
+                    return (1, 0, value)
+
+        for index, iid in enumerate(sorted(tree.get_children(''), key=key, reverse=descending)):
+            tree.move(iid, '', index)
 
     def create_filename_generator_window(self):
         """نافذة مولد أسماء الملفات الذكي والمتطور"""
+        self.window_manager.show('filename_generator', self._build_filename_generator_window)
+
+    def _build_filename_generator_window(self):
         filename_window = tk.Toplevel(self.root)
         filename_window.title("🔖 مولّد أسماء الملفات الاحترافي")
         filename_window.geometry("900x800")
@@ -1556,13 +6422,39 @@ class ProjectOrganizer:
 
         project_var = tk.StringVar()
         project_menu = ttk.Combobox(project_frame, textvariable=project_var,
-                                   font=self.fonts['text'], width=70, state='readonly')
+                                   font=self.fonts['text'], width=70)
+
+        # المشاريع التي ظهرت في القائمة (لتعبئة بيانات المشروع المختار)
+        projects_by_number = {}
+
+        def search_projects(text):
+            # القيمة المختارة تعامل كنص فارغ: أحدث المشاريع النشطة (من الذاكرة الدافئة إن وجدت)،
+            # وإلا أول المشاريع النشطة التي يبدأ رقمها أو اسمها بالنص المكتوب
+            if text == "بدون مشروع" or (" - " in text and text.split(" - ")[0] in projects_by_number):
+                text = ""
+            cached = self.session_cache.get(self.current_structure_id)
+            if not text and cached:
+                projects = cached[2][:TYPEAHEAD_LIMIT]
+            else:
+                projects = self.db.search_projects(text, TYPEAHEAD_LIMIT, self.current_structure_id,
+                                                   PROJECT_STATUS_ACTIVE)
+            projects_by_number.update((p.project_number, p) for p in projects)
+            return [f"{p.project_number} - {p.name} ({p.client_name})" for p in projects]
+
+        search_as_typed = self.attach_typeahead(project_menu, search_projects, fixed_values=["بدون مشروع"])
+
+        def load_projects():
+            # يعاد عند كل فتح للنافذة، ويبقى المشروع المختار إذا كان ما زال نشطاً
+            selected = project_var.get().split(" - ")[0]
+            projects_by_number.clear()
+            project = self.db.get_project_by_number(selected) if selected.startswith("P_") else None
+            if project and project.status == PROJECT_STATUS_ACTIVE:
+                projects_by_number[project.project_number] = project
+            else:
+                project_menu.set("بدون مشروع")
+            search_as_typed()
 
-        # تحميل المشاريع
-        projects = self.db.get_projects()
-        project_values = ["بدون مشروع"] + [f"{p[2]} - {p[1]} ({p[9]})" for p in projects]
-        project_menu['values'] = project_values
-        project_menu.set("بدون مشروع")
+        load_projects()
         project_menu.pack(pady=10, padx=20)
 
         # إطار المدخلات الرئيسية
@@ -1593,8 +6485,7 @@ class ProjectOrganizer:
         type_var = tk.StringVar()
         type_menu = ttk.Combobox(grid_frame, textvariable=type_var, font=self.fonts['text'],
                                 width=18, state='readonly')
-        type_menu['values'] = ("Report", "Invoice", "Proposal", "HW", "Lecture", "Research",
-                              "Design", "Tutorial", "Presentation", "Contract", "Analysis")
+        type_menu['values'] = FILE_TYPES
         type_menu.grid(row=1, column=1, sticky='ew', pady=8, padx=(10, 0))
 
         # العميل - المشروع
@@ -1621,7 +6512,7 @@ class ProjectOrganizer:
 
         version_var = tk.StringVar(value="v01")
         version_menu = ttk.Combobox(grid_frame, textvariable=version_var, font=self.fonts['text'],
-                                   width=18, values=("v01", "v02", "v03", "v04", "v05", "vFINAL", "vDRAFT"))
+                                   width=18, values=FILE_VERSIONS)
         version_menu.grid(row=4, column=1, sticky='ew', pady=8, padx=(10, 0))
 
         # الامتداد
@@ -1631,8 +6522,7 @@ class ProjectOrganizer:
         ext_var = tk.StringVar(value="pdf")
         ext_menu = ttk.Combobox(grid_frame, textvariable=ext_var, font=self.fonts['text'],
                                width=18, state='readonly')
-        ext_menu['values'] = ("pdf", "docx", "xlsx", "pptx", "zip", "ai", "psd", "fig",
-                             "mp4", "png", "jpg", "jpeg", "svg", "txt", "md")
+        ext_menu['values'] = FILE_EXTENSIONS
         ext_menu.grid(row=5, column=1, sticky='ew', pady=8, padx=(10, 0))
 
         # تكوين الشبكة
@@ -1698,6 +6588,7 @@ class ProjectOrganizer:
                 bg=self.colors['bg_secondary'], fg=self.colors['text_secondary']).pack(pady=5)
 
         # دالة التحديث التلقائي
+        @perf_monitor.track('tk.update_filename')
         def update_filename(*args):
             self.generate_filename_smart(date_var, type_var, client_var, desc_var,
                                        version_var, ext_var, result_label)
@@ -1712,9 +6603,9 @@ class ProjectOrganizer:
             if selected != "بدون مشروع":
                 # استخراج رقم المشروع واسم العميل
                 project_number = selected.split(" - ")[0]
-                project_data = next((p for p in projects if p[2] == project_number), None)
+                project_data = projects_by_number.get(project_number)
                 if project_data:
-                    client_var.set(project_data[9].replace(" ", ""))  # اسم العميل
+                    client_var.set(project_data.client_name.replace(" ", ""))  # اسم العميل
 
         project_var.trace_add('write', fill_from_project)
 
@@ -1750,7 +6641,7 @@ class ProjectOrganizer:
 
         # زر إغلاق
         close_btn = tk.Button(buttons_frame, text="❌ إغلاق",
-                             command=filename_window.destroy,
+                             command=filename_window.withdraw,
                              font=self.fonts['button'], bg=self.colors['danger'], fg='white',
                              width=15, height=2, relief='raised', bd=3)
         close_btn.pack(side='left', padx=10)
@@ -1758,47 +6649,19 @@ class ProjectOrganizer:
         # توليد اسم أولي
         update_filename()
 
+        return filename_window, load_projects
+
     def generate_filename_smart(self, date_var, type_var, client_var, desc_var, version_var, ext_var, result_label):
         """توليد اسم الملف الذكي حسب القواعد الاحترافية"""
         try:
-            # الحصول على القيم
-            date = date_var.get() or datetime.today().strftime('%Y-%m-%d')
-            file_type = type_var.get()
-            client_project = client_var.get().strip().replace(" ", "")
-            brief_desc = desc_var.get().strip().replace(" ", "-")
-            version = version_var.get()
-            extension = ext_var.get()
-
-            # التحقق من الحقول المطلوبة
-            if not file_type:
-                result_label.config(text="⚠️ يرجى اختيار نوع الملف", fg="red")
-                return
-
-            if not client_project:
-                result_label.config(text="⚠️ يرجى إدخال اسم العميل/المشروع", fg="red")
-                return
-
-            if not brief_desc:
-                result_label.config(text="⚠️ يرجى إدخال وصف موجز", fg="red")
-                return
-
-            # تطبيق قواعد التسمية الخاصة
-            if file_type == "Lecture":
-                # للمحاضرات: Lec[رقم]_[المادة]_[الموضوع].[امتداد]
-                if brief_desc.startswith("Lec") or brief_desc.startswith("lec"):
-                    filename = f"{brief_desc}_{client_project}.{extension}"
-                else:
-                    filename = f"Lec01_{client_project}_{brief_desc}.{extension}"
-            elif file_type == "Tutorial":
-                # للشروحات: Tutorial_[الموضوع]_[التفاصيل]_[الإصدار].[امتداد]
-                filename = f"Tutorial_{client_project}_{brief_desc}_{version}.{extension}"
-            else:
-                # القاعدة العامة: YYYY-MM-DD_[النوع]_[العميل-المشروع]_[وصف_موجز]_vXX.[الامتداد]
-                filename = f"{date}_{file_type}_{client_project}_{brief_desc}_{version}.{extension}"
+            filename = build_filename(date_var.get(), type_var.get(), client_var.get(),
+                                      desc_var.get(), version_var.get(), ext_var.get())
 
             # عرض النتيجة
             result_label.config(text=filename, fg=self.colors['info'])
 
+        except ValueError as e:
+            result_label.config(text=f"⚠️ {e}", fg="red")
         except Exception as e:
             result_label.config(text=f"❌ خطأ: {str(e)}", fg="red")
 
@@ -1929,20 +6792,29 @@ class ProjectOrganizer:
         selected_project = project_var.get()
         if selected_project != "بدون مشروع":
             project_number = selected_project.split(" - ")[0]
-            projects = self.db.get_projects()
-            project_data = next((p for p in projects if p[2] == project_number), None)
+            project_data = self.db.get_project_by_number(project_number)
             if project_data:
-                project_id = project_data[0]
+                project_id = project_data.id
 
-        # حفظ في قاعدة البيانات
+        # يضاف لدفعة الحفظ ويكتبه خيط الكتابة خلال ثوانٍ، وأي فشل يصل عبر _report_recorder_error
         try:
-            self.db.add_generated_file(filename, project_id, type_var.get())
-            messagebox.showinfo("تم الحفظ", f"تم حفظ اسم الملف في قاعدة البيانات:\n\n{filename}")
+            exists = self.db.generated_file_exists(filename, project_id)
         except Exception as e:
-            messagebox.showerror("خطأ", f"فشل في حفظ اسم الملف:\n{str(e)}")
+            messagebox.showerror("خطأ", f"تعذر التحقق من اسم الملف في قاعدة البيانات:\n{str(e)}")
+            return
+
+        if exists:
+            messagebox.showinfo("محفوظ مسبقاً", f"اسم الملف محفوظ من قبل لهذا المشروع:\n\n{filename}")
+        elif not self.file_recorder.record(filename, project_id, type_var.get()):
+            messagebox.showinfo("بانتظار الحفظ", f"اسم الملف في قائمة الحفظ من قبل لهذا المشروع:\n\n{filename}")
+        else:
+            messagebox.showinfo("قيد الحفظ", f"أضيف اسم الملف إلى قائمة الحفظ وسيكتب في قاعدة البيانات خلال ثوانٍ:\n\n{filename}")
 
     def show_filename_examples_window(self):
         """نافذة عرض أمثلة التسمية"""
+        self.window_manager.show('filename_examples', self._build_filename_examples_window)
+
+    def _build_filename_examples_window(self):
         examples_window = tk.Toplevel(self.root)
         examples_window.title("💡 أمثلة على قواعد التسمية")
         examples_window.geometry("900x600")
@@ -2044,15 +6916,123 @@ YYYY-MM-DD_[النوع]_[العميل-المشروع]_[وصف_موجز]_vXX.[ا
 
         # زر إغلاق
         tk.Button(examples_window, text="❌ إغلاق",
-                 command=examples_window.destroy,
+                 command=examples_window.withdraw,
                  font=self.fonts['button'], bg=self.colors['danger'], fg='white',
                  width=15, height=2).pack(pady=20)
 
+        # محتوى ثابت لا يحتاج تحديث
+        return examples_window, None
+
+    def show_backups_window(self):
+        """نافذة اللقطات الاحتياطية (إنشاء واستعادة)"""
+        if not self.local_databases():
+            messagebox.showinfo("النسخ الاحتياطي", "النسخ الاحتياطي في وضع الخادم يتم على جهاز الخادم")
+            return
+        self.window_manager.show('backups', self._build_backups_window)
+
+    def _build_backups_window(self):
+        backups_window = tk.Toplevel(self.root)
+        backups_window.title("💾 النسخ الاحتياطي")
+        backups_window.geometry("800x500")
+        backups_window.configure(bg='#f0f0f0')
+
+        tk.Label(backups_window, text="💾 النسخ الاحتياطي",
+                font=("Arial", 16, "bold"), bg='#f0f0f0').pack(pady=20)
+
+        columns = ('القاعدة', 'التاريخ', 'الحجم')
+        tree = ttk.Treeview(backups_window, columns=columns, show='headings', height=12)
+        for col in columns:
+            tree.heading(col, text=col)
+        tree.column('القاعدة', width=200)
+        tree.column('التاريخ', width=200)
+        tree.column('الحجم', width=120)
+        tree.pack(pady=10, padx=20, fill='both', expand=True)
+
+        status_label = tk.Label(backups_window, text="", font=("Arial", 10), bg='#f0f0f0', fg='#666')
+        status_label.pack(pady=5)
+
+        # مسار اللقطة لكل صف مع محركها
+        rows = {}
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            rows.clear()
+            for engine in self.backup_engines():
+                for path, created, size in engine.snapshots():
+                    item_id = tree.insert('', 'end', values=(
+                        engine.name, created.strftime('%Y-%m-%d %H:%M:%S'), format_size(size)))
+                    rows[item_id] = (engine, path)
+
+        def report(text):
+            self.root.after(0, lambda: status_label.config(text=text))
+
+        def run_in_background(job, done_message):
+            def worker():
+                try:
+                    result = job()
+                except Exception as e:
+                    error = str(e)
+                    self.root.after(0, lambda: (status_label.config(text=""),
+                                                messagebox.showerror("خطأ", error, parent=backups_window)))
+                    return
+                self.root.after(0, lambda: (status_label.config(text=done_message(result)), refresh()))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        def create_now():
+            engines = self.backup_engines()
+
+            def job():
+                for index, engine in enumerate(engines, 1):
+                    engine.create_snapshot(progress=lambda done, total: report(
+                        f"⏳ {engine.name} ({index}/{len(engines)}): {done:,} من {total:,} صفحة"))
+                return len(engines)
+
+            run_in_background(job, lambda count: f"✅ تم إنشاء {count} لقطة")
+
+        def restore_selected():
+            selection = tree.selection()
+            if not selection:
+                messagebox.showwarning("تحذير", "يرجى اختيار لقطة من القائمة", parent=backups_window)
+                return
+            engine, path = rows[selection[0]]
+            if not messagebox.askyesno("تأكيد الاستعادة",
+                                       f"سيتم استبدال بيانات '{engine.name}' الحالية بهذه اللقطة.\n"
+                                       "تحفظ الحالة الحالية كلقطة جديدة قبل الاستعادة. هل تريد المتابعة؟",
+                                       parent=backups_window):
+                return
+
+            def done_message(_):
+                self.restore_session()
+                self.refresh_main_interface()
+                return f"✅ تمت الاستعادة من {os.path.basename(path)}"
+
+            report("⏳ جاري الاستعادة...")
+            run_in_background(lambda: engine.restore(path), done_message)
+
+        buttons_frame = tk.Frame(backups_window, bg='#f0f0f0')
+        buttons_frame.pack(pady=10)
+
+        tk.Button(buttons_frame, text="📸 لقطة الآن", command=create_now,
+                  font=("Arial", 12), bg='#4CAF50', fg='white').pack(side='left', padx=5)
+
+        tk.Button(buttons_frame, text="♻️ استعادة", command=restore_selected,
+                  font=("Arial", 12), bg='#FF9800', fg='white').pack(side='left', padx=5)
+
+        tk.Button(buttons_frame, text="إغلاق", command=backups_window.withdraw,
+                  font=("Arial", 12), bg='#f44336', fg='white').pack(side='left', padx=5)
+
+        refresh()
+        return backups_window, refresh
+
     def show_reports_window(self):
         """نافذة التقارير والإحصائيات"""
+        self.window_manager.show('reports', self._build_reports_window)
+
+    def _build_reports_window(self):
         reports_window = tk.Toplevel(self.root)
         reports_window.title("📈 تقارير وإحصائيات")
-        reports_window.geometry("800x600")
+        reports_window.geometry("900x800")
         reports_window.configure(bg='#f0f0f0')
 
         # العنوان
@@ -2063,29 +7043,243 @@ YYYY-MM-DD_[النوع]_[العميل-المشروع]_[وصف_موجز]_vXX.[ا
         stats_frame = tk.Frame(reports_window, bg='#f0f0f0')
         stats_frame.pack(pady=20, padx=40, fill='x')
 
-        structures = self.db.get_structures()
-        clients = self.db.get_clients()
-        projects = self.db.get_projects()
+        report_engine = self.report_engine()
 
-        stats_text = f"""📊 إحصائيات عامة:
+        stats_label = tk.Label(stats_frame, font=("Arial", 12), bg='#f0f0f0', justify='left')
+        stats_label.pack(anchor='w')
 
-🏗️ عدد الهياكل: {len(structures)}
-👥 عدد العملاء: {len(clients)}
-📁 عدد المشاريع: {len(projects)}
-📈 متوسط المشاريع لكل عميل: {len(projects)/len(clients) if clients else 0:.1f}
-        """
+        # تقرير الاتجاهات من جداول التجميع
+        trend_text = None
+        if report_engine:
+            trend_text = tk.Text(reports_window, height=14, font=("Courier New", 10), wrap='none')
+            trend_text.pack(pady=5, padx=40, fill='both', expand=True)
 
-        tk.Label(stats_frame, text=stats_text,
-                font=("Arial", 12), bg='#f0f0f0', justify='left').pack(anchor='w')
+        self.create_export_frame(reports_window)
 
         # زر إغلاق
         tk.Button(reports_window, text="إغلاق",
-                 command=reports_window.destroy,
+                 command=reports_window.withdraw,
                  font=("Arial", 12), bg='#f44336', fg='white').pack(pady=20)
 
+        def refresh():
+            totals = self.get_totals()
+
+            stats_label.config(text=f"""📊 إحصائيات عامة:
+
+🏗️ عدد الهياكل: {totals['structures']}
+👥 عدد العملاء: {totals['clients']}
+📁 عدد المشاريع: {totals['projects']}
+📈 متوسط المشاريع لكل عميل: {totals['projects']/totals['clients'] if totals['clients'] else 0:.1f}
+        """)
+
+            if trend_text:
+                trend_text.config(state='normal')
+                trend_text.delete('1.0', 'end')
+                trend_text.insert('1.0', report_engine.trend_report())
+                trend_text.config(state='disabled')
+
+        refresh()
+        return reports_window, refresh
+
+    def create_export_frame(self, parent):
+        """إطار تصدير البيانات مع الفلاتر"""
+        export_frame = tk.LabelFrame(parent, text="📤 تصدير البيانات", font=("Arial", 12, "bold"),
+                                     bg='#f0f0f0')
+        export_frame.pack(pady=10, padx=40, fill='x')
+
+        datasets = {"المشاريع": 'projects', "العملاء": 'clients', "الملفات المولدة": 'generated_files'}
+
+        tk.Label(export_frame, text="البيانات:", font=("Arial", 10), bg='#f0f0f0').grid(row=0, column=0, sticky='w', pady=5, padx=5)
+        dataset_var = tk.StringVar(value="المشاريع")
+        ttk.Combobox(export_frame, textvariable=dataset_var, values=list(datasets),
+                     state='readonly', width=18).grid(row=0, column=1, sticky='w', pady=5)
+
+        tk.Label(export_frame, text="نوع العميل:", font=("Arial", 10), bg='#f0f0f0').grid(row=0, column=2, sticky='w', pady=5, padx=5)
+        client_type_var = tk.StringVar()
+        ttk.Combobox(export_frame, textvariable=client_type_var,
+                     values=("", "جهة رسمية", "عميل حر", "خدمات طلابية", "مشروع جامعي"),
+                     state='readonly', width=15).grid(row=0, column=3, sticky='w', pady=5)
+
+        tk.Label(export_frame, text="الحالة:", font=("Arial", 10), bg='#f0f0f0').grid(row=1, column=0, sticky='w', pady=5, padx=5)
+        status_var = tk.StringVar()
+        tk.Entry(export_frame, textvariable=status_var, width=20).grid(row=1, column=1, sticky='w', pady=5)
+
+        structure_only_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(export_frame, text="الهيكل النشط فقط", variable=structure_only_var,
+                       font=("Arial", 10), bg='#f0f0f0').grid(row=1, column=2, columnspan=2, sticky='w', pady=5)
+
+        tk.Label(export_frame, text="من تاريخ:", font=("Arial", 10), bg='#f0f0f0').grid(row=2, column=0, sticky='w', pady=5, padx=5)
+        date_from_var = tk.StringVar()
+        tk.Entry(export_frame, textvariable=date_from_var, width=20).grid(row=2, column=1, sticky='w', pady=5)
+
+        tk.Label(export_frame, text="إلى تاريخ:", font=("Arial", 10), bg='#f0f0f0').grid(row=2, column=2, sticky='w', pady=5, padx=5)
+        date_to_var = tk.StringVar()
+        tk.Entry(export_frame, textvariable=date_to_var, width=15).grid(row=2, column=3, sticky='w', pady=5)
+
+        status_label = tk.Label(export_frame, text="", font=("Arial", 10), bg='#f0f0f0')
+        status_label.grid(row=3, column=0, columnspan=3, sticky='w', pady=5, padx=5)
+
+        def start_export():
+            dataset = datasets[dataset_var.get()]
+            filters = {
+                'client_type': client_type_var.get(),
+                'date_from': date_from_var.get().strip(),
+                'date_to': date_to_var.get().strip(),
+                'structure_id': self.current_structure_id if structure_only_var.get() else None
+            }
+            if dataset != 'clients':
+                filters['status'] = status_var.get().strip()
+
+            path = filedialog.asksaveasfilename(parent=parent, defaultextension='.csv',
+                                                filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"),
+                                                           ("ملف أعمدة مضغوط", "*.pocol")])
+            if not path:
+                return
+
+            exporter = DataExporter(self.db)
+            status_label.config(text="⏳ جاري التصدير...", fg='#666')
+
+            # التصدير في خيط منفصل حتى لا تتجمد الواجهة
+            def worker():
+                try:
+                    count = exporter.export(dataset, path, filters=filters,
+                                            progress=lambda n: self.root.after(
+                                                0, lambda: status_label.config(text=f"⏳ {n:,} صف...")))
+                    message, color = f"✅ تم تصدير {count:,} صف إلى {os.path.basename(path)}", 'green'
+                except Exception as e:
+                    message, color = f"❌ فشل التصدير: {e}", 'red'
+                self.root.after(0, lambda: status_label.config(text=message, fg=color))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        tk.Button(export_frame, text="📤 تصدير", command=start_export,
+                  font=("Arial", 11), bg='#2196F3', fg='white', width=12).grid(row=3, column=3, sticky='e', pady=5, padx=5)
+
+    def show_diagnostics_window(self):
+        """نافذة تشخيص الأداء (مخفية، تفتح بـ Ctrl+Shift+D)"""
+        diag_window = tk.Toplevel(self.root)
+        diag_window.title("⏱️ تشخيص الأداء")
+        diag_window.geometry("900x500")
+        diag_window.configure(bg=self.colors['bg_main'])
+
+        # إطار التحكم
+        controls_frame = tk.Frame(diag_window, bg=self.colors['bg_main'])
+        controls_frame.pack(pady=10, padx=20, fill='x')
+
+        enabled_var = tk.BooleanVar(value=perf_monitor.enabled)
+
+        def toggle_monitor():
+            perf_monitor.enabled = enabled_var.get()
+
+        tk.Checkbutton(controls_frame, text="تفعيل القياس", variable=enabled_var,
+                       command=toggle_monitor, font=self.fonts['text'],
+                       bg=self.colors['bg_main']).pack(side='left')
+
+        # جدول الإحصائيات
+        columns = ('العملية', 'العدد', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'الإجمالي (ms)', 'الصفوف')
+        tree = ttk.Treeview(diag_window, columns=columns, show='headings', height=15)
+
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=100)
+        tree.column('العملية', width=250)
+
+        tree.pack(fill='both', expand=True, padx=20, pady=10)
+
+        def refresh():
+            if not diag_window.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for stat in perf_monitor.snapshot():
+                tree.insert('', 'end', values=(
+                    stat['name'], stat['count'], stat['p50_ms'], stat['p95_ms'],
+                    stat['p99_ms'], stat['total_ms'], stat['rows']
+                ))
+            diag_window.after(1000, refresh)
+
+        def export_stats():
+            path = filedialog.asksaveasfilename(parent=diag_window, defaultextension='.json',
+                                                filetypes=[("JSON", "*.json")])
+            if path:
+                perf_monitor.export(path)
+                messagebox.showinfo("تم", f"تم حفظ إحصائيات الأداء في:\n{path}", parent=diag_window)
+
+        # إطار الأزرار
+        buttons_frame = tk.Frame(diag_window, bg=self.colors['bg_main'])
+        buttons_frame.pack(pady=10)
+
+        tk.Button(buttons_frame, text="🔄 مسح", command=perf_monitor.reset,
+                  font=self.fonts['button'], bg=self.colors['warning'], fg='white',
+                  width=12).pack(side='left', padx=5)
+
+        tk.Button(buttons_frame, text="💾 تصدير", command=export_stats,
+                  font=self.fonts['button'], bg=self.colors['info'], fg='white',
+                  width=12).pack(side='left', padx=5)
+
+        def request_maintenance():
+            self.maintenance.request()
+            maintenance_label.config(text="🧹 ستبدأ الصيانة عند خمول الواجهة")
+
+        tk.Button(buttons_frame, text="🧹 صيانة", command=request_maintenance,
+                  font=self.fonts['button'], bg=self.colors['purple'], fg='white',
+                  width=12).pack(side='left', padx=5)
+
+        # القواعد القديمة تحتاج VACUUM كاملاً مرة واحدة للصيانة التدريجية (يقفل الملف، فلا يتم إلا بطلب)
+        legacy = [db for db in self.local_databases() if DatabaseMaintenance(db).needs_full_vacuum()]
+
+        def full_vacuum():
+            if not messagebox.askyesno("ضغط كامل", f"سيتم إعادة بناء {len(legacy)} قاعدة بيانات لتفعيل الصيانة التدريجية.\n"
+                                                   "قد يستغرق ذلك وقتاً، ولا يمكن الحفظ أثناءه.\n\nهل تريد المتابعة؟",
+                                       parent=diag_window):
+                return
+            vacuum_btn.config(state='disabled')
+            maintenance_label.config(text="🗜️ جاري الضغط الكامل...")
+
+            def worker():
+                try:
+                    saved = 0
+                    for db in legacy:
+                        before, after = DatabaseMaintenance(db).full_vacuum()
+                        saved += before['file_size'] - after['file_size']
+                    message = f"🗜️ تم الضغط الكامل، وفر {format_size(max(saved, 0))}"
+                except (sqlite3.Error, OSError) as e:
+                    message = f"❌ تعذر الضغط الكامل: {e}"
+                self.root.after(0, lambda: diag_window.winfo_exists() and maintenance_label.config(text=message))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        vacuum_btn = tk.Button(buttons_frame, text="🗜️ ضغط كامل", command=full_vacuum,
+                               font=self.fonts['button'], bg=self.colors['info'], fg='white', width=12)
+        if legacy:
+            vacuum_btn.pack(side='left', padx=5)
+
+        tk.Button(buttons_frame, text="❌ إغلاق", command=diag_window.destroy,
+                  font=self.fonts['button'], bg=self.colors['danger'], fg='white',
+                  width=12).pack(side='left', padx=5)
+
+        # آخر تشغيل صيانة لقاعدة البيانات المحلية
+        maintenance_label = tk.Label(diag_window, text="", font=self.fonts['small'],
+                                     bg=self.colors['bg_main'], fg=self.colors['text_secondary'])
+        maintenance_label.pack(pady=5)
+
+        databases = self.local_databases()
+        last_runs = DatabaseMaintenance(databases[0]).last_runs(1) if databases else []
+        if last_runs:
+            run_date, tasks, _, busy_ms, size_before, size_after, _, _, _, _, integrity = last_runs[0]
+            maintenance_label.config(
+                text=f"🧹 آخر صيانة: {run_date[:16]} | الحجم قبل {format_size(size_before)} وبعد {format_size(size_after)} "
+                     f"| {busy_ms} ms | {tasks} | الفحص: {integrity}")
+
+        refresh()
+
     def run(self):
         """تشغيل البرنامج"""
         self.root.mainloop()
+        if self.file_recorder:
+            try:
+                self.file_recorder.close()
+            except Exception:
+                logger.exception("تعذر حفظ أسماء الملفات المولدة المنتظرة عند الخروج")
 
 # تشغيل البرنامج
 if __name__ == "__main__":
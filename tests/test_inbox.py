@@ -0,0 +1,64 @@
+"""اختبارات فرز صندوق الوارد على قاعدة بيانات ومجلدات مؤقتة"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from project_organizer_smart import DatabaseManager, InboxRouter  # noqa: E402
+
+
+class InboxRouterMatchTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='organizer_inbox_test_')
+        self.db = DatabaseManager(os.path.join(self.temp_dir, 'test.db'))
+        self.inbox = os.path.join(self.temp_dir, InboxRouter.INBOX_FOLDER)
+        os.makedirs(self.inbox)
+
+        structure_id = self.db.add_structure("هيكل", self.temp_dir, {})
+        self.acme = self.db.add_client("Acme Corp", "شركة", os.path.join(self.temp_dir, "acme"), structure_id)
+        self.solo = self.db.add_client("Solo", "فرد", os.path.join(self.temp_dir, "solo"), structure_id)
+        self.first = self._add_project("Website", "P_2401_001", self.acme)
+        self.second = self._add_project("Mobile App", "P_2401_002", self.acme)
+        self.solo_project = self._add_project("Logo", "P_2401_003", self.solo)
+        self.router = InboxRouter(self.db, structure_id)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _add_project(self, name, number, client_id):
+        return self.db.add_project(name, number, client_id, os.path.join(self.temp_dir, number))
+
+    def _plan(self, *filenames):
+        for filename in filenames:
+            open(os.path.join(self.inbox, filename), 'w').close()
+        moves, unmatched = self.router.plan(self.inbox)
+        return {move[0]: move[3] for move in moves}, unmatched
+
+    def test_client_with_several_active_projects_stays_in_inbox(self):
+        moves, unmatched = self._plan("2024-01-15_Report_Acme-Corp_Summary_v01.pdf")
+        self.assertEqual(moves, {})
+        self.assertEqual(unmatched, ["2024-01-15_Report_Acme-Corp_Summary_v01.pdf"])
+
+    def test_client_with_one_active_project_is_matched(self):
+        self.db.set_projects_status([self.first], "مسلم")
+        moves, _ = self._plan("2024-01-15_Report_Acme-Corp_Summary_v01.pdf", "2024-01-15_Design_Solo_Draft_v01.png")
+        self.assertEqual(moves, {"2024-01-15_Report_Acme-Corp_Summary_v01.pdf": self.second,
+                                 "2024-01-15_Design_Solo_Draft_v01.png": self.solo_project})
+
+    def test_project_name_and_number_match(self):
+        moves, _ = self._plan("2024-01-15_Report_Mobile-App_Summary_v01.pdf",
+                              "2024-01-15_Invoice_Acme-Corp_P_2401_001_v01.pdf")
+        self.assertEqual(moves, {"2024-01-15_Report_Mobile-App_Summary_v01.pdf": self.second,
+                                 "2024-01-15_Invoice_Acme-Corp_P_2401_001_v01.pdf": self.first})
+
+    def test_inactive_projects_receive_no_files(self):
+        self.db.set_projects_status([self.solo_project], "مؤرشف")
+        moves, _ = self._plan("2024-01-15_Design_Solo_Draft_v01.png", "2024-01-15_Design_Solo_P_2401_003_v01.png")
+        self.assertEqual(moves, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""اختبارات تسجيل أسماء الملفات المولدة على دفعات"""
+import logging
+import os
+import sqlite3
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from project_organizer_smart import GeneratedFileRecorder  # noqa: E402
+
+
+class LockedDatabase:
+    """قاعدة وهمية ترفض الكتابة حتى يفك القفل"""
+
+    def __init__(self):
+        self.locked = True
+        self.rows = []
+
+    def add_generated_files(self, records):
+        if self.locked:
+            raise sqlite3.OperationalError("database is locked")
+        self.rows.extend(records)
+        return len(records)
+
+
+class GeneratedFileRecorderTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.db = LockedDatabase()
+        self.errors = []
+        self.recorder = GeneratedFileRecorder(self.db, batch_size=2, flush_interval=0.02,
+                                              on_error=lambda error, pending: self.errors.append(pending))
+
+    def tearDown(self):
+        self.db.locked = False
+        self.recorder.close()
+        logging.disable(logging.NOTSET)
+
+    def test_record_never_writes_or_raises(self):
+        self.assertTrue(self.recorder.record("a.pdf", 1, "pdf"))
+        self.assertTrue(self.recorder.record("b.pdf", 1, "pdf"))
+        self.assertFalse(self.recorder.record("a.pdf", 1, "pdf"))
+
+    def test_failed_batch_stays_pending_until_written(self):
+        self.recorder.record("a.pdf", 1, "pdf")
+        self.recorder.record("b.pdf", 1, "pdf")
+        time.sleep(0.3)
+        self.assertEqual(self.recorder.pending_count(), 2)
+        self.assertGreater(self.recorder.stats['failures'], 3)
+        self.assertEqual(self.errors, [2])
+
+        self.db.locked = False
+        time.sleep(0.2)
+        self.assertEqual(self.recorder.pending_count(), 0)
+        self.assertEqual(sorted(row[0] for row in self.db.rows), ["a.pdf", "b.pdf"])
+
+
+if __name__ == "__main__":
+    unittest.main()
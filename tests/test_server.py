@@ -0,0 +1,101 @@
+"""اختبارات خادم منظم المشاريع على خادم يعمل داخل نفس العملية"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer_server import OrganizerServer, OrganizerService, UnknownMethodError  # noqa: E402
+from project_organizer_smart import MemoryDatabaseManager, RemoteDatabaseManager  # noqa: E402
+
+
+class ProjectNumberReservationTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='organizer_server_test_')
+        self.server = OrganizerServer(os.path.join(self.temp_dir, 'server.db'), port=0)
+        self.server.start_in_thread()
+        self.first = RemoteDatabaseManager(self.server.url)
+        self.second = RemoteDatabaseManager(self.server.url)
+
+        structure_id = self.first.add_structure("هيكل", "/base", {})
+        self.client_id = self.first.add_client("عميل", "شركة", "/base/client", structure_id)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_clients_get_distinct_numbers(self):
+        self.assertNotEqual(self.first.generate_next_project_number(), self.second.generate_next_project_number())
+
+    def test_reserved_number_exists_only_for_other_clients(self):
+        number = self.first.generate_next_project_number()
+        self.assertFalse(self.first.check_project_exists(number))
+        self.assertTrue(self.second.check_project_exists(number))
+
+    def test_new_request_releases_previous_reservation(self):
+        number = self.first.generate_next_project_number()
+        self.assertEqual(self.first.generate_next_project_number(), number)
+        self.assertEqual(len(self.server.service._reserved_numbers), 1)
+
+    def test_reservation_expires(self):
+        self.server.service.reservation_ttl = 0.05
+        number = self.first.generate_next_project_number()
+        time.sleep(0.1)
+        self.assertFalse(self.second.check_project_exists(number))
+        self.assertEqual(self.second.generate_next_project_number(), number)
+        self.assertEqual(len(self.server.service._reserved_numbers), 1)
+
+    def test_add_project_consumes_reservation(self):
+        number = self.first.generate_next_project_number()
+        self.assertIsNotNone(self.first.add_project("مشروع", number, self.client_id, "/base/client/p1"))
+        self.assertEqual(self.server.service._reserved_numbers, {})
+        self.assertTrue(self.first.check_project_exists(number))
+        self.assertNotEqual(self.second.generate_next_project_number(), number)
+
+
+class ServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.db = MemoryDatabaseManager()
+        self.structure_id = self.db.add_structure("هيكل", "/base", {})
+        self.service = OrganizerService(self.db, cache_size=3)
+
+    def test_read_cache_is_bounded(self):
+        for text in ("a", "ab", "abc", "abcd", "abcde"):
+            self.service.call('search_clients', [self.structure_id, text], {})
+        self.assertEqual(len(self.service._cache), 3)
+
+    def test_unknown_method_is_distinct_from_key_errors(self):
+        with self.assertRaises(UnknownMethodError):
+            self.service.call('drop_everything', [], {})
+        self.db.get_setting = lambda key, default=None: {}[key]
+        with self.assertRaises(KeyError):
+            self.service.call('get_setting', ['missing'], {})
+
+
+class ServerTokenTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='organizer_server_test_')
+        self.server = OrganizerServer(os.path.join(self.temp_dir, 'server.db'), port=0, token="secret")
+        self.server.start_in_thread()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_requests_need_the_token(self):
+        with self.assertRaises(PermissionError):
+            RemoteDatabaseManager(self.server.url, token="wrong")
+        self.assertEqual(RemoteDatabaseManager(self.server.url, token="secret").get_structures(), [])
+
+    def test_network_address_needs_a_token(self):
+        with self.assertRaises(ValueError):
+            OrganizerServer(os.path.join(self.temp_dir, 'open.db'), host='0.0.0.0', port=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
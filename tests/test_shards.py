@@ -0,0 +1,50 @@
+"""اختبارات قواعد البيانات المنفصلة لكل هيكل (shards) على مجلد مؤقت"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from project_organizer_smart import ShardedDatabaseManager  # noqa: E402
+
+
+class ShardedProjectNumberTest(unittest.TestCase):
+    def setUp(self):
+        self.shards_dir = tempfile.mkdtemp(prefix='organizer_shards_test_')
+        db = ShardedDatabaseManager(self.shards_dir)
+        self.client_ids = []
+        for i in range(2):
+            structure_id = db.add_structure(f"هيكل {i}", f"/base{i}", {})
+            self.client_ids.append(db.add_client("عميل", "شركة", f"/base{i}/client", structure_id))
+
+    def tearDown(self):
+        shutil.rmtree(self.shards_dir, ignore_errors=True)
+
+    def test_concurrent_writers_never_share_a_number(self):
+        results = [[], []]
+
+        def writer(index):
+            # كل كاتب باتصالاته الخاصة كما في عمليتين منفصلتين
+            db = ShardedDatabaseManager(self.shards_dir)
+            for n in range(40):
+                project_id = db.add_project("مشروع", f"P_2401_{n:03d}", self.client_ids[index],
+                                            f"/base{index}/client/p{n}")
+                results[index].append(project_id is not None)
+
+        threads = [threading.Thread(target=writer, args=(index,)) for index in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(any(a and b for a, b in zip(*results)))
+        numbers = [p.project_number for p in ShardedDatabaseManager(self.shards_dir).get_projects()]
+        self.assertEqual(len(numbers), 40)
+        self.assertEqual(len(set(numbers)), 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
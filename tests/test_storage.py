@@ -0,0 +1,369 @@
+"""اختبارات توافق واجهة StorageBackend: نفس الاختبارات على كل تنفيذ محلي"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from project_organizer_smart import (DatabaseManager, MemoryDatabaseManager, ShardedDatabaseManager,  # noqa: E402
+                                     StorageBackend, StructureRow)
+
+
+class StorageBackendConformance:
+    """الاختبارات المشتركة (تضاف لكل صنف اختبار مع make_backend)"""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='organizer_storage_test_')
+        self.db = self.make_backend()
+        self.base = os.path.join(self.temp_dir, 'base')
+        self.structure_id = self.db.add_structure("هيكل", self.base, {})
+        self.client_id = self.db.add_client("Acme Corp", "شركة", os.path.join(self.base, "acme"), self.structure_id)
+        self.project_id = self.db.add_project("Website", "P_2401_001", self.client_id,
+                                              os.path.join(self.base, "acme", "P_2401_001_Website"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_is_a_storage_backend(self):
+        self.assertIsInstance(self.db, StorageBackend)
+
+    def test_duplicate_unique_values_return_none(self):
+        self.assertIsNone(self.db.add_structure("هيكل", "/other", {}))
+        self.assertIsNone(self.db.add_client("Other", "شركة", os.path.join(self.base, "acme"), self.structure_id))
+        self.assertIsNone(self.db.add_project("Other", "P_2401_001", self.client_id, "/other/p"))
+
+    def test_clients_lookup(self):
+        client = self.db.get_client(self.client_id)
+        self.assertEqual((client.name, client.type, client.structure_id), ("Acme Corp", "شركة", self.structure_id))
+        self.assertIsNone(self.db.get_client(self.client_id + 12345))
+        self.assertEqual(self.db.check_client_exists("acme-corp", self.structure_id), (self.client_id,))
+        self.assertIsNone(self.db.check_client_exists("Acme", self.structure_id))
+        self.assertEqual([c.id for c in self.db.search_clients(self.structure_id, "acm")], [self.client_id])
+        self.assertEqual([c.id for c in self.db.get_clients(self.structure_id)], [self.client_id])
+
+    def test_projects_lookup_and_status(self):
+        self.assertEqual(self.db.get_project_by_number("P_2401_001").id, self.project_id)
+        self.assertTrue(self.db.check_project_exists("P_2401_001"))
+        self.assertFalse(self.db.check_project_exists("P_2401_999"))
+        self.assertEqual([p.id for p in self.db.search_projects("web", structure_id=self.structure_id)],
+                         [self.project_id])
+
+        self.assertEqual(self.db.set_projects_status([self.project_id], "مسلم"), 1)
+        self.assertEqual(self.db.get_projects(self.client_id, status="نشط"), [])
+        self.assertEqual(self.db.get_recent_projects(self.structure_id, status="مسلم")[0].id, self.project_id)
+
+    def test_generated_files_contract(self):
+        file_id = self.db.add_generated_file("a.pdf", self.project_id, "pdf")
+        self.assertIsNotNone(file_id)
+        self.assertIsNone(self.db.add_generated_file("a.pdf", self.project_id, "pdf"))
+        self.assertIsNotNone(self.db.add_generated_file("a.pdf", None, "pdf"))
+        self.assertIsNone(self.db.add_generated_file("a.pdf", None, "pdf"))
+        self.assertEqual(self.db.add_generated_files([("b.pdf", self.project_id, "pdf", ""),
+                                                      ("b.pdf", self.project_id, "pdf", ""),
+                                                      ("a.pdf", self.project_id, "pdf", "")]), 1)
+        self.assertTrue(self.db.generated_file_exists("b.pdf", self.project_id))
+        self.assertFalse(self.db.generated_file_exists("b.pdf", None))
+
+    def test_settings(self):
+        self.db.set_setting("key", 5)
+        self.assertEqual(self.db.get_setting("key"), "5")
+        self.db.set_setting("key", None)
+        self.assertEqual(self.db.get_setting("key", "default"), "default")
+
+    def test_change_log(self):
+        cursor = self.db.change_cursor()
+        self.db.add_client("New", "فرد", os.path.join(self.base, "new"), self.structure_id)
+        changes, new_cursor = self.db.tail_changes(cursor, 10, ('clients',))
+        self.assertEqual([(c.table_name, c.op) for c in changes], [('clients', 'I')])
+        self.assertNotEqual(new_cursor, cursor)
+
+    def test_export_rows_filters(self):
+        other = self.db.add_client("Solo", "فرد", os.path.join(self.base, "solo"), self.structure_id)
+        self.db.add_project("Logo", "P_2401_002", other, os.path.join(self.base, "solo", "p"))
+        self.db.add_generated_file("a.pdf", self.project_id, "pdf")
+
+        columns, rows = self.db.iter_export_rows('projects', {'client_type': "فرد", 'status': ''})
+        rows = list(rows)
+        self.assertEqual(columns[:3], ['id', 'project_number', 'name'])
+        self.assertEqual([row[1] for row in rows], ["P_2401_002"])
+
+        columns, rows = self.db.iter_export_rows('generated_files', {'structure_id': self.structure_id})
+        self.assertEqual([row[columns.index('project_number')] for row in rows], ["P_2401_001"])
+        with self.assertRaises(ValueError):
+            self.db.iter_export_rows('clients', {'status': "نشط"})
+
+    def test_delete_structure_cascades(self):
+        other_structure = self.db.add_structure("آخر", os.path.join(self.temp_dir, 'other'), {})
+        other_client = self.db.add_client("Keep", "فرد", os.path.join(self.temp_dir, 'other', 'keep'), other_structure)
+        self.db.add_generated_file("a.pdf", self.project_id, "pdf")
+
+        stats = self.db.delete_structure(self.structure_id)
+        self.assertEqual(stats, {'files': 1, 'projects': 1, 'clients': 1, 'structures': 1})
+        self.assertIsNone(self.db.get_client(self.client_id))
+        self.assertIsNone(self.db.get_project_by_number("P_2401_001"))
+        self.assertFalse(self.db.generated_file_exists("a.pdf", self.project_id))
+        self.assertEqual([s.id for s in self.db.get_structures()], [other_structure])
+        self.assertEqual(self.db.get_client(other_client).name, "Keep")
+
+    def test_merge_clients_moves_folders(self):
+        duplicate = self.db.add_client("ACME corp", "شركة", os.path.join(self.base, "acme_2"), self.structure_id)
+        old_folder = os.path.join(self.base, "acme_2", "P_2401_002_App")
+        os.makedirs(old_folder)
+        moved_id = self.db.add_project("App", "P_2401_002", duplicate, old_folder)
+        self.db.add_generated_file("a.pdf", moved_id, "pdf", os.path.join(old_folder, "a.pdf"))
+
+        self.assertEqual(self.db.merge_clients(self.client_id, [duplicate]), {'projects': 1, 'clients': 1})
+        project = self.db.get_project_by_number("P_2401_002")
+        self.assertEqual((project.client_id, project.client_name), (self.client_id, "Acme Corp"))
+        self.assertEqual(project.folder_path, os.path.join(self.base, "acme", "P_2401_002_App"))
+        self.assertTrue(os.path.isdir(project.folder_path))
+        self.assertFalse(os.path.exists(os.path.join(self.base, "acme_2")))
+        self.assertIsNone(self.db.get_client(duplicate))
+        self.assertEqual(self.db.check_client_exists("acme corp", self.structure_id), (self.client_id,))
+
+        columns, rows = self.db.iter_export_rows('generated_files')
+        self.assertEqual([row[columns.index('file_path')] for row in rows],
+                         [os.path.join(project.folder_path, "a.pdf")])
+
+    def test_merge_clients_rejects_other_structure(self):
+        other_structure = self.db.add_structure("آخر", "/other", {})
+        other_client = self.db.add_client("Acme Corp", "شركة", "/other/acme", other_structure)
+        with self.assertRaises(ValueError):
+            self.db.merge_clients(self.client_id, [other_client])
+
+
+class DatabaseManagerConformanceTest(StorageBackendConformance, unittest.TestCase):
+    def make_backend(self):
+        return DatabaseManager(os.path.join(self.temp_dir, 'test.db'))
+
+
+class MemoryDatabaseManagerConformanceTest(StorageBackendConformance, unittest.TestCase):
+    def make_backend(self):
+        return MemoryDatabaseManager()
+
+
+class ShardedDatabaseManagerConformanceTest(StorageBackendConformance, unittest.TestCase):
+    def make_backend(self):
+        return ShardedDatabaseManager(os.path.join(self.temp_dir, 'shards'))
+
+
+class DatabaseManagerDeleteMergeTest(unittest.TestCase):
+    """حذف الهيكل على دفعات ودمج العملاء على قاعدة SQLite ومجلدات مؤقتة"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='organizer_storage_test_')
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.db = DatabaseManager(os.path.join(self.temp_dir, 'test.db'))
+        self.base = os.path.join(self.temp_dir, 'base')
+        self.structure_id = self.db.add_structure("هيكل", self.base, {})
+
+    def fill_structure(self, structure_id, base, clients=3, projects=4, files=2):
+        """clients عميل لكل منهم projects مشروع ولكل مشروع files ملف وعملية نقل من الوارد"""
+        project_ids = []
+        for c in range(clients):
+            client_id = self.db.add_client(f"Client {c}", "شركة", os.path.join(base, f"c{c}"), structure_id)
+            for p in range(projects):
+                project_ids.append(self.db.add_project(f"Project {p}", f"P_{structure_id}_{c}_{p}", client_id,
+                                                       os.path.join(base, f"c{c}", f"p{p}")))
+        self.db.add_generated_files([(f"f{f}.pdf", project_id, "pdf", "")
+                                     for project_id in project_ids for f in range(files)])
+        conn = self.db._connect()
+        conn.executemany('INSERT INTO inbox_moves (run_id, filename, source_path, dest_path, project_id, moved_date) '
+                         "VALUES ('run', 'a.pdf', '/in/a.pdf', '/out/a.pdf', ?, '2024-01-01')",
+                         [(project_id,) for project_id in project_ids])
+        conn.commit()
+        conn.close()
+
+    def table_counts(self):
+        conn = self.db._connect()
+        try:
+            return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                    for table in ('structures', 'clients', 'projects', 'generated_files', 'inbox_moves')}
+        finally:
+            conn.close()
+
+    def test_delete_structure_counts_cascade(self):
+        other_structure = self.db.add_structure("آخر", os.path.join(self.temp_dir, 'other'), {})
+        self.fill_structure(self.structure_id, self.base)
+        self.fill_structure(other_structure, os.path.join(self.temp_dir, 'other'), clients=1, projects=2, files=1)
+        self.assertEqual(self.db.count_structure_rows(self.structure_id),
+                         {'files': 24, 'projects': 12, 'clients': 3})
+
+        stats = self.db.delete_structure(self.structure_id, batch_size=5)
+        self.assertEqual(stats, {'files': 24, 'projects': 12, 'clients': 3, 'structures': 1})
+        # الهيكل الآخر باق كما هو، وسجل الوارد حذف مع مشاريعه
+        self.assertEqual(self.table_counts(), {'structures': 1, 'clients': 1, 'projects': 2,
+                                               'generated_files': 2, 'inbox_moves': 2})
+
+    def test_delete_structure_uses_bounded_batches(self):
+        self.fill_structure(self.structure_id, self.base)
+        batches, reports = [], []
+        delete_batch = self.db._delete_batch
+
+        def recording_delete_batch(query, params):
+            deleted = delete_batch(query, params)
+            batches.append(deleted)
+            return deleted
+
+        self.db._delete_batch = recording_delete_batch
+        self.db.delete_structure(self.structure_id, batch_size=5,
+                                 progress=lambda done, total: reports.append((done, total)))
+
+        self.assertTrue(all(deleted <= 5 for deleted in batches))
+        # files: 5+5+5+5+4، projects: 5+5+2، clients: 3، structures: 1
+        self.assertEqual(batches, [5, 5, 5, 5, 4, 5, 5, 2, 3, 1])
+        self.assertEqual([done for done, _ in reports], [5, 10, 15, 20, 24, 29, 34, 36, 39])
+        self.assertEqual({total for _, total in reports}, {39})
+
+    def test_delete_structure_resumes_after_interruption(self):
+        self.fill_structure(self.structure_id, self.base)
+        delete_batch = self.db._delete_batch
+        calls = []
+
+        def failing_delete_batch(query, params):
+            calls.append(query)
+            if len(calls) == 3:
+                raise sqlite3.OperationalError("disk I/O error")
+            return delete_batch(query, params)
+
+        self.db._delete_batch = failing_delete_batch
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.delete_structure(self.structure_id, batch_size=5)
+        self.assertEqual(self.table_counts()['generated_files'], 14)
+
+        self.db._delete_batch = delete_batch
+        stats = self.db.delete_structure(self.structure_id, batch_size=5)
+        self.assertEqual(stats, {'files': 14, 'projects': 12, 'clients': 3, 'structures': 1})
+        self.assertEqual(self.table_counts(), dict.fromkeys(('structures', 'clients', 'projects',
+                                                              'generated_files', 'inbox_moves'), 0))
+
+    def make_duplicates(self):
+        target = self.db.add_client("Acme", "شركة", os.path.join(self.base, "acme"), self.structure_id)
+        sources, folders = [], []
+        for index in range(2):
+            client_folder = os.path.join(self.base, f"acme_{index}")
+            source = self.db.add_client(f"ACME {index}", "شركة", client_folder, self.structure_id)
+            folder = os.path.join(client_folder, "P_2401_001_Site")
+            os.makedirs(folder)
+            with open(os.path.join(folder, "brief.txt"), 'w', encoding='utf-8') as f:
+                f.write(str(index))
+            self.db.add_project("Site", f"P_2401_00{index + 1}", source, folder)
+            sources.append(source)
+            folders.append(folder)
+        return target, sources, folders
+
+    def test_merge_clients_counts_and_name_collisions(self):
+        target, sources, folders = self.make_duplicates()
+        self.assertEqual(self.db.merge_clients(target, sources), {'projects': 2, 'clients': 2})
+
+        paths = sorted(p.folder_path for p in self.db.get_projects(target))
+        self.assertEqual(paths, [os.path.join(self.base, "acme", "P_2401_001_Site"),
+                                 os.path.join(self.base, "acme", "P_2401_001_Site_2")])
+        self.assertTrue(all(os.path.isfile(os.path.join(path, "brief.txt")) for path in paths))
+        self.assertFalse(any(os.path.exists(os.path.dirname(folder)) for folder in folders))
+        self.assertEqual(self.table_counts()['clients'], 1)
+
+    def test_merge_clients_restores_folders_when_transaction_fails(self):
+        target, sources, folders = self.make_duplicates()
+        conn = self.db._connect()
+        conn.execute("CREATE TRIGGER fail_merge BEFORE DELETE ON clients BEGIN SELECT RAISE(ABORT, 'boom'); END")
+        conn.commit()
+        conn.close()
+
+        with self.assertRaises(sqlite3.DatabaseError):
+            self.db.merge_clients(target, sources)
+
+        # المجلدات عادت لأماكنها وقاعدة البيانات لم تتغير
+        self.assertTrue(all(os.path.isfile(os.path.join(folder, "brief.txt")) for folder in folders))
+        self.assertEqual(os.listdir(os.path.join(self.base, "acme")), [])
+        self.assertEqual(sorted((p.client_id, p.folder_path) for p in self.db.get_projects()),
+                         sorted(zip(sources, folders)))
+        self.assertEqual(self.table_counts()['clients'], 3)
+
+
+class DatabaseManagerConnectionTest(unittest.TestCase):
+    """مولدات القراءة تغلق اتصالاتها حتى عند التوقف أو الفشل"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='organizer_storage_test_')
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.db = DatabaseManager(os.path.join(self.temp_dir, 'test.db'))
+        structure_id = self.db.add_structure("هيكل", "/base", {})
+        client_id = self.db.add_client("Acme", "شركة", "/base/acme", structure_id)
+        for index in range(5):
+            self.db.add_project("Site", f"P_2401_00{index}", client_id, f"/base/acme/p{index}")
+
+        self.connections = []
+        connect = self.db._connect
+
+        def tracking_connect():
+            conn = connect()
+            self.connections.append(conn)
+            return conn
+
+        self.db._connect = tracking_connect
+
+    def assertAllClosed(self):
+        for conn in self.connections:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute('SELECT 1')
+
+    def test_abandoned_generators_close_their_connections(self):
+        rows = self.db.iter_projects(batch_size=2)
+        next(rows)
+        rows.close()
+
+        _, export_rows = self.db.iter_export_rows('projects', batch_size=2)
+        next(export_rows)
+        export_rows.close()
+        # مولد لم يقرأ منه لا يفتح اتصالاً (الاتصال الرابع لقراءة أسماء الأعمدة فقط)
+        self.db.iter_export_rows('projects')
+        self.assertEqual(len(self.connections), 4)
+        self.assertAllClosed()
+
+    def test_failing_query_closes_the_connection(self):
+        rows = self.db._iter_rows(StructureRow, 'SELECT * FROM missing_table')
+        with self.assertRaises(sqlite3.OperationalError):
+            next(rows)
+        self.assertEqual(len(self.connections), 1)
+        self.assertAllClosed()
+
+
+class MemoryMatchesSQLiteExportTest(unittest.TestCase):
+    """صفوف التصدير من الذاكرة مطابقة لاستعلامات EXPORT_DATASETS (عدا التواريخ)"""
+
+    def test_same_rows_as_sqlite(self):
+        temp_dir = tempfile.mkdtemp(prefix='organizer_storage_test_')
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        exports = []
+        for db in (DatabaseManager(os.path.join(temp_dir, 'test.db')), MemoryDatabaseManager()):
+            structure_id = db.add_structure("هيكل", "/base", {})
+            client_id = db.add_client("Acme", "شركة", "/base/acme", structure_id)
+            project_id = db.add_project("Website", "P_2401_001", client_id, "/base/acme/p1", "وصف")
+            db.add_generated_file("a.pdf", project_id, "pdf", "/base/acme/p1/a.pdf")
+            db.add_generated_file("b.pdf", None, "pdf")
+
+            result = {}
+            for dataset in ('projects', 'clients', 'generated_files'):
+                columns, rows = db.iter_export_rows(dataset)
+                dates = {index for index, column in enumerate(columns) if column in ('created_date', 'last_modified')}
+                result[dataset] = (columns, [tuple(v for i, v in enumerate(row) if i not in dates) for row in rows])
+            exports.append(result)
+
+        self.assertEqual(exports[0], exports[1])
+
+
+class AbstractBackendTest(unittest.TestCase):
+    def test_incomplete_backend_cannot_be_created(self):
+        with self.assertRaises(TypeError):
+            StorageBackend()
+
+
+if __name__ == "__main__":
+    unittest.main()
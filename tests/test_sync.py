@@ -0,0 +1,101 @@
+"""اختبارات المزامنة دون اتصال على ملفات قواعد بيانات محلية مؤقتة"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from project_organizer_smart import DatabaseManager, SyncEngine  # noqa: E402
+
+
+class SyncEditDeleteTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='organizer_sync_test_')
+        self.a = DatabaseManager(os.path.join(self.temp_dir, 'a.db'))
+        self.b = DatabaseManager(os.path.join(self.temp_dir, 'b.db'))
+        self.engine = SyncEngine()
+
+        structure_id = self.a.add_structure("هيكل", "/base", {})
+        client_id = self.a.add_client("عميل", "شركة", "/base/client", structure_id)
+        self.project_id = self.a.add_project("مشروع", "P_2401_001", client_id, "/base/client/p1")
+        self.engine.sync(self.a, self.b)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _edit_on_a(self):
+        conn = self.a._connect()
+        try:
+            conn.execute("UPDATE projects SET description = 'معدل', last_modified = '2999-01-01' WHERE id = ?",
+                         (self.project_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _delete_on_b(self):
+        project = self.b.get_project_by_number("P_2401_001")
+        conn = self.b._connect()
+        try:
+            conn.execute('DELETE FROM projects WHERE id = ?', (project.id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def assertConverged(self):
+        self.assertEqual([p.project_number for p in self.a.get_projects()],
+                         [p.project_number for p in self.b.get_projects()])
+
+    def test_edit_on_a_delete_on_b(self):
+        self._edit_on_a()
+        self._delete_on_b()
+        self.engine.sync(self.a, self.b)
+
+        self.assertEqual(self.a.get_projects(), [])
+        self.assertEqual(self.b.get_projects(), [])
+        self.engine.sync(self.a, self.b)
+        self.assertConverged()
+
+    def test_delete_on_b_edit_on_a_synced_from_b(self):
+        self._edit_on_a()
+        self._delete_on_b()
+        self.engine.sync(self.b, self.a)
+
+        self.assertEqual(self.a.get_projects(), [])
+        self.assertEqual(self.b.get_projects(), [])
+        self.engine.sync(self.a, self.b)
+        self.assertConverged()
+
+    def test_generated_file_for_deleted_project_is_dropped(self):
+        self.a.add_generated_file("ملف.pdf", self.project_id, "pdf")
+        self._delete_on_b()
+        self.engine.sync(self.a, self.b)
+        self.engine.sync(self.a, self.b)
+
+        for db in (self.a, self.b):
+            conn = db._connect()
+            try:
+                self.assertEqual(conn.execute('SELECT COUNT(*) FROM generated_files').fetchone()[0], 0)
+            finally:
+                conn.close()
+
+    def test_same_generated_file_on_both_devices_is_merged(self):
+        self.a.add_generated_file("ملف.pdf", self.project_id, "pdf")
+        self.b.add_generated_file("ملف.pdf", self.b.get_project_by_number("P_2401_001").id, "pdf")
+        self.engine.sync(self.a, self.b)
+        self.engine.sync(self.a, self.b)
+
+        uuids = []
+        for db in (self.a, self.b):
+            conn = db._connect()
+            try:
+                uuids.append(conn.execute('SELECT uuid FROM generated_files').fetchall())
+            finally:
+                conn.close()
+        self.assertEqual(len(uuids[0]), 1)
+        self.assertEqual(uuids[0], uuids[1])
+
+
+if __name__ == "__main__":
+    unittest.main()